@@ -0,0 +1,222 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+LANES = ("interactive", "batch")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the OCR work a worker takes on at once.
+
+    At most max_concurrency requests run, at most max_per_client are admitted
+    (running or queued) per client, and the rest wait in a bounded FIFO queue per
+    lane. Freed slots go to the interactive lane first, and the batch lane may
+    only hold batch_share of the slots, so backfills cannot starve single-page
+    uploads. The queue drains at (slots / average service time) requests per
+    second; a request is rejected straight away when its queue is full or when
+    that rate says it would not be admitted before its deadline, and Retry-After
+    is derived from the same estimate. Runs on one event loop, so no locking is
+    needed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_per_client: int = 8,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        batch_share: float = 0.5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.batch_slots = max(1, int(max_concurrency * batch_share))
+
+        self.running: Counter = Counter()  # per lane
+        self.per_client: Counter = Counter()  # admitted or queued, per client
+        self.queues: Dict[str, Deque[Tuple[asyncio.Future, str]]] = {lane: deque() for lane in LANES}
+        self.service_time: Optional[float] = None  # EWMA, seconds
+        self.rejected: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=int(os.getenv("OCR_MAX_CONCURRENCY", "16")),
+            max_per_client=int(os.getenv("OCR_MAX_PER_CLIENT", "8")),
+            max_queue=int(os.getenv("OCR_MAX_QUEUE", "64")),
+            queue_timeout=float(os.getenv("OCR_QUEUE_TIMEOUT", "10")),
+            batch_share=float(os.getenv("OCR_BATCH_SHARE", "0.5")),
+        )
+
+    def drain_rate(self, lane: str = "interactive") -> Optional[float]:
+        """Requests per second a saturated lane admits, once a service time has been observed."""
+        if not self.service_time:
+            return None
+        slots = self.max_concurrency if lane == "interactive" else self.batch_slots
+        return slots / self.service_time
+
+    def _estimated_wait(self, lane: str, position: int) -> Optional[float]:
+        rate = self.drain_rate(lane)
+        if rate is None:
+            return None
+        # Batch requests also wait for every queued interactive request
+        ahead = position + (len(self.queues["interactive"]) if lane == "batch" else 0)
+        return (ahead + 1) / rate
+
+    def _retry_after(self, lane: str) -> int:
+        wait = self._estimated_wait(lane, len(self.queues[lane]))
+        return max(1, min(60, math.ceil(wait if wait is not None else self.queue_timeout)))
+
+    def _has_slot(self, lane: str) -> bool:
+        if sum(self.running.values()) >= self.max_concurrency:
+            return False
+        return lane == "interactive" or self.running["batch"] < self.batch_slots
+
+    def _forget(self, client: str):
+        self.per_client[client] -= 1
+        if self.per_client[client] <= 0:
+            del self.per_client[client]
+
+    def _reject(self, client: str, lane: str, reason: str):
+        self._forget(client)
+        self.rejected[(lane, reason)] += 1
+        raise AdmissionRejected(reason, self._retry_after(lane))
+
+    async def acquire(self, client: str, lane: str = "interactive") -> float:
+        """Waits for a slot and returns the admission time, to be passed to release()."""
+        lane = lane if lane in LANES else "interactive"
+        self.per_client[client] += 1
+        if self.per_client[client] > self.max_per_client:
+            self._reject(client, lane, "client_limit")
+
+        if not self.queues[lane] and self._has_slot(lane):
+            self.running[lane] += 1
+            return time.monotonic()
+
+        if len(self.queues[lane]) >= self.max_queue:
+            self._reject(client, lane, "queue_full")
+        wait = self._estimated_wait(lane, len(self.queues[lane]))
+        if wait is not None and wait > self.queue_timeout:
+            self._reject(client, lane, "overloaded")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, client)
+        self.queues[lane].append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Admitted just as the deadline passed
+                return time.monotonic()
+            future.cancel()
+            self.queues[lane].remove(entry)
+            self._reject(client, lane, "queue_timeout")
+        except asyncio.CancelledError:
+            # The client went away while queued
+            if future.done() and not future.cancelled():
+                self.release(client, lane, time.monotonic())
+            else:
+                future.cancel()
+                self.queues[lane].remove(entry)
+                self._forget(client)
+            raise
+        return time.monotonic()
+
+    def try_acquire(self, client: str, lane: str = "interactive") -> Optional[float]:
+        """
+        Admits straight away if a slot is free and nothing is queued in the lane,
+        otherwise returns None without queueing. For extra slots a request already
+        admitted would like, e.g. to run more pages of a document at once.
+        """
+        lane = lane if lane in LANES else "interactive"
+        if self.per_client[client] >= self.max_per_client or self.queues[lane] or not self._has_slot(lane):
+            return None
+        self.per_client[client] += 1
+        self.running[lane] += 1
+        return time.monotonic()
+
+    def release(self, client: str, lane: str, admitted_at: float):
+        lane = lane if lane in LANES else "interactive"
+        self.running[lane] -= 1
+        self._forget(client)
+        elapsed = time.monotonic() - admitted_at
+        self.service_time = elapsed if self.service_time is None else self.service_time + 0.2 * (elapsed - self.service_time)
+        self._dispatch()
+
+    def _dispatch(self):
+        for lane in LANES:
+            queue = self.queues[lane]
+            while queue and self._has_slot(lane):
+                future, _ = queue.popleft()
+                if not future.done():
+                    self.running[lane] += 1
+                    future.set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "batch_slots": self.batch_slots,
+            "running": {lane: self.running[lane] for lane in LANES},
+            "queued": {lane: len(self.queues[lane]) for lane in LANES},
+            "service_time_seconds": round(self.service_time, 3) if self.service_time is not None else None,
+            "rejected": [
+                {"lane": lane, "reason": reason, "count": count}
+                for (lane, reason), count in self.rejected.most_common()
+            ],
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to the given POST paths
+    before the upload body is read. Clients are identified like get_client_id()
+    in main.py; the lane comes from the X-OCR-Lane header ("interactive" or "batch").
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths=("/ocr/process",)):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        client = headers.get("x-client-id") or (scope["client"][0] if scope.get("client") else "unknown")
+        lane = headers.get("x-ocr-lane", "interactive").lower()
+
+        try:
+            admitted_at = await self.controller.acquire(client, lane)
+        except AdmissionRejected as e:
+            body = json.dumps({"detail": f"OCR service is busy ({e.reason}), retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(e.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(client, lane, admitted_at)
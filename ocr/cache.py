@@ -0,0 +1,79 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from processors import OCRResult
+
+
+class ResultCache:
+    """
+    OCR result cache backed by a local SQLite database in WAL mode.
+    Every worker process opens the same file, so a page processed by one
+    worker is a cache hit for all of them.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ocr_results_created_at ON ocr_results (created_at)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        """Returns a cache if OCR_CACHE_PATH is set, otherwise None (caching disabled)."""
+        path = os.getenv("OCR_CACHE_PATH")
+        if not path:
+            return None
+        ttl = int(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))
+        return cls(path, ttl_seconds=ttl)
+
+    @staticmethod
+    def key(file_bytes: bytes, provider_key: str) -> str:
+        """Cache key: SHA-256 of the image bytes plus the provider configuration."""
+        return f"{provider_key}:{hashlib.sha256(file_bytes).hexdigest()}"
+
+    def get(self, key: str) -> Optional[OCRResult]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM ocr_results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        result, created_at = row
+        if time.time() - created_at > self.ttl_seconds:
+            return None
+        return OCRResult.model_validate_json(result)
+
+    def put(self, key: str, result: OCRResult):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, result, created_at) VALUES (?, ?, ?)",
+                (key, result.model_dump_json(), now),
+            )
+            self._conn.execute(
+                "DELETE FROM ocr_results WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,141 @@
+import io
+import os
+from typing import BinaryIO, Iterator, Tuple
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.errors import PyPdfError
+except ImportError:
+    print("Warning: pypdf package not found. PDF uploads will not work.")
+    PyPdfError = ValueError
+try:
+    from PIL import Image, ImageSequence
+except ImportError:
+    print("Warning: Pillow package not found. TIFF uploads will not work.")
+
+# Multi-page uploads, split into one image per page before OCR
+DOCUMENT_TYPES = {"application/pdf", "image/tiff"}
+
+# Embedded page images that can be sent to the providers as they are
+_IMAGE_EXTENSIONS = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+# Image modes PNG can store; anything else (e.g. CMYK scans) is converted to RGB
+_PNG_MODES = {"1", "L", "LA", "P", "RGB", "RGBA", "I;16"}
+
+Page = Tuple[bytes, str]  # (page bytes, mime type)
+
+# What pypdf and Pillow raise for files they can't read
+_READ_ERRORS = (PyPdfError, OSError, ValueError, KeyError, TypeError, EOFError)
+
+
+class DocumentError(ValueError):
+    """The upload is not a readable PDF/TIFF (corrupt, truncated or encrypted)."""
+
+
+def _checked(pages: Iterator[Page]) -> Iterator[Page]:
+    """Reports pages that fail to read later on as DocumentError too."""
+    try:
+        yield from pages
+    except _READ_ERRORS as e:
+        raise DocumentError(f"Could not read page: {e}") from e
+
+
+def _pdf_page(page) -> Page:
+    # A scanned page is a single full-page image (usually JPEG): pass it through
+    # untouched instead of rendering the page
+    images = page.images
+    if len(images) == 1:
+        mime_type = _IMAGE_EXTENSIONS.get(os.path.splitext(images[0].name)[1].lower())
+        if mime_type:
+            return images[0].data, mime_type
+
+    # Otherwise send the page as a one-page PDF, which Textract and Gemini both accept
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue(), "application/pdf"
+
+
+def _pdf_pages(reader: "PdfReader") -> Iterator[Page]:
+    for page in reader.pages:
+        yield _pdf_page(page)
+
+
+def _tiff_frame(frame: "Image.Image") -> Page:
+    if frame.mode not in _PNG_MODES:
+        frame = frame.convert("RGB")
+    buffer = io.BytesIO()
+    frame.save(buffer, format="PNG")
+    return buffer.getvalue(), "image/png"
+
+
+def _tiff_pages(image: "Image.Image") -> Iterator[Page]:
+    with image:
+        for frame in ImageSequence.Iterator(image):
+            yield _tiff_frame(frame)
+
+
+def _open(file: BinaryIO, mime_type: str):
+    """Parses a PDF or TIFF once; returns its page count and the PdfReader or Image."""
+    if mime_type == "application/pdf":
+        try:
+            reader = PdfReader(file)
+            # pypdf opens PDFs with an empty user password itself
+            encrypted = reader.is_encrypted and not reader.decrypt("")
+            page_count = 0 if encrypted else len(reader.pages)
+        except _READ_ERRORS as e:
+            raise DocumentError(f"Could not read PDF: {e}") from e
+        if encrypted:
+            raise DocumentError("PDF is encrypted")
+        return page_count, reader
+    if mime_type == "image/tiff":
+        try:
+            image = Image.open(file)
+            page_count = getattr(image, "n_frames", 1)
+        except _READ_ERRORS as e:
+            raise DocumentError(f"Could not read TIFF: {e}") from e
+        return page_count, image
+    raise ValueError(f"Unsupported document type: {mime_type}")
+
+
+def open_document(file: BinaryIO, mime_type: str) -> Tuple[int, Iterator[Page]]:
+    """
+    Returns the page count and a lazy iterator over the pages of a PDF or TIFF.
+
+    Pages are read from the (seekable) file one at a time as the iterator advances,
+    so only the pages being processed are ever held in memory. Raises DocumentError
+    for files that can't be read, including encrypted PDFs, and the iterator raises
+    it for pages that turn out to be unreadable.
+    """
+    page_count, source = _open(file, mime_type)
+    pages = _pdf_pages(source) if mime_type == "application/pdf" else _tiff_pages(source)
+    return page_count, _checked(pages)
+
+
+class PageReader:
+    """
+    Random access to the pages of a PDF or TIFF, for callers that handle pages
+    independently. The document is parsed once, when the reader is created.
+    Not thread-safe: use one reader per thread.
+    """
+
+    def __init__(self, file: BinaryIO, mime_type: str):
+        self.mime_type = mime_type
+        self.page_count, self._source = _open(file, mime_type)
+
+    def page(self, index: int) -> Page:
+        """One page (0-based)."""
+        if not 0 <= index < self.page_count:
+            raise DocumentError(f"Page {index + 1} out of range ({self.page_count} pages)")
+        try:
+            if self.mime_type == "application/pdf":
+                return _pdf_page(self._source.pages[index])
+            self._source.seek(index)
+            return _tiff_frame(self._source)
+        except _READ_ERRORS as e:
+            raise DocumentError(f"Could not read page {index + 1}: {e}") from e
+
+    def close(self):
+        if self.mime_type == "image/tiff":
+            self._source.close()
@@ -1,98 +1,394 @@
-# To try out the endpoint, first install dependencies: 
-# pip install fastapi "uvicorn[standard]" pydantic boto3 python-multipart python-dotenv
-# Then, inside ocr directory, run:
-# uvicorn main:app --reload 
-# And navigate to http://127.0.0.1:8000/docs
-
-"""
-Gemini Prompts 
-# Prompt 1
-You are an expert full-stack developer with experience using Next.js.
-
-I'm building an app where pilots-in-training can upload photos of their logbook pages and their flight data (destination & source airports, hours spent in flight, number of landings, etc) is scanned w/ OCR and digitized, allowing them to upload their entire flight history and view their cumulative number of hours, as well as progress towards their pilot's license. 
-
-The app is in Next.js and we are using the Python implementation of AWS Textract for OCR. Right now, I need to write FastAPI endpoints which the frontend can use to call AWS Textract after the use uploads an image of a logbook page to be parsed and stored. 
-
-Don't write any code yet, but provide a high-level start-to-end overview of how a PNG can be parsed with AWS Textract and the data stored in a digital database (I'm not sure which database we're using, but I know we're using Prisma), including a discussion of the role of the FastAPI endpoints.
-
-# Prompt 2
-Give me an overview of possible FastAPI endpoints for the OCR service. 
-
-# Prompt 3
-Please give me a Python FastAPI implementation. 
-"""
-
-import os
-from typing import Dict, Any, List
-from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from processors import AWSOCRProcessor, GeminiOCRProcessor, OCRResult, HybridOCRProcessor
-
-# Load environment variables from .env file
-load_dotenv('../.env')
-
-# Configuration
-# TODO: Use environment variables
-OCR_PROVIDER = os.getenv("OCR_PROVIDER", "AWS") # Options: AWS, GEMINI, HYBRID
-
-app = FastAPI(
-    title="Logbook OCR Service",
-    description="Modular OCR service supporting AWS Textract and Gemini."
-)
-
-origins = [
-    "*"  # In production, restrict this to your frontend domain
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-def get_processor():
-    if OCR_PROVIDER == "GEMINI":
-        print("Using Gemini OCR Processor")
-        return GeminiOCRProcessor()
-
-    if OCR_PROVIDER == "HYBRID":
-        print("Using Hybrid OCR Processor")
-        return HybridOCRProcessor()
-    
-    print("Using AWS OCR Processor")
-    return AWSOCRProcessor()
-
-@app.post(
-    "/ocr/process",
-    response_model=OCRResult,
-    status_code=200
-)
-async def process_logbook(
-    file: UploadFile = File(..., description="Image of the logbook page (PNG or JPEG, Max 5MB)")
-):
-    """
-    Uploads a single-page image and processes it using the configured OCR provider.
-    """
-    # 1. Read file bytes
-    file_bytes = await file.read()
-    
-    # 2. Validate file size and type
-    if file.content_type not in ["image/png", "image/jpeg"]:
-        raise HTTPException(status_code=400, detail="File must be a PNG or JPEG image.")
-    
-    # Size limit might depend on provider, but keeping 5MB as a safe default for now
-    if len(file_bytes) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=413, detail="File size exceeds the 5MB limit.")
-
-    try:
-        processor = get_processor()
-        result = await processor.process_image(file_bytes, mime_type=file.content_type)
-        return result
-
-    except Exception as e:
-        print(f"Processing Error: {e}")
-        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
-
+# To try out the endpoint, first install dependencies: 
+# pip install fastapi "uvicorn[standard]" pydantic boto3 python-multipart python-dotenv
+# Then, inside ocr directory, run:
+# uvicorn main:app --reload 
+# And navigate to http://127.0.0.1:8000/docs
+# For production (multiple workers sharing one result cache), run:
+# python serve.py --workers 4
+
+"""
+Gemini Prompts 
+# Prompt 1
+You are an expert full-stack developer with experience using Next.js.
+
+I'm building an app where pilots-in-training can upload photos of their logbook pages and their flight data (destination & source airports, hours spent in flight, number of landings, etc) is scanned w/ OCR and digitized, allowing them to upload their entire flight history and view their cumulative number of hours, as well as progress towards their pilot's license. 
+
+The app is in Next.js and we are using the Python implementation of AWS Textract for OCR. Right now, I need to write FastAPI endpoints which the frontend can use to call AWS Textract after the use uploads an image of a logbook page to be parsed and stored. 
+
+Don't write any code yet, but provide a high-level start-to-end overview of how a PNG can be parsed with AWS Textract and the data stored in a digital database (I'm not sure which database we're using, but I know we're using Prisma), including a discussion of the role of the FastAPI endpoints.
+
+# Prompt 2
+Give me an overview of possible FastAPI endpoints for the OCR service. 
+
+# Prompt 3
+Please give me a Python FastAPI implementation. 
+"""
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, List
+from dotenv import load_dotenv
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from processors import AWSOCRProcessor, GeminiOCRProcessor, OCRProcessor, OCRResult, HybridOCRProcessor, FlightEntry, FlightMatch, PageResult
+from processors import UsageLedger, RoutingOCRProcessor, RequestUsage, begin_request_usage, current_usage
+from cache import ResultCache
+from singleflight import SingleFlight
+from verification import get_flight_index
+from admission import AdmissionController, AdmissionMiddleware
+from documents import DOCUMENT_TYPES, DocumentError, open_document
+
+# Load environment variables from .env file
+load_dotenv('../.env')
+
+# Configuration
+# TODO: Use environment variables
+OCR_PROVIDER = os.getenv("OCR_PROVIDER", "AWS") # Options: AWS, GEMINI, HYBRID
+# Multi-page documents (PDF/TIFF): most pages processed at once (each beyond the first
+# takes its own admission slot), and the upload size limit
+OCR_PAGE_CONCURRENCY = int(os.getenv("OCR_PAGE_CONCURRENCY", "8"))
+MAX_DOCUMENT_BYTES = int(os.getenv("OCR_MAX_DOCUMENT_MB", "100")) * 1024 * 1024
+
+# Shared across worker processes when OCR_CACHE_PATH is set (see serve.py)
+result_cache = ResultCache.from_env()
+
+# Concurrent identical requests within a worker share one provider call
+inflight = SingleFlight()
+
+# Per-client, per-provider cost and usage totals for this worker
+usage_ledger = UsageLedger()
+
+# Bounds concurrent OCR work per worker; overflow is queued briefly or rejected with 429
+admission = AdmissionController.from_env()
+
+# Processors are created once per worker and reused across requests
+_processors: Dict[str, OCRProcessor] = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the processor (clients, credentials) before the first request arrives
+    get_processor()
+    yield
+    # Runs after uvicorn has drained in-flight requests
+    if result_cache:
+        result_cache.close()
+
+app = FastAPI(
+    title="Logbook OCR Service",
+    description="Modular OCR service supporting AWS Textract and Gemini.",
+    lifespan=lifespan
+)
+
+# Added before CORS so that 429 responses still carry CORS headers
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+origins = [
+    "*"  # In production, restrict this to your frontend domain
+]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+def create_processor(provider: str) -> OCRProcessor:
+    if provider == "GEMINI":
+        print("Using Gemini OCR Processor")
+        return GeminiOCRProcessor()
+
+    if provider == "HYBRID":
+        print("Using Hybrid OCR Processor")
+        return HybridOCRProcessor()
+
+    if provider == "AUTO":
+        print("Using Routing OCR Processor (per-page AWS | GEMINI | HYBRID)")
+        return RoutingOCRProcessor()
+    
+    print("Using AWS OCR Processor")
+    return AWSOCRProcessor()
+
+def get_processor() -> OCRProcessor:
+    processor = _processors.get(OCR_PROVIDER)
+    if processor is None:
+        processor = create_processor(OCR_PROVIDER)
+        _processors[OCR_PROVIDER] = processor
+    return processor
+
+def get_client_id(request: Request) -> str:
+    return request.headers.get("X-Client-Id") or (request.client.host if request.client else "unknown")
+
+async def run_ocr(processor: OCRProcessor, file_bytes: bytes, mime_type: str) -> OCRResult:
+    """
+    Runs a single page through the processor, consulting the shared result cache first.
+    Concurrent duplicates (same image and provider configuration) are coalesced into one call.
+    Cache hits and coalesced calls are recorded as savings in the request's usage.
+    """
+    usage = current_usage()
+    key = ResultCache.key(file_bytes, processor.provider_key)
+    if result_cache:
+        cached = result_cache.get(key)
+        if cached is not None:
+            if usage:
+                usage.cache_hit = True
+                usage.saved_usd += cached.usage.cost_usd if cached.usage else 0.0
+            return cached
+
+    coalesced = key in inflight
+    result = await inflight.do(key, lambda: _process_and_cache(processor, key, file_bytes, mime_type))
+    if usage and coalesced:
+        usage.coalesced = True
+        usage.saved_usd += result.usage.cost_usd if result.usage else 0.0
+    return result
+
+async def _process_and_cache(processor: OCRProcessor, key: str, file_bytes: bytes, mime_type: str) -> OCRResult:
+    result = await processor.process_image(file_bytes, mime_type=mime_type)
+
+    # Keep what it cost to produce this result, so cache hits can report savings
+    usage = current_usage()
+    if usage:
+        result = result.model_copy(update={"usage": usage.model_copy()})
+
+    # Only cache pages that produced records; empty results may be transient provider errors
+    if result_cache and result.records:
+        result_cache.put(key, result)
+    return result
+
+async def process_document(processor: OCRProcessor, document, usage: RequestUsage, client: str, lane: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs every page of an opened PDF/TIFF (see open_document) through run_ocr.
+    Pages are split off the upload one at a time, only as fast as they are processed.
+    The request's own admission slot runs one page; each further page running at once
+    takes another slot from the admission controller for the same client and lane,
+    up to OCR_PAGE_CONCURRENCY pages, and only while slots are free. A large document
+    therefore slows down under load instead of bypassing the admission limits.
+    Yields a progress event per finished page (in completion order), then the stitched
+    result with records in page order. Each page is accounted separately and added to `usage`.
+    """
+    page_count, pages = document
+    # Slots pages can run in: None is the request's own, the rest are admission times
+    slots: asyncio.Queue = asyncio.Queue()
+    slots.put_nowait(None)
+    extra_slots: List[float] = []
+    finished: asyncio.Queue = asyncio.Queue()
+    tasks = []
+
+    async def run_page(number: int, slot, page_bytes: bytes, page_mime_type: str):
+        # Tasks run in a copy of the context, so this usage belongs to the page alone
+        page_usage = begin_request_usage()
+        try:
+            result = await run_ocr(processor, page_bytes, page_mime_type)
+        except Exception as e:
+            print(f"Page {number} Processing Error: {e}")
+            result = OCRResult(message=f"Error processing page: {str(e)}", records=[])
+        finally:
+            slots.put_nowait(slot)
+        await finished.put((number, result, page_usage))
+
+    results: Dict[int, OCRResult] = {}
+
+    def progress(number: int, result: OCRResult, page_usage: RequestUsage) -> Dict[str, Any]:
+        usage.add(page_usage)
+        results[number] = result
+        return {
+            "event": "page",
+            "page": number,
+            "pages_done": len(results),
+            "pages_total": page_count,
+            "records": len(result.records),
+            "message": result.message,
+        }
+
+    try:
+        number = 0
+        while True:
+            if slots.empty() and len(extra_slots) < OCR_PAGE_CONCURRENCY - 1 and number < page_count:
+                admitted_at = admission.try_acquire(client, lane)
+                if admitted_at is not None:
+                    extra_slots.append(admitted_at)
+                    slots.put_nowait(admitted_at)
+            slot = await slots.get()
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                slots.put_nowait(slot)
+                break
+            number += 1
+            tasks.append(asyncio.create_task(run_page(number, slot, *page)))
+            while not finished.empty():
+                yield progress(*finished.get_nowait())
+
+        while len(results) < len(tasks):
+            yield progress(*await finished.get())
+    finally:
+        # The client went away or splitting failed: stop the remaining pages
+        for task in tasks:
+            task.cancel()
+        for admitted_at in extra_slots:
+            admission.release(client, lane, admitted_at)
+
+    records = []
+    page_results = []
+    for number in sorted(results):
+        records.extend(results[number].records)
+        page_results.append(PageResult(page=number, message=results[number].message, recordCount=len(results[number].records)))
+    yield {
+        "event": "result",
+        "result": OCRResult(
+            message=f"Processed {len(page_results)} pages, {len(records)} flight records",
+            records=records,
+            pages=page_results,
+        ),
+    }
+
+@app.post(
+    "/ocr/process",
+    response_model=OCRResult,
+    response_model_exclude_none=True,
+    status_code=200
+)
+async def process_logbook(
+    request: Request,
+    file: UploadFile = File(..., description="Image of the logbook page (PNG or JPEG, Max 5MB), or a multi-page PDF/TIFF scan"),
+    verify: bool = Query(False, description="Also match the extracted records against the flight archive"),
+    tolerance_minutes: float = Query(60, description="Allowed difference between logged and archived flight duration"),
+    stream: bool = Query(False, description="For PDF/TIFF uploads, stream per-page progress as NDJSON before the result")
+):
+    """
+    Uploads a single-page image, or a multi-page PDF/TIFF document, and processes it using the configured OCR provider.
+    """
+    if file.content_type in DOCUMENT_TYPES:
+        # Documents are split page by page straight from the spooled upload, never read whole
+        if file.size is not None and file.size > MAX_DOCUMENT_BYTES:
+            raise HTTPException(status_code=413, detail=f"File size exceeds the {MAX_DOCUMENT_BYTES // (1024 * 1024)}MB limit.")
+        return await process_document_upload(request, file, verify, tolerance_minutes, stream)
+
+    # 1. Read file bytes
+    file_bytes = await file.read()
+    
+    # 2. Validate file size and type
+    if file.content_type not in ["image/png", "image/jpeg"]:
+        raise HTTPException(status_code=400, detail="File must be a PNG or JPEG image, or a PDF or TIFF document.")
+    
+    # Size limit might depend on provider, but keeping 5MB as a safe default for now
+    if len(file_bytes) > 5 * 1024 * 1024:
+        raise HTTPException(status_code=413, detail="File size exceeds the 5MB limit.")
+
+    usage = begin_request_usage()
+    provider = OCR_PROVIDER
+    try:
+        processor = get_processor()
+        provider = processor.provider_key
+        result = await run_ocr(processor, file_bytes, file.content_type)
+        # Results may be shared with coalesced requests, so attach per-request data to a copy
+        update = {"usage": usage}
+        if verify:
+            update["verification"] = get_flight_index().match_all(result.records, tolerance_minutes)
+        return result.model_copy(update=update)
+
+    except Exception as e:
+        print(f"Processing Error: {e}")
+        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+    finally:
+        usage_ledger.add(get_client_id(request), provider, usage)
+
+async def process_document_upload(request: Request, file: UploadFile, verify: bool, tolerance_minutes: float, stream: bool):
+    # Opened before responding, so unreadable files are a 400 even when streaming
+    try:
+        document = await asyncio.to_thread(open_document, file.file, file.content_type)
+    except DocumentError as e:
+        raise HTTPException(status_code=400, detail=f"Could not read document: {e}")
+
+    usage = begin_request_usage()
+    processor = get_processor()
+    client_id = get_client_id(request)
+    lane = request.headers.get("X-OCR-Lane", "interactive").lower()
+
+    async def events() -> AsyncIterator[Dict[str, Any]]:
+        try:
+            async for event in process_document(processor, document, usage, client_id, lane):
+                if event["event"] == "result":
+                    update = {"usage": usage}
+                    if verify:
+                        update["verification"] = get_flight_index().match_all(event["result"].records, tolerance_minutes)
+                    event["result"] = event["result"].model_copy(update=update)
+                yield event
+        finally:
+            usage_ledger.add(client_id, processor.provider_key, usage)
+
+    if stream:
+        async def ndjson():
+            try:
+                async for event in events():
+                    if event["event"] == "result":
+                        event = {"event": "result", **event["result"].model_dump(exclude_none=True)}
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                print(f"Document Processing Error: {e}")
+                yield json.dumps({"event": "error", "detail": f"OCR processing failed: {str(e)}"}) + "\n"
+            finally:
+                await file.close()
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    result = None
+    try:
+        async for event in events():
+            if event["event"] == "page":
+                print(f"Page {event['page']} done ({event['pages_done']}/{event['pages_total']}): {event['message']}")
+            else:
+                result = event["result"]
+        return result
+    except DocumentError as e:
+        raise HTTPException(status_code=400, detail=f"Could not read document: {e}")
+    except Exception as e:
+        print(f"Document Processing Error: {e}")
+        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+@app.get("/ocr/usage")
+async def get_usage(client: str = None, provider: str = None):
+    """
+    Returns provider usage and cost aggregated per client, provider and hour (for this worker).
+    """
+    return {
+        "window_seconds": usage_ledger.window_seconds,
+        "windows": usage_ledger.summary(client=client, provider=provider),
+    }
+
+
+@app.get("/ocr/admission")
+async def get_admission():
+    """
+    Returns running and queued requests per lane and rejection counts (for this worker).
+    """
+    return admission.snapshot()
+
+
+@app.get("/ocr/routing")
+async def get_routing():
+    """
+    Returns the routing decisions and rolling per-provider stats when OCR_PROVIDER=AUTO (for this worker).
+    """
+    processor = get_processor()
+    if not isinstance(processor, RoutingOCRProcessor):
+        raise HTTPException(status_code=404, detail="Routing is only available with OCR_PROVIDER=AUTO")
+    return processor.metrics()
+
+
+@app.post(
+    "/verify",
+    response_model=List[FlightMatch],
+    status_code=200
+)
+async def verify_flights(
+    entries: List[FlightEntry],
+    tolerance_minutes: float = Query(60, description="Allowed difference between logged and archived flight duration")
+):
+    """
+    Matches a batch of flight entries against the flight archive in one call.
+    """
+    return get_flight_index().match_all(entries, tolerance_minutes)
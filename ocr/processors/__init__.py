@@ -1,4 +1,8 @@
-from .base import OCRProcessor, OCRResult, FlightEntry
+from .base import OCRProcessor, OCRResult, FlightEntry, ArchivedFlight, FlightMatch, PageResult
 from .aws_processor import AWSOCRProcessor
+from .textract_pool import TextractPool
 from .gemini_processor import GeminiOCRProcessor
 from .hybrid_processor import HybridOCRProcessor
+from .routing_processor import RoutingOCRProcessor
+from .archive import ResponseArchive
+from .accounting import RequestUsage, UsageLedger, begin_request_usage, current_usage
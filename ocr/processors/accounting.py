@@ -0,0 +1,158 @@
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+# Structured (one JSON object per line) usage log
+logger = logging.getLogger("ocr.usage")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# List prices in USD. Textract is billed per page by feature type,
+# Gemini per million input/output tokens.
+TEXTRACT_PRICE_PER_PAGE = {
+    "TABLES": 0.015,
+    "FORMS": 0.05,
+    "QUERIES": 0.015,
+    "SIGNATURES": 0.0035,
+    "LAYOUT": 0.004,
+}
+GEMINI_PRICE_PER_MILLION_TOKENS = {
+    # model: (input, output)
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+
+class RequestUsage(BaseModel):
+    """Provider usage and cost of a single OCR request."""
+    textract_pages: int = 0
+    textract_feature_types: List[str] = []
+    textract_retries: int = 0
+    gemini_calls: int = 0
+    gemini_retries: int = 0
+    gemini_input_tokens: int = 0
+    gemini_output_tokens: int = 0
+    cache_hit: bool = False
+    coalesced: bool = False
+    cost_usd: float = 0.0
+    saved_usd: float = 0.0
+
+    def add(self, other: "RequestUsage"):
+        """Adds another request's usage, e.g. one page of a multi-page document."""
+        for field in ("textract_pages", "textract_retries", "gemini_calls", "gemini_retries",
+                      "gemini_input_tokens", "gemini_output_tokens", "cost_usd", "saved_usd"):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.textract_feature_types = sorted(set(self.textract_feature_types) | set(other.textract_feature_types))
+        self.cache_hit = self.cache_hit or other.cache_hit
+        self.coalesced = self.coalesced or other.coalesced
+
+
+# Usage of the request being processed. asyncio.to_thread copies the context,
+# so provider calls made in worker threads record into the same object.
+_current_usage: ContextVar[Optional[RequestUsage]] = ContextVar("ocr_request_usage", default=None)
+
+
+def begin_request_usage() -> RequestUsage:
+    usage = RequestUsage()
+    _current_usage.set(usage)
+    return usage
+
+
+def current_usage() -> Optional[RequestUsage]:
+    return _current_usage.get()
+
+
+def record_textract(response: Dict[str, Any], feature_types: List[str]):
+    """Records an analyze_document call from its response metadata."""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    pages = response.get("DocumentMetadata", {}).get("Pages", 1)
+    usage.textract_pages += pages
+    usage.textract_feature_types = sorted(set(usage.textract_feature_types) | set(feature_types))
+    usage.textract_retries += response.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+    usage.cost_usd += pages * sum(TEXTRACT_PRICE_PER_PAGE.get(feature, 0.0) for feature in feature_types)
+
+
+def record_gemini(model: str, response: Any, retry: bool = False):
+    """Records a generate_content call from the response's usage_metadata."""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    metadata = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(metadata, "prompt_token_count", None)
+    output_tokens = getattr(metadata, "candidates_token_count", None)
+    input_tokens = input_tokens if isinstance(input_tokens, int) else 0
+    output_tokens = output_tokens if isinstance(output_tokens, int) else 0
+
+    usage.gemini_calls += 1
+    if retry:
+        usage.gemini_retries += 1
+    usage.gemini_input_tokens += input_tokens
+    usage.gemini_output_tokens += output_tokens
+    input_price, output_price = GEMINI_PRICE_PER_MILLION_TOKENS.get(model, (0.0, 0.0))
+    usage.cost_usd += (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class UsageLedger:
+    """
+    Aggregates request usage per client, provider and fixed time window
+    (per worker process; the structured usage log covers all workers).
+    """
+
+    def __init__(self, window_seconds: int = 3600, max_windows: int = 24 * 7):
+        self.window_seconds = window_seconds
+        self.max_windows = max_windows
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+
+    def add(self, client: str, provider: str, usage: RequestUsage):
+        window_start = int(time.time()) // self.window_seconds * self.window_seconds
+        with self._lock:
+            totals = self._totals.setdefault((window_start, client, provider), {
+                "requests": 0,
+                "cache_hits": 0,
+                "coalesced": 0,
+                "textract_pages": 0,
+                "textract_retries": 0,
+                "gemini_calls": 0,
+                "gemini_retries": 0,
+                "gemini_input_tokens": 0,
+                "gemini_output_tokens": 0,
+                "cost_usd": 0.0,
+                "saved_usd": 0.0,
+            })
+            totals["requests"] += 1
+            totals["cache_hits"] += int(usage.cache_hit)
+            totals["coalesced"] += int(usage.coalesced)
+            for field in ("textract_pages", "textract_retries", "gemini_calls", "gemini_retries",
+                          "gemini_input_tokens", "gemini_output_tokens", "cost_usd", "saved_usd"):
+                totals[field] += getattr(usage, field)
+
+            # Drop the oldest windows
+            oldest = window_start - self.max_windows * self.window_seconds
+            for key in [key for key in self._totals if key[0] < oldest]:
+                del self._totals[key]
+
+        logger.info(json.dumps({
+            "event": "ocr_usage",
+            "client": client,
+            "provider": provider,
+            **usage.model_dump(),
+        }))
+
+    def summary(self, client: Optional[str] = None, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = sorted(self._totals.items())
+        return [
+            {"window_start": window_start, "client": key_client, "provider": key_provider, **totals}
+            for (window_start, key_client, key_provider), totals in items
+            if (client is None or key_client == client) and (provider is None or key_provider == provider)
+        ]
@@ -0,0 +1,170 @@
+import gzip
+import os
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from .base import FlightEntry
+
+DEFAULT_AIRPORTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "airports.txt.gz")
+
+# Character pairs OCR (and handwriting) mix up, with their substitution cost in
+# quarter edits. The common confusions are cheapest, so "KSM0" is closer to
+# "KSMO" than to "KSMD" or "KSMA".
+CONFUSABLE_PAIRS = {
+    ("0", "O"): 1, ("1", "I"): 1, ("5", "S"): 1, ("2", "Z"): 1, ("8", "B"): 1,
+    ("0", "D"): 2, ("0", "Q"): 2, ("O", "D"): 2, ("O", "Q"): 2, ("1", "L"): 2,
+    ("1", "T"): 2, ("I", "L"): 2, ("6", "G"): 2, ("4", "A"): 2, ("7", "T"): 2,
+    ("U", "V"): 2, ("M", "N"): 2, ("P", "R"): 2, ("K", "X"): 2, ("C", "G"): 2,
+    ("E", "F"): 2,
+}
+_CONFUSIONS: Dict[str, Dict[str, int]] = {}
+for (_a, _b), _cost in CONFUSABLE_PAIRS.items():
+    _CONFUSIONS.setdefault(_a, {})[_b] = _cost
+    _CONFUSIONS.setdefault(_b, {})[_a] = _cost
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+EDIT_COST = 4  # Any other substitution, insertion or deletion
+
+
+class AirportIndex:
+    """
+    Airport codes (ICAO, plus FAA identifiers where they differ) for validating
+    and correcting OCR'd srcIcao/destIcao values.
+
+    Codes are kept as one sorted tuple and a frozenset, so validation is a single
+    hash lookup. Correction generates the variants of a code within one edit (or
+    two cheap OCR confusions) and looks each one up, which takes a few hundred
+    set lookups regardless of how many airports are loaded.
+    """
+
+    def __init__(self, airports: Dict[str, str], preferred: Iterable[str] = ()):
+        """
+        airports maps every known code (ICAO or FAA identifier) to its ICAO code.
+        preferred codes (airports with scheduled service) win ties between equally close candidates.
+        """
+        self._canonical = airports
+        self.codes: Tuple[str, ...] = tuple(sorted(airports))
+        self._known: FrozenSet[str] = frozenset(self.codes)
+        self._preferred: FrozenSet[str] = frozenset(preferred)
+
+    @classmethod
+    def from_file(cls, path: str) -> "AirportIndex":
+        """Loads the bundled list (see util/build_airports.py): "[*]ICAO [FAA_ID]" per line."""
+        airports = {}
+        preferred = []
+        with gzip.open(path, "rt", encoding="ascii") as f:
+            for line in f:
+                codes = line.split()
+                if codes and codes[0].startswith("*"):
+                    codes[0] = codes[0][1:]
+                    preferred.extend(codes)
+                for code in codes:
+                    airports[code] = codes[0]
+        return cls(airports, preferred)
+
+    @staticmethod
+    def normalize(code: str) -> str:
+        return re.sub(r"[^A-Z0-9]", "", code.upper())
+
+    def is_valid(self, code: str) -> bool:
+        return code in self._known
+
+    def canonical(self, code: Optional[str]) -> Optional[str]:
+        """The ICAO code for an ICAO code or FAA identifier (e.g. "SMO" -> "KSMO"); unknown codes are returned normalized."""
+        if not code:
+            return code
+        normalized = self.normalize(code)
+        return self._canonical.get(normalized, normalized)
+
+    def nearest(self, code: str, max_cost: int = EDIT_COST) -> List[Tuple[int, str]]:
+        """Known codes within max_cost (in quarter edits) of code, cheapest first."""
+        code = self.normalize(code)
+        costs: Dict[str, int] = {}
+
+        def consider(candidate: str, cost: int):
+            if cost <= max_cost and candidate in self._known and cost < costs.get(candidate, max_cost + 1):
+                costs[candidate] = cost
+
+        consider(code, 0)
+        for i, char in enumerate(code):
+            confusions = _CONFUSIONS.get(char, {})
+            for other in ALPHABET:
+                if other != char:
+                    consider(code[:i] + other + code[i + 1:], confusions.get(other, EDIT_COST))
+            consider(code[:i] + code[i + 1:], EDIT_COST)
+            # Two confusions in one code, e.g. "K5M0" -> "KSMO"
+            for other, cost in confusions.items():
+                for j in range(i + 1, len(code)):
+                    for second, second_cost in _CONFUSIONS.get(code[j], {}).items():
+                        consider(code[:i] + other + code[i + 1:j] + second + code[j + 1:], cost + second_cost)
+        for i in range(len(code) + 1):
+            for other in ALPHABET:
+                consider(code[:i] + other + code[i:], EDIT_COST)
+
+        return sorted((cost, candidate) for candidate, cost in costs.items())
+
+    def correct(self, code: str) -> Optional[str]:
+        """
+        Returns the known code a garbled one most likely stands for, or None when
+        the code is already valid, blank, or has no unambiguous near miss.
+
+        Only OCR confusions count as near misses (cheaper than one arbitrary edit),
+        so free text like "LOCAL" is never rewritten into some nearby code.
+        """
+        normalized = self.normalize(code)
+        if not normalized:
+            return None
+        if normalized in self._known:
+            # Only case or stray punctuation differed
+            return normalized if normalized != code else None
+        matches = self.nearest(normalized, max_cost=EDIT_COST - 1)
+        if not matches:
+            return None
+        best = [candidate for cost, candidate in matches if cost == matches[0][0]]
+        if len(best) > 1:
+            best = [candidate for candidate in best if candidate in self._preferred]
+        return best[0] if len(best) == 1 else None
+
+
+def correct_airport_codes(records: List[FlightEntry], index: Optional["AirportIndex"] = None) -> List[FlightEntry]:
+    """Replaces near-miss airport codes with the known code they most likely stand for."""
+    if index is None:
+        index = get_airport_index()
+    if index is None:
+        return records
+    corrected = []
+    for record in records:
+        update = {}
+        for field in ("srcIcao", "destIcao"):
+            code = getattr(record, field)
+            replacement = index.correct(code)
+            if replacement:
+                update[field] = replacement
+            elif code.strip() and not index.is_valid(index.normalize(code)):
+                print(f"Unrecognized airport code {code!r} in {field}; left unchanged")
+        if update:
+            print(f"Corrected airport codes: {', '.join(f'{getattr(record, field)} -> {code}' for field, code in update.items())}")
+            record = record.model_copy(update=update)
+        corrected.append(record)
+    return corrected
+
+
+_airport_index: Optional[AirportIndex] = None
+_airport_index_loaded = False
+
+
+def get_airport_index() -> Optional[AirportIndex]:
+    """
+    Loads the index once per process from OCR_AIRPORTS_PATH (default: the bundled
+    data/airports.txt.gz). Set OCR_AIRPORTS_PATH to an empty string to disable it.
+    """
+    global _airport_index, _airport_index_loaded
+    if not _airport_index_loaded:
+        path = os.getenv("OCR_AIRPORTS_PATH", DEFAULT_AIRPORTS_PATH)
+        if path:
+            try:
+                _airport_index = AirportIndex.from_file(path)
+                print(f"Loaded {len(_airport_index.codes)} airport codes from {path}")
+            except OSError as e:
+                print(f"Warning: airport index not loaded ({e}). Airport codes will not be corrected.")
+        _airport_index_loaded = True
+    return _airport_index
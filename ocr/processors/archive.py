@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from .base import FlightEntry
+
+
+class ResponseArchive:
+    """
+    Compressed on-disk archive of raw provider responses (Textract analyze_document
+    output and Gemini text), keyed by image hash and timestamp.
+
+    Each call is stored as <root>/<hash[:2]>/<hash>-<timestamp>-<provider>.json.gz
+    together with the records the parser produced at the time, so that
+    util/reparse_archive.py can re-run the current parser offline and diff the output.
+    Responses the parser failed on are stored too, with no records and the error.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseArchive"]:
+        """Returns an archive if OCR_ARCHIVE_DIR is set, otherwise None (archiving disabled)."""
+        root = os.getenv("OCR_ARCHIVE_DIR")
+        return cls(root) if root else None
+
+    def save(
+        self,
+        file_bytes: bytes,
+        provider: str,
+        response: Any,
+        records: List[FlightEntry],
+        mime_type: str = "image/jpeg",
+        error: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Writes one archive entry. Failures are logged and swallowed so that
+        archiving never fails an OCR request.
+        """
+        image_hash = hashlib.sha256(file_bytes).hexdigest()
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        entry = {
+            "image_sha256": image_hash,
+            "timestamp": timestamp,
+            "provider": provider,
+            "mime_type": mime_type,
+            "response": response,
+            "records": [record.model_dump() for record in records],
+        }
+        if error:
+            entry["error"] = error
+
+        directory = os.path.join(self.root, image_hash[:2])
+        path = os.path.join(directory, f"{image_hash}-{timestamp}-{provider}.json.gz")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            tmp_path = path + ".tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(entry, f, default=str)
+            os.replace(tmp_path, path)
+            return path
+        except OSError as e:
+            print(f"Archive Error: {e}")
+            return None
+
+    def iter_paths(self) -> Iterator[str]:
+        """Yields the path of every archive entry, oldest first within each image."""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json.gz"):
+                    yield os.path.join(directory, name)
+
+    @staticmethod
+    def load(path: str) -> Dict[str, Any]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
@@ -1,29 +1,40 @@
+import asyncio
 import boto3
 import re
 import os
 from typing import List, Dict, Any, Optional, Tuple
 from .base import OCRProcessor, OCRResult, FlightEntry
+from .archive import ResponseArchive
+from .accounting import record_textract
+from .templates import (
+    MIN_CONFIRMATIONS, REVALIDATE_EVERY, LayoutTemplate, TemplateStore, layout_fingerprint, learn_mapping,
+    normalize_record,
+)
+from .textract_pool import TextractPool
+from .airports import correct_airport_codes
 
 class AWSOCRProcessor(OCRProcessor):
     def __init__(self, region_name: str = "us-west-1"):
-        self.client = boto3.client('textract', region_name=region_name, aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"), aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"))
+        # AWS_TEXTRACT_REGIONS replaces the single client with a multi-region pool
+        pool = TextractPool.from_env()
+        if pool:
+            self.region_name = "+".join(pool.region_names)
+            self.client = pool
+        else:
+            self.region_name = region_name
+            self.client = boto3.client('textract', region_name=region_name, aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"), aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"))
+        self.archive = ResponseArchive.from_env()
+        self.templates = TemplateStore.from_env()
+
+    @property
+    def provider_key(self) -> str:
+        return f"{type(self).__name__}:{self.region_name}"
 
     async def process_image(self, file_bytes: bytes, mime_type: str = "image/jpeg") -> OCRResult:
         try:
-            textract_response = self.analyze_document(file_bytes)
-
-            records = self._parse_textract_json(textract_response)
-            
-            if not records:
-                 return OCRResult(
-                    message="No valid flight records found in the image.",
-                    records=[]
-                )
-
-            return OCRResult(
-                message=f"Successfully processed {len(records)} flight records",
-                records=records
-            )
+            # boto3 is blocking; keep it off the event loop
+            textract_response = await asyncio.to_thread(self.analyze_document, file_bytes)
+            return await self.process_textract_response(file_bytes, textract_response, mime_type)
         except Exception as e:
             print(f"AWS Textract Processing Error: {e}")
             return OCRResult(
@@ -31,15 +42,45 @@ class AWSOCRProcessor(OCRProcessor):
                 records=[]
             )
 
+    async def process_textract_response(self, file_bytes: bytes, textract_response: Dict[str, Any], mime_type: str = "image/jpeg") -> OCRResult:
+        """
+        Turns an existing Textract response into records.
+        Exposed so the routing processor can reuse a Textract call it already made.
+        """
+        records, error = [], None
+        try:
+            records = correct_airport_codes(self._parse_textract_json(textract_response))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            # The raw response is kept even when it can't be parsed
+            if self.archive:
+                self.archive.save(file_bytes, "AWS", textract_response, records, mime_type, error=error)
+
+        if not records:
+             return OCRResult(
+                message="No valid flight records found in the image.",
+                records=[]
+            )
+
+        return OCRResult(
+            message=f"Successfully processed {len(records)} flight records",
+            records=records
+        )
+
     def analyze_document(self, file_bytes: bytes) -> Dict[str, Any]:
         """
         Calls AWS Textract to analyze the document.
         Exposed for Hybrid processors to use.
         """
-        return self.client.analyze_document(
+        feature_types = ['TABLES']
+        response = self.client.analyze_document(
             Document={'Bytes': file_bytes},
-            FeatureTypes=['TABLES']
+            FeatureTypes=feature_types
         )
+        record_textract(response, feature_types)
+        return response
 
     # --- Methods adapted from textract_table_parser.py ---
     # These are preserved to maintain the original logic structure and allow
@@ -131,6 +172,8 @@ class AWSOCRProcessor(OCRProcessor):
         """
         Returns a list of flight records extracted from Textract JSON.
         Uses the get_rows_columns_map helper to standardize extraction.
+        Tables matching a header-search template, or a Gemini one confirmed by
+        MIN_CONFIRMATIONS pages, skip the header search.
         """
         blocks = raw_json.get('Blocks', [])
         blocks_map = {block['Id']: block for block in blocks}
@@ -146,39 +189,158 @@ class AWSOCRProcessor(OCRProcessor):
             rows, _ = self.get_rows_columns_map(table, blocks_map)
             if not rows:
                 continue
-            
-            # Attempt to find the header row
-            header_row_index = -1
-            header_map = {}
-            
-            sorted_row_indices = sorted(rows.keys())
-            for idx in sorted_row_indices:
-                row_data = rows[idx]
-                temp_map = self._map_headers(row_data)
-                # Heuristic: if we matched at least 3 columns, assume this is the header
-                if len(temp_map) >= 3:
-                    header_row_index = idx
-                    header_map = temp_map
-                    break
-            
-            if header_row_index == -1:
-                # Fallback: assume first row is header if we can't find a better one
-                if sorted_row_indices:
-                    header_row_index = sorted_row_indices[0]
-                    header_map = self._map_headers(rows[header_row_index])
-
-            # Iterate over data rows
-            for row_index in sorted_row_indices:
-                if row_index <= header_row_index:
+
+            fingerprint = self._table_fingerprint(table, rows, blocks_map)
+            template = self.templates.get(fingerprint) if fingerprint else None
+            if template and template.source == "gemini" and template.confirmations < MIN_CONFIRMATIONS:
+                template = None
+            stale = False
+            if template:
+                records = self._parse_rows(rows, template.header_row_index, template.mapping)
+                if records:
+                    all_records.extend(records)
                     continue
-                
-                row_data = rows[row_index]
-                record = self._create_flight_record(row_data, header_map)
-                if record:
-                    all_records.append(record)
+                # A page without data rows says nothing about the layout; data rows
+                # the template can't parse mean it no longer fits, unless the header
+                # search below finds a layout to replace it with
+                stale = any(
+                    any(text.strip() for text in rows[index].values())
+                    for index in rows if index > template.header_row_index
+                )
+
+            header_row_index, header_map, found = self._find_header(rows)
+            records = self._parse_rows(rows, header_row_index, header_map)
+            if fingerprint and found and records:
+                self.templates.put(LayoutTemplate(
+                    fingerprint=fingerprint,
+                    header_row_index=header_row_index,
+                    mapping=header_map,
+                    source="header"
+                ))
+            elif stale:
+                self.templates.discard(fingerprint)
+            all_records.extend(records)
                     
         return all_records
 
+    def _find_header(self, rows: Dict[int, Dict[int, str]]) -> Tuple[int, Dict[str, int], bool]:
+        """
+        Returns (header_row_index, header_map, found) where found is False if the
+        first row was assumed to be the header.
+        """
+        sorted_row_indices = sorted(rows.keys())
+        for idx in sorted_row_indices:
+            row_data = rows[idx]
+            temp_map = self._map_headers(row_data)
+            # Heuristic: if we matched at least 3 columns, assume this is the header
+            if len(temp_map) >= 3:
+                return idx, temp_map, True
+
+        # Fallback: assume first row is header if we can't find a better one
+        header_row_index = sorted_row_indices[0]
+        return header_row_index, self._map_headers(rows[header_row_index]), False
+
+    def _parse_rows(self, rows: Dict[int, Dict[int, str]], header_row_index: int, header_map: Dict[str, int]) -> List[FlightEntry]:
+        records = []
+        # Iterate over data rows
+        for row_index in sorted(rows.keys()):
+            if row_index <= header_row_index:
+                continue
+
+            record = self._create_flight_record(rows[row_index], header_map)
+            if record:
+                records.append(record)
+        return records
+
+    # --- Layout templates ---
+
+    def _column_lefts(self, table: Dict[str, Any], blocks_map: Dict[str, Any]) -> Dict[int, float]:
+        """Left edge of each column in the first row, relative to the table's bounding box."""
+        table_box = table.get('Geometry', {}).get('BoundingBox')
+        lefts = {}
+        if not table_box or not table_box.get('Width'):
+            return lefts
+        for relationship in table.get('Relationships', []):
+            if relationship['Type'] == 'CHILD':
+                for child_id in relationship['Ids']:
+                    cell = blocks_map[child_id]
+                    if cell['BlockType'] == 'CELL' and cell['RowIndex'] == 1 and 'Geometry' in cell:
+                        left = cell['Geometry']['BoundingBox']['Left']
+                        lefts[cell['ColumnIndex']] = (left - table_box['Left']) / table_box['Width']
+        return lefts
+
+    def _table_fingerprint(self, table: Dict[str, Any], rows: Dict[int, Dict[int, str]], blocks_map: Dict[str, Any]) -> Optional[str]:
+        if not self.templates:
+            return None
+        return layout_fingerprint(rows, self._column_lefts(table, blocks_map))
+
+    def parse_with_known_templates(self, raw_json: Dict[str, Any], sources: Tuple[str, ...] = ("gemini",)) -> List[FlightEntry]:
+        """
+        Parses the page directly from the Textract grid if every table matches a known
+        template from one of the given sources, confirmed by MIN_CONFIRMATIONS Gemini
+        pages. Returns [] for unknown layouts, and every REVALIDATE_EVERY uses of a
+        template so the page goes through Gemini and learn_templates re-checks it.
+        Records are normalized like Gemini's (see normalize_record).
+        """
+        if not self.templates:
+            return []
+        blocks = raw_json.get('Blocks', [])
+        blocks_map = {block['Id']: block for block in blocks}
+        records = []
+        for table in (block for block in blocks if block['BlockType'] == "TABLE"):
+            rows, _ = self.get_rows_columns_map(table, blocks_map)
+            if not rows:
+                continue
+            fingerprint = self._table_fingerprint(table, rows, blocks_map)
+            template = self.templates.get(fingerprint)
+            if not template or template.source not in sources:
+                return []
+            if template.source == "gemini" and template.confirmations < MIN_CONFIRMATIONS:
+                return []
+            if template.hits % REVALIDATE_EVERY == 0:
+                return []
+            table_records = self._parse_rows(rows, template.header_row_index, template.mapping)
+            table_records = [record for record in map(normalize_record, table_records) if record]
+            if not table_records:
+                self.templates.discard(fingerprint)
+                return []
+            records.extend(table_records)
+        return records
+
+    def learn_templates(self, raw_json: Dict[str, Any], records: List[FlightEntry]):
+        """
+        Learns a template for each table whose columns agree with records extracted by
+        Gemini. A mapping is confirmed once per agreeing page; a page that disagrees with
+        a learned template (e.g. when it is re-validated) replaces or discards it.
+        """
+        if not self.templates or not records:
+            return
+        blocks = raw_json.get('Blocks', [])
+        blocks_map = {block['Id']: block for block in blocks}
+        for table in (block for block in blocks if block['BlockType'] == "TABLE"):
+            rows, _ = self.get_rows_columns_map(table, blocks_map)
+            if not rows:
+                continue
+            fingerprint = self._table_fingerprint(table, rows, blocks_map)
+            existing = self.templates.get(fingerprint, count_hit=False)
+            if existing and existing.source != "gemini":
+                existing = None
+            learned = learn_mapping(rows, records)
+            if not learned:
+                if existing:
+                    self.templates.discard(fingerprint)
+                continue
+            header_row_index, mapping = learned
+            if existing and (existing.header_row_index, existing.mapping) == (header_row_index, mapping):
+                self.templates.put(existing.model_copy(update={"confirmations": existing.confirmations + 1}))
+            else:
+                self.templates.put(LayoutTemplate(
+                    fingerprint=fingerprint,
+                    header_row_index=header_row_index,
+                    mapping=mapping,
+                    source="gemini"
+                ))
+
     def _map_headers(self, header_row: Dict[int, str]) -> Dict[str, int]:
         mapping = {}
     
@@ -1,6 +1,20 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
+from .accounting import RequestUsage
+
+# Date formats seen in logbooks (Gemini is asked for ISO dates, Textract returns what is written)
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y", "%Y/%m/%d"]
+
+def parse_logbook_date(value: str) -> Optional[date]:
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
 
 # Shared models
 class FlightEntry(BaseModel):
@@ -19,11 +33,43 @@ class FlightEntry(BaseModel):
     nightLandings: int
     remarks: str
 
+class ArchivedFlight(BaseModel):
+    """A flight from the external flight archive (the `flights` table / data/real_flights.json)."""
+    tailNumber: str
+    aircraftModel: Optional[str] = None
+    manufacturer: Optional[str] = None
+    originAirportIcao: Optional[str] = None
+    destinationAirportIcao: Optional[str] = None
+    departureTime: datetime
+    arrivalTime: datetime
+
+class FlightMatch(BaseModel):
+    index: int
+    verified: bool
+    flight: Optional[ArchivedFlight] = None
+
+class PageResult(BaseModel):
+    """Outcome of one page of a multi-page document; its records follow the previous pages' in OCRResult.records."""
+    page: int
+    message: str
+    recordCount: int
+
 class OCRResult(BaseModel):
     message: str
     records: List[FlightEntry]
+    verification: Optional[List[FlightMatch]] = None
+    usage: Optional[RequestUsage] = None
+    pages: Optional[List[PageResult]] = None
 
 class OCRProcessor(ABC):
+    @property
+    def provider_key(self) -> str:
+        """
+        Identifies the provider configuration (provider, region, model, output mode).
+        Used together with the image hash to key caches.
+        """
+        return type(self).__name__
+
     @abstractmethod
     async def process_image(self, file_bytes: bytes, mime_type: str = "image/jpeg") -> OCRResult:
         """
@@ -1,14 +1,171 @@
+import asyncio
 import os
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from pydantic import ValidationError
 from .base import OCRProcessor, OCRResult, FlightEntry
+from .archive import ResponseArchive
+from .accounting import record_gemini
+from .airports import correct_airport_codes
 try:
     from google import genai
     from google.genai import types
 except ImportError:
     print("Warning: google-genai package not found. Gemini processor will not work.")
 
+# Set GEMINI_STRUCTURED_OUTPUT=0 to fall back to free-form text output
+STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "1") != "0"
+
+# Values used when Gemini returns null for a field ("use null or 0 for numbers")
+_FIELD_DEFAULTS = {float: 0.0, int: 0, bool: False, str: ""}
+
+def output_mode() -> str:
+    """Names the output mode in provider keys, so cached results don't cross modes."""
+    return "structured" if STRUCTURED_OUTPUT else "text"
+
+def response_config():
+    """
+    Constrains Gemini's output to a JSON array matching the FlightEntry schema,
+    so the response is valid JSON by construction.
+    """
+    if not STRUCTURED_OUTPUT:
+        return None
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=list[FlightEntry],
+    )
+
+def _strip_fences(text_response: str) -> str:
+    text_response = text_response.strip()
+    # Clean markdown if present (just in case :O )
+    if text_response.startswith("```json"):
+        text_response = text_response[7:]
+    if text_response.startswith("```"):
+        text_response = text_response[3:]
+    if text_response.endswith("```"):
+        text_response = text_response[:-3]
+    return text_response.strip()
+
+def _to_record(item: Any) -> Optional[FlightEntry]:
+    if not isinstance(item, dict):
+        return None
+    item = dict(item)
+    for name, field in FlightEntry.model_fields.items():
+        if item.get(name) is None and field.annotation in _FIELD_DEFAULTS:
+            item[name] = _FIELD_DEFAULTS[field.annotation]
+    try:
+        return FlightEntry(**item)
+    except ValidationError:
+        return None
+
+def salvage_records(text_response: str) -> Tuple[List[Optional[FlightEntry]], List[str]]:
+    """
+    Tolerant parser for Gemini output. Returns one slot per row in page order
+    (None where the row could not be parsed) and the raw text of each broken row.
+
+    Rows are flat JSON objects, so when the array as a whole is malformed every
+    '{...}' fragment is decoded on its own and only the bad ones are lost.
+    """
+    text_response = _strip_fences(text_response)
+    slots: List[Optional[FlightEntry]] = []
+    broken: List[str] = []
+
+    try:
+        data = json.loads(text_response)
+    except json.JSONDecodeError:
+        data = None
+
+    if isinstance(data, list):
+        for item in data:
+            record = _to_record(item)
+            slots.append(record)
+            if record is None:
+                broken.append(json.dumps(item))
+        return slots, broken
+
+    decoder = json.JSONDecoder()
+    position = text_response.find("{")
+    while position != -1:
+        try:
+            item, end = decoder.raw_decode(text_response, position)
+            record = _to_record(item)
+            fragment = text_response[position:end]
+        except json.JSONDecodeError:
+            record = None
+            end = text_response.find("}", position)
+            end = len(text_response) if end == -1 else end + 1
+            fragment = text_response[position:end]
+        slots.append(record)
+        if record is None:
+            broken.append(fragment)
+        position = text_response.find("{", end)
+
+    return slots, broken
+
+def parse_records_json(text_response: str) -> List[FlightEntry]:
+    """
+    Parses Gemini's text output (a JSON array, possibly wrapped in markdown fences) into flight records,
+    keeping every row that can be salvaged.
+    Shared by the Gemini and Hybrid processors and by the offline re-parse tool.
+    """
+    slots, _ = salvage_records(text_response)
+    return [record for record in slots if record is not None]
+
+async def request_gemini(client, model: str, contents: List[Any]) -> Any:
+    """Calls Gemini and records its usage. Returns the raw response."""
+    response = await asyncio.to_thread(
+        client.models.generate_content,
+        model=model,
+        contents=contents,
+        config=response_config()
+    )
+    record_gemini(model, response)
+    return response
+
+async def parse_gemini_response(client, model: str, text_response: str) -> List[FlightEntry]:
+    """
+    Parses Gemini's output tolerantly. Rows that could not be parsed are sent back
+    in a single text-only repair request instead of re-running the page.
+    Returns the records in page order.
+    """
+    slots, broken = salvage_records(text_response)
+    if not broken:
+        return [record for record in slots if record is not None]
+
+    print(f"Gemini returned {len(broken)} malformed rows, requesting repair")
+    prompt = f"""
+        The following flight logbook rows are malformed JSON or have invalid values.
+        Fix each one and return ONLY a JSON array with exactly {len(broken)} objects, in the same order,
+        using the keys: {", ".join(FlightEntry.model_fields)}.
+
+        Rows:
+        {chr(10).join(broken)}
+        """
+    try:
+        repair = await asyncio.to_thread(
+            client.models.generate_content,
+            model=model,
+            contents=[prompt],
+            config=response_config()
+        )
+        record_gemini(model, repair, retry=True)
+        repaired = parse_records_json(repair.text)
+    except Exception as e:
+        print(f"Gemini Repair Error: {e}")
+        repaired = []
+
+    if len(repaired) == len(broken):
+        # Put repaired rows back where the broken ones were
+        repaired_iter = iter(repaired)
+        return [record if record is not None else next(repaired_iter) for record in slots]
+    # Without a row per broken one there is no telling which slot each belongs to
+    if repaired:
+        print(f"Gemini repaired {len(repaired)} of {len(broken)} rows, dropping them to keep page order")
+    return [record for record in slots if record is not None]
+
 class GeminiOCRProcessor(OCRProcessor):
+    MODEL_NAME = 'gemini-2.0-flash'
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         # Initialize Gemini client
@@ -20,6 +177,11 @@ class GeminiOCRProcessor(OCRProcessor):
                 self.client = genai.Client()
              except:
                 self.client = None
+        self.archive = ResponseArchive.from_env()
+
+    @property
+    def provider_key(self) -> str:
+        return f"{type(self).__name__}:{self.MODEL_NAME}:{output_mode()}"
 
     async def process_image(self, file_bytes: bytes, mime_type: str = "image/jpeg") -> OCRResult:
         if not self.client:
@@ -49,9 +211,10 @@ class GeminiOCRProcessor(OCRProcessor):
         """
 
         try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash',
-                contents=[
+            response = await request_gemini(
+                self.client,
+                self.MODEL_NAME,
+                [
                     types.Part.from_bytes(
                         data=file_bytes,
                         mime_type=mime_type,
@@ -59,24 +222,18 @@ class GeminiOCRProcessor(OCRProcessor):
                     prompt
                 ]
             )
-            
-            # Parsing!!!!
-            text_response = response.text.strip()
-            # Clean markdown if present (just in case :O )
-            if text_response.startswith("```json"):
-                text_response = text_response[7:]
-            if text_response.startswith("```"):
-                text_response = text_response[3:]
-            if text_response.endswith("```"):
-                text_response = text_response[:-3]
-            
-            data = json.loads(text_response.strip())
-            
-            records = []
-            if isinstance(data, list):
-                for item in data:
-                    records.append(FlightEntry(**item))
-            
+            text, records, error = None, [], None
+            try:
+                text = response.text
+                records = correct_airport_codes(await parse_gemini_response(self.client, self.MODEL_NAME, text))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                # The raw output is kept even when it can't be parsed
+                if self.archive:
+                    self.archive.save(file_bytes, "GEMINI", text, records, mime_type, error=error)
+
             return OCRResult(
                 message=f"Successfully processed {len(records)} records with Gemini",
                 records=records
@@ -1,8 +1,11 @@
+import asyncio
 import os
 import json
 from typing import Dict, Any, List
 from .base import OCRProcessor, OCRResult, FlightEntry
 from .aws_processor import AWSOCRProcessor
+from .gemini_processor import output_mode, parse_gemini_response, request_gemini
+from .airports import correct_airport_codes
 
 try:
     from google import genai
@@ -15,6 +18,8 @@ class HybridOCRProcessor(AWSOCRProcessor):
     Uses AWS Textract to extract text/tables, then uses Gemini to parse the text into structured data.
     Inherits from AWSOCRProcessor to reuse Textract connection and CSV generation logic.
     """
+    MODEL_NAME = 'gemini-2.0-flash'
+
     def __init__(self, region_name: str = "us-west-1", api_key: str = None):
         super().__init__(region_name=region_name)
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
@@ -26,12 +31,34 @@ class HybridOCRProcessor(AWSOCRProcessor):
              except:
                 self.gemini_client = None
 
+    @property
+    def provider_key(self) -> str:
+        return f"{super().provider_key}:{self.MODEL_NAME}:{output_mode()}"
+
     async def process_image(self, file_bytes: bytes, mime_type: str = "image/jpeg") -> OCRResult:
         if not self.gemini_client:
             raise ValueError("Gemini Client not initialized. Check API Key.")
         
-        textract_response = self.analyze_document(file_bytes)
+        textract_response = await asyncio.to_thread(self.analyze_document, file_bytes)
+        return await self.process_textract_response(file_bytes, textract_response, mime_type)
+
+    async def process_textract_response(self, file_bytes: bytes, textract_response: Dict[str, Any], mime_type: str = "image/jpeg") -> OCRResult:
+        """
+        Turns an existing Textract response into records with Gemini.
+        Exposed so the routing processor can reuse a Textract call it already made.
+        """
+        if not self.gemini_client:
+            raise ValueError("Gemini Client not initialized. Check API Key.")
 
+        # Known layouts are parsed straight from the Textract grid; only unknown ones need Gemini
+        records = correct_airport_codes(self.parse_with_known_templates(textract_response))
+        if records:
+            if self.archive:
+                self.archive.save(file_bytes, "AWS", textract_response, records, mime_type)
+            return OCRResult(
+                message=f"Successfully processed {len(records)} records with Hybrid (known layout template)",
+                records=records
+            )
 
         csv_text = self.get_all_tables_as_csv(textract_response)
 
@@ -71,27 +98,28 @@ class HybridOCRProcessor(AWSOCRProcessor):
         """
 
         try:
-            response = self.gemini_client.models.generate_content(
-                model='gemini-2.0-flash',
-                contents=[prompt]
-            )
-            
-            # Parsing!!!!
-            text_response = response.text.strip()
-            if text_response.startswith("```json"):
-                text_response = text_response[7:]
-            if text_response.startswith("```"):
-                text_response = text_response[3:]
-            if text_response.endswith("```"):
-                text_response = text_response[:-3]
-            
-            data = json.loads(text_response.strip())
-            
-            records = []
-            if isinstance(data, list):
-                for item in data:
-                    records.append(FlightEntry(**item))
-            
+            response = await request_gemini(self.gemini_client, self.MODEL_NAME, [prompt])
+            text, records, error = None, [], None
+            try:
+                text = response.text
+                records = await parse_gemini_response(self.gemini_client, self.MODEL_NAME, text)
+                self.learn_templates(textract_response, records)
+                records = correct_airport_codes(records)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                # The raw output is kept even when it can't be parsed
+                if self.archive:
+                    self.archive.save(
+                        file_bytes,
+                        "HYBRID",
+                        {"textract": textract_response, "gemini": text},
+                        records,
+                        mime_type,
+                        error=error
+                    )
+
             return OCRResult(
                 message=f"Successfully processed {len(records)} records with Hybrid (Textract -> Gemini)",
                 records=records
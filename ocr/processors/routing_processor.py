@@ -0,0 +1,251 @@
+import asyncio
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+from .base import OCRProcessor, OCRResult
+from .aws_processor import AWSOCRProcessor
+from .gemini_processor import GeminiOCRProcessor, output_mode
+from .hybrid_processor import HybridOCRProcessor
+
+# Textract's synchronous API limits
+TEXTRACT_MAX_BYTES = 5 * 1024 * 1024
+TEXTRACT_MAX_DIMENSION = 10000
+
+
+def image_dimensions(file_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """Reads (width, height) from a PNG or JPEG header without decoding the image."""
+    if file_bytes[:8] == b"\x89PNG\r\n\x1a\n" and len(file_bytes) >= 24:
+        return struct.unpack(">II", file_bytes[16:24])
+    if file_bytes[:2] == b"\xff\xd8":
+        position = 2
+        while position + 9 < len(file_bytes):
+            if file_bytes[position] != 0xFF:
+                return None
+            marker = file_bytes[position + 1]
+            length = struct.unpack(">H", file_bytes[position + 2:position + 4])[0]
+            # SOF0-SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", file_bytes[position + 5:position + 9])
+                return width, height
+            position += 2 + length
+    return None
+
+
+def page_signals(textract_response: Dict[str, Any]) -> Dict[str, float]:
+    """Handwriting share and table density of a page, from a Textract response."""
+    words = handwritten = tables = cells = 0
+    for block in textract_response.get("Blocks", []):
+        block_type = block["BlockType"]
+        if block_type == "WORD":
+            words += 1
+            if block.get("TextType") == "HANDWRITING":
+                handwritten += 1
+        elif block_type == "TABLE":
+            tables += 1
+        elif block_type == "CELL":
+            cells += 1
+    return {
+        "words": words,
+        "handwriting_ratio": handwritten / words if words else 0.0,
+        "tables": tables,
+        "cells": cells,
+    }
+
+
+class ProviderStats:
+    """
+    Rolling (exponentially weighted) latency, error rate and record yield for one provider.
+    The yield only averages successful pages, so failures don't also count as empty pages.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.samples = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.records = 0.0
+
+        self.successes = 0
+
+    def observe(self, latency: float, error: bool, records: int):
+        if self.samples == 0:
+            self.latency, self.error_rate = latency, float(error)
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+            self.error_rate += self.alpha * (float(error) - self.error_rate)
+        self.samples += 1
+        if not error:
+            if self.successes == 0:
+                self.records = float(records)
+            else:
+                self.records += self.alpha * (records - self.records)
+            self.successes += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "samples": self.samples,
+            "latency_seconds": round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "records_per_page": round(self.records, 2),
+        }
+
+
+class RoutingOCRProcessor(OCRProcessor):
+    """
+    Picks AWS, GEMINI or HYBRID per page.
+
+    Oversized pages go straight to Gemini. Otherwise the page goes through Textract
+    first (the one call every AWS/HYBRID route needs anyway), and its response is
+    used to classify the page: no tables -> GEMINI, mostly handwriting -> HYBRID,
+    printed -> AWS, with HYBRID as a fallback when AWS finds no records. The
+    Textract response is reused by the chosen route, so classification costs nothing
+    extra.
+
+    Rolling per-provider stats steer away from a degraded provider: one whose error
+    rate is above max_error_rate, or (for AWS, which has the HYBRID fallback) whose
+    pages yield fewer than min_aws_records records on average, so the fallback call
+    is made up front. A degraded provider still gets one probe page every
+    probe_interval seconds, so it recovers once it works again. Latency is tracked
+    for GET /ocr/routing but doesn't affect routing.
+    """
+
+    def __init__(
+        self,
+        aws: Optional[AWSOCRProcessor] = None,
+        gemini: Optional[GeminiOCRProcessor] = None,
+        hybrid: Optional[HybridOCRProcessor] = None,
+        handwriting_threshold: float = 0.3,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+        min_aws_records: float = 0.5,
+        probe_interval: float = 30.0,
+    ):
+        self.aws = aws or AWSOCRProcessor()
+        self.gemini = gemini or GeminiOCRProcessor()
+        self.hybrid = hybrid or HybridOCRProcessor()
+        self.handwriting_threshold = handwriting_threshold
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.min_aws_records = min_aws_records
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._last_probe: Dict[str, float] = {}
+        self.stats = {provider: ProviderStats() for provider in ("AWS", "GEMINI", "HYBRID")}
+        self.decisions: Counter = Counter()
+
+    @property
+    def provider_key(self) -> str:
+        return f"{type(self).__name__}:{self.aws.region_name}:{self.gemini.MODEL_NAME}:{output_mode()}"
+
+    def _degraded(self, provider: str) -> Optional[str]:
+        """Why the stats say to avoid provider ("errors" or "low_yield"), or None."""
+        stats = self.stats[provider]
+        if stats.samples >= self.min_samples and stats.error_rate > self.max_error_rate:
+            return "errors"
+        if provider == "AWS" and stats.successes >= self.min_samples and stats.records < self.min_aws_records:
+            return "low_yield"
+        return None
+
+    def _avoid(self, provider: str, health: Dict[str, Optional[str]]) -> Optional[str]:
+        """
+        Why this page should skip provider, or None. Decided once per page (health
+        memoizes it), and None for a degraded provider whose probe is due.
+        """
+        if provider not in health:
+            with self._lock:
+                problem = self._degraded(provider)
+                now = time.monotonic()
+                if problem and now - self._last_probe.get(provider, float("-inf")) >= self.probe_interval:
+                    self._last_probe[provider] = now
+                    problem = None
+            health[provider] = problem
+        return health[provider]
+
+    def _gemini_available(self) -> bool:
+        return self.gemini.client is not None
+
+    def _choose(self, preferred: str, reason: str, health: Dict[str, Optional[str]]) -> Tuple[str, str]:
+        """Applies live stats and availability to the content-based choice."""
+        if preferred in ("GEMINI", "HYBRID") and not self._gemini_available():
+            return "AWS", f"{reason}, gemini_unavailable"
+        problem = self._avoid(preferred, health)
+        if problem:
+            alternatives = {"AWS": "HYBRID", "HYBRID": "GEMINI", "GEMINI": "HYBRID"}
+            alternative = alternatives[preferred]
+            if (alternative == "AWS" or self._gemini_available()) and not self._avoid(alternative, health):
+                return alternative, f"{reason}, {preferred.lower()}_{problem}"
+        return preferred, reason
+
+    def _record(self, provider: str, reason: str, detail: str, start: float, error: bool, records: int):
+        with self._lock:
+            self.stats[provider].observe(time.perf_counter() - start, error, records)
+            self.decisions[(provider, reason)] += 1
+        print(f"Routed page to {provider}: {reason} ({detail})")
+
+    async def _run(self, provider: str, reason: str, detail: str, coroutine, start: Optional[float] = None) -> OCRResult:
+        """Awaits a route and records it; start is passed when the route began earlier (with the Textract call)."""
+        if start is None:
+            start = time.perf_counter()
+        try:
+            result = await coroutine
+        except Exception:
+            self._record(provider, reason, detail, start, True, 0)
+            raise
+        self._record(provider, reason, detail, start, False, len(result.records))
+        return result.model_copy(update={"message": f"{result.message} (routed to {provider}: {reason}, {detail})"})
+
+    async def process_image(self, file_bytes: bytes, mime_type: str = "image/jpeg") -> OCRResult:
+        dimensions = image_dimensions(file_bytes)
+        detail = f"{len(file_bytes)} bytes, {dimensions[0]}x{dimensions[1]}" if dimensions else f"{len(file_bytes)} bytes"
+        health: Dict[str, Optional[str]] = {}
+        if len(file_bytes) > TEXTRACT_MAX_BYTES or (dimensions and max(dimensions) > TEXTRACT_MAX_DIMENSION):
+            provider, reason = self._choose("GEMINI", "oversized", health)
+            if provider == "GEMINI":
+                return await self._run(provider, reason, detail, self.gemini.process_image(file_bytes, mime_type))
+
+        if self._gemini_available() and self._avoid("AWS", health) == "errors":
+            detail = f"Textract error rate {self.stats['AWS'].error_rate:.0%}"
+            return await self._run("GEMINI", "aws_errors", detail, self.gemini.process_image(file_bytes, mime_type))
+
+        start = time.perf_counter()
+        try:
+            textract_response = await asyncio.to_thread(self.aws.analyze_document, file_bytes)
+        except Exception as e:
+            with self._lock:
+                self.stats["AWS"].observe(time.perf_counter() - start, True, 0)
+            if not self._gemini_available():
+                raise
+            return await self._run("GEMINI", "textract_failed", str(e), self.gemini.process_image(file_bytes, mime_type))
+
+        signals = page_signals(textract_response)
+        detail = f"{signals['tables']} tables, {signals['cells']} cells, {signals['handwriting_ratio']:.0%} handwritten words"
+        if signals["tables"] == 0:
+            provider, reason = self._choose("GEMINI", "no_tables", health)
+        elif signals["handwriting_ratio"] >= self.handwriting_threshold:
+            provider, reason = self._choose("HYBRID", "handwriting", health)
+        else:
+            provider, reason = self._choose("AWS", "printed", health)
+
+        if provider == "GEMINI":
+            return await self._run(provider, reason, detail, self.gemini.process_image(file_bytes, mime_type))
+        # The AWS and HYBRID routes include the Textract call made above
+        if provider == "HYBRID":
+            return await self._run(provider, reason, detail, self.hybrid.process_textract_response(file_bytes, textract_response, mime_type), start)
+
+        result = await self._run(provider, reason, detail, self.aws.process_textract_response(file_bytes, textract_response, mime_type), start)
+        if not result.records and self._gemini_available():
+            return await self._run("HYBRID", "aws_no_records", detail, self.hybrid.process_textract_response(file_bytes, textract_response, mime_type))
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "providers": {provider: stats.snapshot() for provider, stats in self.stats.items()},
+                "decisions": [
+                    {"provider": provider, "reason": reason, "count": count}
+                    for (provider, reason), count in self.decisions.most_common()
+                ],
+            }
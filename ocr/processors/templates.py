@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from .base import FlightEntry, parse_logbook_date
+
+# Fields that can be located by matching Gemini's output against the Textract grid.
+# Booleans are derived from remarks, so they have no column of their own.
+LEARNABLE_FIELDS = [
+    'date', 'tailNumber', 'srcIcao', 'destIcao', 'totalFlightTime', 'picTime',
+    'dualReceivedTime', 'instrumentTime', 'dayLandings', 'nightLandings', 'remarks',
+]
+NUMERIC_FIELDS = {'totalFlightTime', 'picTime', 'dualReceivedTime', 'instrumentTime', 'dayLandings', 'nightLandings'}
+# A learned mapping must locate these, plus every other field Gemini filled in
+CORE_FIELDS = ('date', 'tailNumber', 'srcIcao', 'destIcao', 'totalFlightTime')
+MIN_AGREEMENT = 0.8
+# Gemini pages that must agree on a mapping before it replaces Gemini for the layout
+MIN_CONFIRMATIONS = 3
+# Every this many uses, a learned template's page goes through Gemini again to re-check it
+REVALIDATE_EVERY = 25
+
+
+class LayoutTemplate(BaseModel):
+    """A validated column -> field mapping for one printed logbook layout."""
+    fingerprint: str
+    header_row_index: int
+    mapping: Dict[str, int]
+    source: str  # "header" (header search) or "gemini" (learned from Gemini output)
+    hits: int = 0
+    confirmations: int = 1  # Gemini pages that agreed on this mapping
+
+
+def layout_fingerprint(rows: Dict[int, Dict[int, str]], column_lefts: Dict[int, float]) -> str:
+    """
+    Fingerprints a table layout from its column count, the tokens of its first
+    row (the printed header) and its column geometry relative to the table.
+    """
+    first_row = rows[min(rows)]
+    tokens = [
+        " ".join(re.findall(r'[a-z]+', first_row.get(col, '').lower()))
+        for col in sorted(first_row)
+    ]
+    geometry = [round(column_lefts[col] * 20) for col in sorted(column_lefts)]
+    payload = json.dumps([max(len(cols) for cols in rows.values()), tokens, geometry])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _normalize(field: str, value) -> Optional[str]:
+    if field == 'date':
+        parsed = parse_logbook_date(str(value))
+        return parsed.isoformat() if parsed else None
+    if field in NUMERIC_FIELDS:
+        try:
+            number = float(re.sub(r'[^\d.]', '', str(value)))
+        except ValueError:
+            return None
+        # Zeros and blanks appear in almost every numeric column, so they carry no signal
+        return None if number == 0 else f"{number:g}"
+    text = re.sub(r'\s+', ' ', str(value)).strip().upper()
+    return text or None
+
+
+def learn_mapping(rows: Dict[int, Dict[int, str]], records: List[FlightEntry], min_agreement: float = MIN_AGREEMENT) -> Optional[tuple]:
+    """
+    Infers (header_row_index, mapping) by finding, for each field, the column whose
+    cells agree with the values Gemini extracted. Returns None unless every core field
+    and every other field Gemini filled in is located.
+    """
+    columns = sorted({col for cols in rows.values() for col in cols})
+
+    mapping = {}
+    for field in LEARNABLE_FIELDS:
+        values = [_normalize(field, getattr(record, field)) for record in records]
+        values = [value for value in values if value is not None]
+        if not values:
+            continue
+        best_col, best_score = None, 0.0
+        for col in columns:
+            if col in mapping.values():
+                continue
+            cells = {_normalize(field, cols.get(col, '')) for cols in rows.values()}
+            score = sum(1 for value in values if value in cells) / len(values)
+            if score > best_score:
+                best_col, best_score = col, score
+        if best_col is None or best_score < min_agreement:
+            return None
+        mapping[field] = best_col
+
+    if any(field not in mapping for field in CORE_FIELDS):
+        return None
+
+    # The header is the row just above the first data row
+    dates = {_normalize('date', record.date) for record in records}
+    sorted_row_indices = sorted(rows)
+    for position, idx in enumerate(sorted_row_indices):
+        if _normalize('date', rows[idx].get(mapping['date'], '')) in dates:
+            header_row_index = sorted_row_indices[position - 1] if position > 0 else idx - 1
+            return header_row_index, mapping
+    return None
+
+
+def normalize_record(record: FlightEntry) -> Optional[FlightEntry]:
+    """
+    Puts a record parsed from the grid in the form Gemini returns: ISO date, tail
+    number and airport codes upper-cased without spaces. None if the date doesn't parse
+    (totals and other non-flight rows).
+    """
+    parsed = parse_logbook_date(record.date)
+    if parsed is None:
+        return None
+    return record.model_copy(update={
+        'date': parsed.isoformat(),
+        'tailNumber': re.sub(r'\s+', '', record.tailNumber).upper(),
+        'srcIcao': re.sub(r'\s+', '', record.srcIcao).upper(),
+        'destIcao': re.sub(r'\s+', '', record.destIcao).upper(),
+        'remarks': record.remarks.strip(),
+    })
+
+
+class TemplateStore:
+    """
+    Persistent layout template store (SQLite), shared by all workers.
+    Templates are cached in memory after the first lookup.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory: Dict[str, LayoutTemplate] = {}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS layout_templates (
+                fingerprint TEXT PRIMARY KEY,
+                template TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["TemplateStore"]:
+        """Returns a store if OCR_TEMPLATE_PATH is set, otherwise None (template learning disabled)."""
+        path = os.getenv("OCR_TEMPLATE_PATH")
+        return cls(path) if path else None
+
+    def get(self, fingerprint: str, count_hit: bool = True) -> Optional[LayoutTemplate]:
+        with self._lock:
+            template = self._memory.get(fingerprint)
+            if template is None:
+                row = self._conn.execute(
+                    "SELECT template FROM layout_templates WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+                if row is None:
+                    return None
+                template = LayoutTemplate.model_validate_json(row[0])
+                self._memory[fingerprint] = template
+            if count_hit:
+                template.hits += 1
+            return template
+
+    def put(self, template: LayoutTemplate):
+        with self._lock:
+            self._memory[template.fingerprint] = template
+            self._conn.execute(
+                "INSERT OR REPLACE INTO layout_templates (fingerprint, template, updated_at) VALUES (?, ?, ?)",
+                (template.fingerprint, template.model_dump_json(), time.time()),
+            )
+            self._conn.commit()
+
+    def discard(self, fingerprint: str):
+        """Drops a template that stopped producing records or failed re-validation."""
+        with self._lock:
+            self._memory.pop(fingerprint, None)
+            self._conn.execute("DELETE FROM layout_templates WHERE fingerprint = ?", (fingerprint,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM layout_templates").fetchone()[0]
@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import boto3
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError, ConnectionClosedError, ConnectTimeoutError, EndpointConnectionError, ReadTimeoutError,
+)
+from .accounting import current_usage
+
+# Errors after which another region is tried (the region is throttling or down).
+# Anything else, e.g. an unreadable document, would fail the same way everywhere.
+FAILOVER_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "LimitExceededException",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+}
+CONNECTION_ERRORS = (EndpointConnectionError, ConnectTimeoutError, ReadTimeoutError, ConnectionClosedError)
+
+
+class TextractCapacityError(Exception):
+    """No region had capacity (TPS budget or health) within the queueing deadline."""
+
+
+class TokenBudget:
+    """
+    Region token buckets kept in a SQLite file, so that all worker processes draw
+    on one TPS budget per region. Without it every worker has its own bucket and
+    N workers together send N times the configured TPS.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit, so each take() is one explicit BEGIN IMMEDIATE transaction
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS textract_budget (
+                region TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                refilled_at REAL NOT NULL
+            )
+            """
+        )
+
+    @classmethod
+    def from_env(cls) -> Optional["TokenBudget"]:
+        """Returns a budget if AWS_TEXTRACT_BUDGET_PATH is set, otherwise None (per-process buckets)."""
+        path = os.getenv("AWS_TEXTRACT_BUDGET_PATH")
+        return cls(path) if path else None
+
+    def take(self, region_name: str, tps: float) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Wall-clock time, since the monotonic clock isn't comparable across processes
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, refilled_at FROM textract_budget WHERE region = ?", (region_name,)
+                ).fetchone()
+                capacity = max(1.0, tps)
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * tps)
+                wait = 0.0
+                if tokens >= 1.0:
+                    tokens -= 1.0
+                else:
+                    wait = (1.0 - tokens) / tps
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO textract_budget (region, tokens, refilled_at) VALUES (?, ?, ?)",
+                    (region_name, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return wait
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RegionClient:
+    """One Textract client with its TPS budget, in-flight count and health."""
+
+    def __init__(self, region_name: str, client: Any, tps: Optional[float] = None, budget: Optional[TokenBudget] = None):
+        self.region_name = region_name
+        self.client = client
+        self.tps = tps
+        # Shared across workers when set; otherwise the bucket below is this process's own
+        self.budget = budget
+        # Token bucket holding up to one second of requests
+        self.tokens = max(1.0, tps) if tps else 0.0
+        self.refilled_at = time.monotonic()
+
+        self.outstanding = 0
+        self.latency = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def wait_for_token(self, now: float) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        if not self.tps:
+            return 0.0
+        if self.budget is not None:
+            return self.budget.take(self.region_name, self.tps)
+        self.tokens = min(max(1.0, self.tps), self.tokens + (now - self.refilled_at) * self.tps)
+        self.refilled_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.tps
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "region": self.region_name,
+            "tps": self.tps,
+            "outstanding": self.outstanding,
+            "latency_seconds": round(self.latency, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "cooling_down_seconds": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class TextractPool:
+    """
+    Spreads analyze_document calls over Textract clients in several regions.
+
+    Each call goes to the healthy region with the fewest requests in flight (then
+    the lowest recent latency) that has TPS budget left. When every region is out
+    of budget the call waits for the next token, up to max_wait_seconds. A region
+    that throttles or fails is put in an exponentially growing cooldown and the
+    call fails over to the next region. Exposes analyze_document() with the boto3
+    signature, so it is a drop-in replacement for a single client.
+    """
+
+    def __init__(self, members: List[RegionClient], max_wait_seconds: float = 10.0, cooldown_seconds: float = 1.0, max_cooldown_seconds: float = 60.0):
+        if not members:
+            raise ValueError("TextractPool needs at least one region")
+        self.members = members
+        self.max_wait_seconds = max_wait_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def region_names(self) -> List[str]:
+        return [member.region_name for member in self.members]
+
+    @classmethod
+    def from_config(cls, config: str, budget: Optional[TokenBudget] = None, **kwargs) -> "TextractPool":
+        """
+        Builds a pool from "region[:tps][@endpoint_url],...", e.g.
+        "us-west-1:10,us-east-1:5,us-west-2@http://localhost:4566".
+        The TPS limits are per region in total; pass a shared budget to hold
+        several worker processes to them together.
+        """
+        items = [part.strip() for part in config.split(",") if part.strip()]
+        # With several regions, throttling and outages are handled by failing over
+        # rather than by retrying the same region; a lone region keeps the SDK retries
+        attempts = 1 if len(items) > 1 else 3
+        members = []
+        for item in items:
+            spec, _, endpoint_url = item.partition("@")
+            region_name, _, tps = spec.partition(":")
+            client = boto3.client(
+                'textract',
+                region_name=region_name,
+                endpoint_url=endpoint_url or None,
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                config=Config(retries={"mode": "standard", "total_max_attempts": attempts}),
+            )
+            members.append(RegionClient(region_name, client, float(tps) if tps else None, budget))
+        return cls(members, **kwargs)
+
+    @classmethod
+    def from_env(cls) -> Optional["TextractPool"]:
+        """
+        Returns a pool if AWS_TEXTRACT_REGIONS is set, otherwise None (single client).
+        With AWS_TEXTRACT_BUDGET_PATH set, the TPS budget is shared through that file.
+        """
+        config = os.getenv("AWS_TEXTRACT_REGIONS")
+        if not config:
+            return None
+        return cls.from_config(
+            config,
+            budget=TokenBudget.from_env(),
+            max_wait_seconds=float(os.getenv("AWS_TEXTRACT_MAX_WAIT", "10")),
+        )
+
+    def _acquire(self, tried: set) -> RegionClient:
+        deadline = time.monotonic() + self.max_wait_seconds
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [member for member in self.members if member.region_name not in tried]
+                if not candidates:
+                    raise TextractCapacityError("All Textract regions failed")
+                healthy = [member for member in candidates if member.cooldown_until <= now]
+                # With every region cooling down, try the one that recovers first
+                if not healthy:
+                    healthy = [min(candidates, key=lambda member: member.cooldown_until)]
+
+                wait = None
+                for member in sorted(healthy, key=lambda member: (member.outstanding, member.latency)):
+                    member_wait = member.wait_for_token(now)
+                    if member_wait == 0.0:
+                        member.outstanding += 1
+                        return member
+                    wait = member_wait if wait is None else min(wait, member_wait)
+
+            if now + wait > deadline:
+                raise TextractCapacityError(f"No Textract TPS budget within {self.max_wait_seconds}s")
+            time.sleep(wait)
+
+    def _release(self, member: RegionClient, started: float, failed: bool):
+        with self._lock:
+            member.outstanding -= 1
+            member.requests += 1
+            if failed:
+                member.failures += 1
+                member.consecutive_failures += 1
+                cooldown = min(self.max_cooldown_seconds, self.cooldown_seconds * 2 ** (member.consecutive_failures - 1))
+                member.cooldown_until = time.monotonic() + cooldown
+            else:
+                latency = time.monotonic() - started
+                member.latency = latency if member.latency == 0.0 else member.latency + 0.2 * (latency - member.latency)
+                member.consecutive_failures = 0
+
+    def analyze_document(self, **kwargs) -> Dict[str, Any]:
+        tried = set()
+        while True:
+            member = self._acquire(tried)
+            started = time.monotonic()
+            try:
+                response = member.client.analyze_document(**kwargs)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code", "")
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+                retryable = code in FAILOVER_ERROR_CODES or status >= 500
+                self._release(member, started, failed=retryable)
+                if not retryable or len(tried) + 1 >= len(self.members):
+                    raise
+                print(f"Textract {member.region_name} failed with {code or status}, failing over")
+            except CONNECTION_ERRORS as e:
+                self._release(member, started, failed=True)
+                if len(tried) + 1 >= len(self.members):
+                    raise
+                print(f"Textract {member.region_name} unreachable ({e}), failing over")
+            except Exception:
+                self._release(member, started, failed=False)
+                raise
+            else:
+                self._release(member, started, failed=False)
+                return response
+
+            tried.add(member.region_name)
+            usage = current_usage()
+            if usage is not None:
+                usage.textract_retries += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [member.snapshot(now) for member in self.members]
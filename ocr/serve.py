@@ -0,0 +1,70 @@
+# Production entry point for the OCR service.
+# Runs several uvicorn worker processes (one per core by default). Each worker
+# warms its own processor at startup, and all of them share one SQLite/WAL
+# result cache, so a page processed by one worker is a cache hit in the others.
+# They also share one Textract TPS budget file, so the per-region TPS limits of
+# AWS_TEXTRACT_REGIONS hold for the service as a whole, not for each worker.
+#
+# Usage (inside the ocr directory):
+# python serve.py --workers 4 --port 8000
+
+import argparse
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+from cache import ResultCache
+from processors.textract_pool import TokenBudget
+
+
+def main():
+    load_dotenv('../.env')
+
+    parser = argparse.ArgumentParser(description="Run the OCR service with multiple workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("OCR_WORKERS", os.cpu_count() or 1)),
+        help="Number of worker processes (default: number of cores)",
+    )
+    parser.add_argument(
+        "--cache-path",
+        default=os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3"),
+        help="SQLite file shared by all workers for cached OCR results",
+    )
+    parser.add_argument(
+        "--textract-budget-path",
+        default=os.getenv("AWS_TEXTRACT_BUDGET_PATH", "textract_budget.sqlite3"),
+        help="SQLite file holding the Textract TPS budget shared by all workers",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=30,
+        help="Seconds to let in-flight requests finish on shutdown",
+    )
+    args = parser.parse_args()
+
+    # Workers inherit the environment, so they all open the same cache file.
+    os.environ["OCR_CACHE_PATH"] = args.cache_path
+    # Create the schema once up front so workers don't race on it.
+    ResultCache(args.cache_path).close()
+    if os.getenv("AWS_TEXTRACT_REGIONS"):
+        os.environ["AWS_TEXTRACT_BUDGET_PATH"] = args.textract_budget_path
+        TokenBudget(args.textract_budget_path).close()
+
+    print(f"Starting OCR service with {args.workers} workers (cache: {args.cache_path})")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
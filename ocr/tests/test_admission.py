@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# Add the parent directory to sys.path to import admission
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, AdmissionMiddleware, AdmissionRejected
+
+
+def test_queued_request_is_admitted_when_a_slot_frees():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_timeout=1)
+        admitted_at = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        assert controller.snapshot()["queued"]["interactive"] == 1
+
+        controller.release("a", "interactive", admitted_at)
+        await asyncio.wait_for(waiter, 1)
+        assert controller.snapshot()["running"]["interactive"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_interactive_lane_is_served_before_batch():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, batch_share=0.5, queue_timeout=1)
+        first = await controller.acquire("backfill", "batch")
+        # The batch lane is at its share, but interactive requests still get the free slot
+        await controller.acquire("user", "interactive")
+
+        order = []
+
+        async def wait(client, lane):
+            await controller.acquire(client, lane)
+            order.append(lane)
+
+        batch = asyncio.create_task(wait("backfill", "batch"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait("user", "interactive"))
+        await asyncio.sleep(0)
+
+        controller.release("backfill", "batch", first)
+        await asyncio.wait_for(interactive, 1)
+        assert order == ["interactive"]
+        assert not batch.done()
+        batch.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_rejections_are_fast_and_carry_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_per_client=2, max_queue=1, queue_timeout=5)
+        admitted_at = await controller.acquire("a")
+        controller.release("a", "interactive", admitted_at - 2)  # 2s service time: drains 0.5 requests/s
+        await controller.acquire("a")
+        queued = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c")
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.retry_after >= 4
+
+        # Client "b" already has a queued request
+        controller.max_per_client = 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.reason == "client_limit"
+        queued.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_middleware_returns_429_before_reading_the_upload():
+    controller = AdmissionController(max_concurrency=1, max_queue=0)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.post("/ocr/process")
+    async def process(request: Request):
+        return {"size": len(await request.body())}
+
+    client = TestClient(app)
+    assert client.post("/ocr/process", content=b"page").json() == {"size": 4}
+
+    asyncio.run(controller.acquire("someone-else"))
+    response = client.post("/ocr/process", content=b"page", headers={"X-Client-Id": "tester"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert controller.snapshot()["rejected"] == [{"lane": "interactive", "reason": "queue_full", "count": 1}]
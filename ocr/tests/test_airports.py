@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Add the parent directory to sys.path to import processors
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors import FlightEntry
+from processors.airports import AirportIndex, correct_airport_codes, get_airport_index
+
+
+def test_bundled_index_validates_and_maps_faa_identifiers():
+    index = get_airport_index()
+    assert index.is_valid("KSMO")
+    assert index.is_valid("SMO")
+    assert not index.is_valid("KSM0")
+    assert index.canonical("smo") == "KSMO"
+    assert index.canonical("FL41") == "FL41"
+
+
+def test_corrects_ocr_confusions_but_not_ambiguous_codes():
+    index = get_airport_index()
+    assert index.correct("KSM0") == "KSMO"  # ties with K5M0, which has no scheduled service
+    assert index.correct("KRAN") == "KPAN"
+    assert index.correct("57A2") == "57AZ"
+    assert index.correct("k smo") == "KSMO"
+    assert index.correct("KSMO") is None
+    assert index.correct("") is None
+    assert index.correct("ZZZZ") is None
+
+    # Equally close, neither preferred
+    small = AirportIndex({"KAAD": "KAAD", "KAAQ": "KAAQ"})
+    assert small.correct("KAA0") is None
+    assert AirportIndex({"KAAD": "KAAD", "KAAQ": "KAAQ"}, preferred=["KAAQ"]).correct("KAA0") == "KAAQ"
+
+
+def test_does_not_rewrite_text_that_is_only_an_arbitrary_edit_away():
+    index = get_airport_index()
+    assert index.correct("LOCAL") is None
+    assert index.correct("XXXX") is None
+    assert index.correct("KSBA1") is None
+    assert AirportIndex({"KAAA": "KAAA"}).correct("KAAB") is None
+
+
+def test_correct_airport_codes_rewrites_only_garbled_fields():
+    record = FlightEntry(
+        date="1/10/2025", tailNumber="N54321", srcIcao="KSM0", destIcao="KSBA",
+        totalFlightTime=1.5, picTime=0.8, dualReceivedTime=0.2, instrumentTime=0.4,
+        crossCountry=False, night=False, solo=False, dayLandings=3, nightLandings=0, remarks="",
+    )
+    corrected = correct_airport_codes([record])
+    assert corrected[0].srcIcao == "KSMO"
+    assert corrected[0].destIcao == "KSBA"
+    assert record.srcIcao == "KSM0"
+
+    local = record.model_copy(update={"srcIcao": "LOCAL"})
+    assert correct_airport_codes([local])[0].srcIcao == "LOCAL"
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import json
 import pytest
@@ -204,3 +205,425 @@ def test_invalid_file_type():
     )
     assert response.status_code == 400
     assert "File must be a PNG or JPEG" in response.json()["detail"]
+
+def test_result_cache_skips_provider_on_hit(mock_aws_client, mock_image, tmp_path):
+    """
+    A page already processed (by any worker) should be served from the shared cache.
+    """
+    from cache import ResultCache
+    from processors import AWSOCRProcessor
+
+    cache = ResultCache(str(tmp_path / "ocr_cache.sqlite3"))
+    processor = AWSOCRProcessor()
+
+    with patch("main.result_cache", cache), patch("main.get_processor", return_value=processor):
+        for _ in range(2):
+            response = client.post(
+                "/ocr/process",
+                files={"file": ("test.jpg", mock_image, "image/jpeg")}
+            )
+            assert response.status_code == 200
+            assert response.json()["records"][0]["tailNumber"] == "N54321"
+
+    # A second connection (i.e. another worker) sees the same entry
+    other_worker = ResultCache(str(tmp_path / "ocr_cache.sqlite3"))
+    assert other_worker.get(ResultCache.key(mock_image, processor.provider_key)) is not None
+
+    mock_aws_client.analyze_document.assert_called_once()
+    cache.close()
+    other_worker.close()
+
+def test_archive_and_offline_reparse(mock_aws_client, mock_image, tmp_path):
+    """
+    Raw Textract responses are archived and can be re-parsed without calling AWS again.
+    """
+    from processors import AWSOCRProcessor, ResponseArchive
+    from util.reparse_archive import process_path
+
+    with patch.dict(os.environ, {"OCR_ARCHIVE_DIR": str(tmp_path)}):
+        processor = AWSOCRProcessor()
+
+    with patch("main.get_processor", return_value=processor):
+        response = client.post(
+            "/ocr/process",
+            files={"file": ("test.jpg", mock_image, "image/jpeg")}
+        )
+        assert response.status_code == 200
+
+    paths = list(ResponseArchive(str(tmp_path)).iter_paths())
+    assert len(paths) == 1
+    assert ResponseArchive.load(paths[0])["provider"] == "AWS"
+
+    diff = process_path(paths[0])
+    assert "error" not in diff
+    assert diff["old_count"] == diff["new_count"] == 1
+    assert diff["changed_rows"] == []
+    mock_aws_client.analyze_document.assert_called_once()
+
+def test_gemini_output_is_archived_when_parsing_fails(mock_gemini_client, mock_image, tmp_path):
+    """
+    The raw Gemini text is archived even if parsing it raises, together with the error.
+    """
+    from processors import GeminiOCRProcessor, ResponseArchive
+    from util.reparse_archive import process_path
+
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key", "OCR_ARCHIVE_DIR": str(tmp_path)}):
+        processor = GeminiOCRProcessor(api_key="fake_key")
+
+    with patch("processors.gemini_processor.salvage_records", side_effect=ValueError("parser bug")):
+        with pytest.raises(ValueError):
+            asyncio.run(processor.process_image(mock_image))
+
+    paths = list(ResponseArchive(str(tmp_path)).iter_paths())
+    assert len(paths) == 1
+    entry = ResponseArchive.load(paths[0])
+    assert entry["response"] == json.dumps([MOCK_FLIGHT_RECORD])
+    assert entry["records"] == []
+    assert entry["error"] == "ValueError: parser bug"
+
+    # Once the parser is fixed, the page can be re-parsed offline
+    diff = process_path(paths[0])
+    assert diff["old_count"] == 0 and diff["new_count"] == 1
+
+def test_usage_is_attached_and_aggregated(mock_aws_client, mock_image, tmp_path):
+    """
+    Each response carries its cost breakdown; a cache hit reports the saving.
+    """
+    from cache import ResultCache
+    from processors import AWSOCRProcessor, UsageLedger
+
+    cache = ResultCache(str(tmp_path / "ocr_cache.sqlite3"))
+    ledger = UsageLedger()
+    processor = AWSOCRProcessor()
+
+    with patch("main.result_cache", cache), patch("main.usage_ledger", ledger), \
+            patch("main.get_processor", return_value=processor):
+        usages = []
+        for _ in range(2):
+            response = client.post(
+                "/ocr/process",
+                files={"file": ("test.jpg", mock_image, "image/jpeg")},
+                headers={"X-Client-Id": "student-1"}
+            )
+            assert response.status_code == 200
+            usages.append(response.json()["usage"])
+
+        summary = client.get("/ocr/usage", params={"client": "student-1"}).json()["windows"]
+
+    assert usages[0]["textract_pages"] == 1
+    assert usages[0]["cost_usd"] > 0
+    assert usages[1]["cache_hit"] is True
+    assert usages[1]["cost_usd"] == 0
+    assert usages[1]["saved_usd"] == usages[0]["cost_usd"]
+
+    assert len(summary) == 1
+    assert summary[0]["requests"] == 2
+    assert summary[0]["cache_hits"] == 1
+    cache.close()
+
+def test_hybrid_learns_layout_template_and_skips_gemini(mock_aws_client, mock_gemini_client, tmp_path):
+    """
+    Once Gemini has parsed a layout on several pages, pages with the same layout are
+    parsed straight from the Textract grid, normalized like Gemini's output.
+    """
+    from processors import HybridOCRProcessor
+    from processors.templates import MIN_CONFIRMATIONS
+
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key", "OCR_TEMPLATE_PATH": str(tmp_path / "templates.sqlite3")}):
+        processor = HybridOCRProcessor(api_key="fake_key")
+
+    with patch("main.get_processor", return_value=processor):
+        # Different bytes per page so neither the cache nor coalescing kicks in
+        for page in range(MIN_CONFIRMATIONS + 1):
+            response = client.post(
+                "/ocr/process",
+                files={"file": ("test.jpg", f"page {page}".encode(), "image/jpeg")}
+            )
+            assert response.status_code == 200
+            records = response.json()["records"]
+            assert len(records) == 1
+            assert records[0]["tailNumber"] == "N54321"
+            assert records[0]["totalFlightTime"] == 1.5
+
+    assert "known layout template" in response.json()["message"]
+    assert records[0]["date"] == "2025-01-10"
+    assert records[0]["picTime"] == 0.8
+    assert processor.templates.count() == 1
+    assert mock_aws_client.analyze_document.call_count == MIN_CONFIRMATIONS + 1
+    assert mock_gemini_client.models.generate_content.call_count == MIN_CONFIRMATIONS
+
+def test_hybrid_template_needs_every_field_gemini_filled(mock_aws_client, mock_gemini_client, tmp_path):
+    """
+    A layout is not learned when a field Gemini read can't be located in the grid,
+    and a learned template that Gemini disagrees with on re-validation is dropped.
+    """
+    from processors.templates import learn_mapping
+
+    rows = {
+        1: {1: "Date", 2: "Tail", 3: "From", 4: "To", 5: "Total", 6: "PIC"},
+        2: {1: "1/10/2025", 2: "N54321", 3: "KSMO", 4: "KSBA", 5: "1.5", 6: "0.8"},
+    }
+    record = FlightEntry(**{**MOCK_FLIGHT_RECORD, "instrumentTime": 0.0, "dayLandings": 0, "remarks": ""})
+    header_row_index, mapping = learn_mapping(rows, [record])
+    assert header_row_index == 1
+    assert mapping == {"date": 1, "tailNumber": 2, "srcIcao": 3, "destIcao": 4, "totalFlightTime": 5, "picTime": 6}
+
+    # Gemini read an instrument time that no column holds
+    assert learn_mapping(rows, [record.model_copy(update={"instrumentTime": 0.4})]) is None
+    # A core field is missing from the grid
+    assert learn_mapping({index: {col: text for col, text in row.items() if col != 4} for index, row in rows.items()}, [record]) is None
+
+    from processors import HybridOCRProcessor
+    from processors.templates import MIN_CONFIRMATIONS, REVALIDATE_EVERY
+
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key", "OCR_TEMPLATE_PATH": str(tmp_path / "templates.sqlite3")}):
+        processor = HybridOCRProcessor(api_key="fake_key")
+    gemini_record = FlightEntry(**MOCK_FLIGHT_RECORD)
+    for _ in range(MIN_CONFIRMATIONS):
+        assert processor.parse_with_known_templates(MOCK_TEXTRACT_RESPONSE) == []
+        processor.learn_templates(MOCK_TEXTRACT_RESPONSE, [gemini_record])
+    assert processor.parse_with_known_templates(MOCK_TEXTRACT_RESPONSE)[0].date == "2025-01-10"
+
+    # Periodically the page goes back to Gemini, whose reading no longer matches
+    while processor.parse_with_known_templates(MOCK_TEXTRACT_RESPONSE):
+        pass
+    template = next(iter(processor.templates._memory.values()))
+    assert template.hits % REVALIDATE_EVERY == 0
+    processor.learn_templates(MOCK_TEXTRACT_RESPONSE, [gemini_record.model_copy(update={"tailNumber": "N99999"})])
+    assert processor.templates.count() == 0
+
+def test_aws_parsing_only_trusts_confirmed_templates(mock_aws_client, tmp_path):
+    """
+    Pure AWS parsing ignores Gemini templates that are not confirmed yet, and only
+    replaces a template when a page's data rows no longer parse with it.
+    """
+    from processors import AWSOCRProcessor
+    from processors.templates import MIN_CONFIRMATIONS, LayoutTemplate
+
+    with patch.dict(os.environ, {"OCR_TEMPLATE_PATH": str(tmp_path / "templates.sqlite3")}):
+        processor = AWSOCRProcessor()
+    blocks_map = {block["Id"]: block for block in MOCK_TEXTRACT_RESPONSE["Blocks"]}
+    rows, _ = processor.get_rows_columns_map(blocks_map["table1"], blocks_map)
+    fingerprint = processor._table_fingerprint(blocks_map["table1"], rows, blocks_map)
+
+    # A Gemini reading with the airports swapped
+    swapped = {"date": 1, "tailNumber": 3, "srcIcao": 5, "destIcao": 4, "totalFlightTime": 6}
+    processor.templates.put(LayoutTemplate(fingerprint=fingerprint, header_row_index=1, mapping=swapped, source="gemini"))
+    assert processor._parse_textract_json(MOCK_TEXTRACT_RESPONSE)[0].srcIcao == "KSMO"
+    processor.templates.put(LayoutTemplate(fingerprint=fingerprint, header_row_index=1, mapping=swapped,
+                                           source="gemini", confirmations=MIN_CONFIRMATIONS))
+    assert processor._parse_textract_json(MOCK_TEXTRACT_RESPONSE)[0].srcIcao == "KSBA"
+
+    # A page with the same printed header but no entries keeps the template
+    header_only = {"Blocks": [
+        {**block, "Relationships": [{"Type": "CHILD", "Ids": [id for id in block["Relationships"][0]["Ids"] if id.startswith("cell_1_")]}]}
+        if block["BlockType"] == "TABLE" else block
+        for block in MOCK_TEXTRACT_RESPONSE["Blocks"]
+        if not block["Id"].startswith(("cell_2_", "word_2_"))
+    ]}
+    assert processor._parse_textract_json(header_only) == []
+    assert processor.templates.get(fingerprint, count_hit=False).source == "gemini"
+
+    # Entries the template can't read make the header search take over
+    processor.templates.put(LayoutTemplate(fingerprint=fingerprint, header_row_index=1, mapping={"date": 13}, source="header"))
+    assert processor._parse_textract_json(MOCK_TEXTRACT_RESPONSE)[0].srcIcao == "KSMO"
+    assert processor.templates.get(fingerprint, count_hit=False).mapping["srcIcao"] == 4
+
+def test_routing_sends_printed_pages_to_aws_and_handwriting_to_hybrid(mock_aws_client, mock_gemini_client):
+    """
+    AUTO mode classifies each page from its Textract response and reuses that response for the chosen route.
+    """
+    from processors import RoutingOCRProcessor
+
+    handwritten = {"Blocks": [
+        {**block, "TextType": "HANDWRITING"} if block["BlockType"] == "WORD" else block
+        for block in MOCK_TEXTRACT_RESPONSE["Blocks"]
+    ]}
+    mock_aws_client.analyze_document.side_effect = [MOCK_TEXTRACT_RESPONSE, handwritten]
+
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key"}):
+        processor = RoutingOCRProcessor()
+
+    with patch("main.get_processor", return_value=processor):
+        printed = client.post("/ocr/process", files={"file": ("test.jpg", b"printed page", "image/jpeg")})
+        assert printed.status_code == 200
+        assert "routed to AWS: printed" in printed.json()["message"]
+        mock_gemini_client.models.generate_content.assert_not_called()
+
+        response = client.post("/ocr/process", files={"file": ("test.jpg", b"handwritten page", "image/jpeg")})
+        assert response.status_code == 200
+        assert "routed to HYBRID: handwriting" in response.json()["message"]
+        assert response.json()["records"][0]["tailNumber"] == "N54321"
+
+        metrics = client.get("/ocr/routing").json()
+
+    # One Textract call per page, and Gemini only for the handwritten one
+    assert mock_aws_client.analyze_document.call_count == 2
+    mock_gemini_client.models.generate_content.assert_called_once()
+    assert {(d["provider"], d["reason"]) for d in metrics["decisions"]} == {("AWS", "printed"), ("HYBRID", "handwriting")}
+    assert metrics["providers"]["AWS"]["samples"] == 1
+
+def test_routing_probes_a_failing_provider_until_it_recovers(mock_aws_client, mock_gemini_client):
+    """
+    Once Textract is marked as failing, pages go to Gemini, but one page per probe
+    interval still tries Textract so AWS can recover.
+    """
+    import asyncio
+    from processors import RoutingOCRProcessor
+
+    mock_aws_client.analyze_document.side_effect = RuntimeError("Textract down")
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key"}):
+        processor = RoutingOCRProcessor(min_samples=2, probe_interval=0)
+
+    def route(page: bytes) -> str:
+        return asyncio.run(processor.process_image(page)).message
+
+    for page in (b"page 1", b"page 2"):
+        assert "textract_failed" in route(page)
+    assert processor._degraded("AWS") == "errors"
+
+    # A probe is due on every page with probe_interval=0: Textract is tried again
+    mock_aws_client.analyze_document.side_effect = None
+    mock_aws_client.analyze_document.return_value = MOCK_TEXTRACT_RESPONSE
+    messages = [route(f"page {n}".encode()) for n in range(3, 8)]
+    assert all("routed to AWS: printed" in message for message in messages)
+    assert processor._degraded("AWS") is None
+
+    # Without a due probe, the degraded provider is skipped
+    processor.probe_interval = 3600
+    processor.stats["AWS"].error_rate = 1.0
+    processor._last_probe["AWS"] = float("inf")
+    calls = mock_aws_client.analyze_document.call_count
+    assert "routed to GEMINI: aws_errors" in route(b"page 8")
+    assert mock_aws_client.analyze_document.call_count == calls
+
+def test_routing_skips_aws_when_it_yields_no_records(mock_aws_client, mock_gemini_client):
+    """
+    When AWS keeps finding nothing, printed pages go to HYBRID directly instead of
+    AWS and then the HYBRID fallback.
+    """
+    import asyncio
+    from processors import RoutingOCRProcessor
+
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key"}):
+        processor = RoutingOCRProcessor(min_samples=2, probe_interval=3600)
+    processor._last_probe["AWS"] = float("inf")
+    for _ in range(2):
+        processor.stats["AWS"].observe(1.0, False, 0)
+
+    result = asyncio.run(processor.process_image(b"printed page"))
+    assert "routed to HYBRID: printed, aws_low_yield" in result.message
+    assert mock_aws_client.analyze_document.call_count == 1
+
+def make_document(image_format: str, pages: int) -> bytes:
+    from PIL import Image
+    import io
+    frames = [Image.new("RGB", (200 + 50 * page, 100), color=(255, 255, 255)) for page in range(pages)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format=image_format, save_all=True, append_images=frames[1:])
+    return buffer.getvalue()
+
+def test_multipage_pdf_is_split_and_stitched_in_page_order(mock_aws_client):
+    """
+    Each PDF page goes through the processor separately; records come back in page order.
+    """
+    from processors import AWSOCRProcessor
+
+    def page_response(Document, FeatureTypes):
+        # Tag each page's record with the page's own bytes so the order can be checked
+        response = json.loads(json.dumps(MOCK_TEXTRACT_RESPONSE))
+        for block in response["Blocks"]:
+            if block["Id"] == "word_2_12":
+                block["Text"] = f"page {len(Document['Bytes'])}"
+        return response
+
+    mock_aws_client.analyze_document.side_effect = page_response
+    processor = AWSOCRProcessor()
+    document = make_document("PDF", 3)
+
+    with patch("main.get_processor", return_value=processor), patch("main.result_cache", None):
+        response = client.post("/ocr/process", files={"file": ("logbook.pdf", document, "application/pdf")})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [page["page"] for page in data["pages"]] == [1, 2, 3]
+    assert [page["recordCount"] for page in data["pages"]] == [1, 1, 1]
+    # Pages finish in any order, but records are stitched back in page order
+    import io
+    from documents import open_document
+    _, pages = open_document(io.BytesIO(document), "application/pdf")
+    assert [record["remarks"] for record in data["records"]] == [f"page {len(page)}" for page, _ in pages]
+    assert data["usage"]["textract_pages"] == 3
+    assert mock_aws_client.analyze_document.call_count == 3
+
+def test_multipage_tiff_streams_per_page_progress(mock_aws_client):
+    from processors import AWSOCRProcessor
+    processor = AWSOCRProcessor()
+
+    with patch("main.get_processor", return_value=processor), patch("main.result_cache", None):
+        response = client.post(
+            "/ocr/process?stream=true",
+            files={"file": ("logbook.tif", make_document("TIFF", 2), "image/tiff")},
+        )
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(event["page"] for event in events if event["event"] == "page") == [1, 2]
+    assert all(event["pages_total"] == 2 for event in events[:-1])
+    assert events[-1]["event"] == "result"
+    assert len(events[-1]["records"]) == 2
+
+def test_document_pages_take_admission_slots(mock_aws_client):
+    """
+    Pages beyond the first only run at once while the admission controller has free slots,
+    and those slots are given back when the document is done.
+    """
+    import threading
+    import time
+    import main
+    from processors import AWSOCRProcessor
+
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def slow_page(Document, FeatureTypes):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+        return MOCK_TEXTRACT_RESPONSE
+
+    mock_aws_client.analyze_document.side_effect = slow_page
+    processor = AWSOCRProcessor()
+
+    with patch("main.get_processor", return_value=processor), patch("main.result_cache", None), \
+            patch.object(main.admission, "max_concurrency", 2):
+        response = client.post("/ocr/process", files={"file": ("logbook.pdf", make_document("PDF", 5), "application/pdf")})
+
+    assert response.status_code == 200
+    assert len(response.json()["records"]) == 5
+    assert running["max"] == 2
+    assert sum(main.admission.running.values()) == 0
+    assert not main.admission.per_client
+
+def test_unreadable_documents_are_rejected(mock_aws_client):
+    import io
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(100, 100)
+    writer.encrypt("secret")
+    encrypted = io.BytesIO()
+    writer.write(encrypted)
+
+    for name, content, mime_type in [
+        ("broken.pdf", b"%PDF-1.4 not really", "application/pdf"),
+        ("locked.pdf", encrypted.getvalue(), "application/pdf"),
+        ("broken.tif", b"II*\x00 not really", "image/tiff"),
+    ]:
+        for stream in ("false", "true"):
+            response = client.post(f"/ocr/process?stream={stream}", files={"file": (name, content, mime_type)})
+            assert response.status_code == 400, (name, stream)
+    mock_aws_client.analyze_document.assert_not_called()
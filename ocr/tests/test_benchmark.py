@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+# Add the parent directory to sys.path to import util.benchmark
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors import ResponseArchive
+from util.benchmark import DEFAULT_CORPUS, load_corpus, run_replay, score_page, summarize
+
+
+def test_corpus_covers_sample_images():
+    pages = load_corpus(DEFAULT_CORPUS)
+    assert {os.path.basename(page["image"]) for page in pages} >= {"custom_example.png", "handwritten.png"}
+    for page in pages:
+        assert os.path.exists(page["path"])
+        assert page["records"]
+
+
+def test_scoring_counts_missed_rows_and_tolerates_formatting():
+    expected = load_corpus(DEFAULT_CORPUS)[0]["records"]
+    # Second row missing, first row with an ISO date and different remark punctuation
+    first = expected[0].model_copy(update={"date": "2025-01-10", "remarks": "local vfr flight steep turns", "picTime": 0.9})
+    actual = [first] + expected[2:]
+
+    score = score_page(expected, actual)
+    assert score["matched"] == len(expected) - 1
+    assert score["correct"]["date"] == len(expected) - 1
+    assert score["correct"]["remarks"] == len(expected) - 1
+    assert score["correct"]["picTime"] == len(expected) - 2
+
+
+def test_replay_scores_archived_responses(tmp_path):
+    page = load_corpus(DEFAULT_CORPUS)[0]
+    with open(page["path"], "rb") as f:
+        file_bytes = f.read()
+    archive = ResponseArchive(str(tmp_path))
+    gemini_text = json.dumps([record.model_dump() for record in page["records"]])
+    archive.save(file_bytes, "GEMINI", gemini_text, page["records"], page["mime_type"])
+
+    samples = run_replay("GEMINI", [page], archive)
+    summary = summarize("GEMINI", samples)
+    assert summary["pages"] == 1
+    assert summary["accuracy"] == 1.0
+    assert run_replay("AWS", [page], archive) == []
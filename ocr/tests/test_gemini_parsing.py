@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Add the parent directory to sys.path to import processors
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.gemini_processor import parse_gemini_response, salvage_records
+
+
+def make_row(tail, **overrides):
+    row = {
+        "date": "2025-01-10", "tailNumber": tail, "srcIcao": "KSMO", "destIcao": "KSBA",
+        "totalFlightTime": 1.5, "picTime": 1.5, "dualReceivedTime": 0.0, "instrumentTime": 0.0,
+        "crossCountry": False, "night": False, "solo": False,
+        "dayLandings": 1, "nightLandings": 0, "remarks": "",
+    }
+    row.update(overrides)
+    return row
+
+
+def test_salvage_keeps_valid_rows_around_malformed_one():
+    text = "```json\n[" + json.dumps(make_row("N1")) + ', {"date": "2025-01-11", "tailNumber": "N2", "totalFlightTime": 1.2.3}, ' + json.dumps(make_row("N3")) + "]\n```"
+
+    slots, broken = salvage_records(text)
+
+    assert [slot.tailNumber if slot else None for slot in slots] == ["N1", None, "N3"]
+    assert len(broken) == 1 and '"N2"' in broken[0]
+
+
+def test_salvage_fills_nulls_with_defaults():
+    slots, broken = salvage_records(json.dumps([make_row("N1", picTime=None, remarks=None, dayLandings=None)]))
+
+    assert broken == []
+    assert slots[0].picTime == 0.0 and slots[0].remarks == "" and slots[0].dayLandings == 0
+
+
+def test_only_broken_rows_are_re_requested():
+    client = MagicMock()
+    first = MagicMock(text=json.dumps([make_row("N1"), make_row("N2", totalFlightTime="one point two"), make_row("N3")]))
+    repair = MagicMock(text=json.dumps([make_row("N2", totalFlightTime=1.2)]))
+    client.models.generate_content.return_value = repair
+
+    records = asyncio.run(parse_gemini_response(client, "gemini-2.0-flash", first.text))
+
+    assert [record.tailNumber for record in records] == ["N1", "N2", "N3"]
+    assert records[1].totalFlightTime == 1.2
+    repair_prompt = client.models.generate_content.call_args.kwargs["contents"][0]
+    assert "N2" in repair_prompt and "N1" not in repair_prompt
+
+
+def test_repair_with_the_wrong_row_count_is_dropped():
+    client = MagicMock()
+    first = MagicMock(text=json.dumps([
+        make_row("N1"), make_row("N2", totalFlightTime="?"), make_row("N3"), make_row("N4", picTime="?"),
+    ]))
+    repair = MagicMock(text=json.dumps([make_row("N4", picTime=1.0)]))
+    client.models.generate_content.return_value = repair
+
+    records = asyncio.run(parse_gemini_response(client, "gemini-2.0-flash", first.text))
+
+    # One row back for two broken ones can't be put in its place
+    assert [record.tailNumber for record in records] == ["N1", "N3"]
+
+
+def test_output_mode_is_part_of_the_provider_key(monkeypatch):
+    from processors import gemini_processor
+    from processors.gemini_processor import GeminiOCRProcessor
+
+    processor = GeminiOCRProcessor(api_key="fake_key")
+    structured = processor.provider_key
+    monkeypatch.setattr(gemini_processor, "STRUCTURED_OUTPUT", False)
+    assert processor.provider_key != structured
+    assert processor.provider_key.endswith(":text")
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+# Add the parent directory to sys.path to import util.manual_post
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import manual_post
+from util.manual_post import collect_images, post_all, post_image
+
+RECORDS = {"records": [{"date": "2025-01-10", "tailNumber": "N54321"}]}
+
+
+def write_pages(directory, names):
+    os.makedirs(directory, exist_ok=True)
+    for name in names:
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(b"fake image bytes")
+
+
+def test_collects_images_from_directories_and_files(tmp_path):
+    write_pages(tmp_path / "pages", ["b.png", "a.jpg", "notes.txt"])
+    single = str(tmp_path / "single.jpeg")
+    write_pages(tmp_path, ["single.jpeg"])
+    assert collect_images([str(tmp_path / "pages"), single]) == [
+        str(tmp_path / "pages" / "a.jpg"),
+        str(tmp_path / "pages" / "b.png"),
+        single,
+    ]
+
+
+def test_post_image_retries_overload_and_honors_retry_after(tmp_path):
+    write_pages(tmp_path, ["page.png"])
+    statuses = [503, 429, 200]
+
+    def handler(request):
+        assert str(request.url) == manual_post.url
+        status = statuses.pop(0)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"}, text="busy")
+        return httpx.Response(200, json=RECORDS)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await post_image(client, str(tmp_path / "page.png"), max_retries=3)
+
+    result = asyncio.run(scenario())
+    assert result["status"] == 200
+    assert result["attempts"] == 3
+    assert result["response"] == RECORDS
+
+
+def test_post_image_gives_up_after_the_last_retry(tmp_path):
+    write_pages(tmp_path, ["page.png"])
+
+    def handler(request):
+        return httpx.Response(503, headers={"Retry-After": "0"}, text="still busy")
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await post_image(client, str(tmp_path / "page.png"), max_retries=1)
+
+    result = asyncio.run(scenario())
+    assert (result["status"], result["attempts"], result["error"]) == (503, 2, "still busy")
+
+
+def test_post_all_writes_each_result_as_it_completes(tmp_path):
+    write_pages(tmp_path, ["good.png", "bad.png"])
+    output_path = tmp_path / "results.ndjson"
+    written_before_bad = []
+
+    async def handler(request):
+        assert request.headers["X-OCR-Lane"] == "batch"
+        if b'filename="bad.png"' in request.content:
+            # Give good.png time to finish; its line must be on disk before this one returns
+            await asyncio.sleep(0.05)
+            written_before_bad.append(output_path.read_text())
+            return httpx.Response(400, text="unreadable")
+        return httpx.Response(200, json=RECORDS)
+
+    images = [str(tmp_path / "bad.png"), str(tmp_path / "good.png")]
+    with open(output_path, "w") as output:
+        results = asyncio.run(post_all(images, 2, 0, 5.0, output=output, transport=httpx.MockTransport(handler)))
+
+    assert [result["status"] for result in results] == [200, 400]
+    assert json.loads(written_before_bad[0])["file"].endswith("good.png")
+    lines = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert lines == results
+    assert lines[0]["response"] == RECORDS and lines[1]["error"] == "unreadable"
@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+
+# Add the parent directory to sys.path to import singleflight
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_duplicates_share_one_call():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        group = SingleFlight()
+        results = await asyncio.gather(*(group.do("page", work) for _ in range(5)))
+        assert len(group) == 0
+        return results
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert calls == 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        group = SingleFlight()
+        first = asyncio.ensure_future(group.do("page", work))
+        second = asyncio.ensure_future(group.do("page", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "result"
+        assert first.cancelled()
+
+    asyncio.run(run())
@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+# Add the parent directory to sys.path to import processors
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors import AWSOCRProcessor, TextractPool, begin_request_usage
+
+TEXTRACT_RESPONSE = {
+    "DocumentMetadata": {"Pages": 1},
+    "Blocks": [{"Id": "page", "BlockType": "PAGE"}],
+}
+CREDENTIALS = {"AWS_ACCESS_KEY_ID": "test", "AWS_SECRET_ACCESS_KEY": "test"}
+
+
+class FakeTextract:
+    """Local stand-in for a regional Textract endpoint (JSON 1.1 protocol)."""
+
+    def __init__(self, error=None, delay=0.0):
+        self.error = error
+        self.delay = delay
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                assert self.headers["X-Amz-Target"] == "Textract.AnalyzeDocument"
+                fake.requests += 1
+                time.sleep(fake.delay)
+                status, body = (400, {"__type": fake.error, "message": "Rate exceeded"}) if fake.error else (200, TEXTRACT_RESPONSE)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def endpoints():
+    servers = []
+
+    def start(**kwargs):
+        server = FakeTextract(**kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_pool_fails_over_from_throttled_region(endpoints):
+    throttled = endpoints(error="ProvisionedThroughputExceededException")
+    healthy = endpoints()
+
+    with patch.dict(os.environ, {**CREDENTIALS, "AWS_TEXTRACT_REGIONS": f"us-west-1@{throttled.url},us-east-1@{healthy.url}"}):
+        processor = AWSOCRProcessor()
+    assert processor.region_name == "us-west-1+us-east-1"
+
+    usage = begin_request_usage()
+    for _ in range(3):
+        assert processor.analyze_document(b"page")["Blocks"]
+
+    # The throttled region is cooling down after the first failure, so later calls skip it
+    assert throttled.requests == 1
+    assert healthy.requests == 3
+    assert usage.textract_retries == 1
+    regions = {member["region"]: member for member in processor.client.snapshot()}
+    assert regions["us-west-1"]["failures"] == 1
+    assert regions["us-west-1"]["cooling_down_seconds"] > 0
+
+
+def test_pool_does_not_fail_over_on_bad_documents(endpoints):
+    bad = endpoints(error="InvalidParameterException")
+    other = endpoints()
+    with patch.dict(os.environ, CREDENTIALS):
+        pool = TextractPool.from_config(f"us-west-1@{bad.url},us-east-1@{other.url}")
+    # Make the bad endpoint the first choice
+    pool.members[1].outstanding = 1
+
+    with pytest.raises(Exception, match="InvalidParameterException"):
+        pool.analyze_document(Document={"Bytes": b"page"}, FeatureTypes=["TABLES"])
+    assert other.requests == 0
+
+
+def test_pool_spreads_concurrent_load_and_respects_tps(endpoints):
+    west, east = endpoints(delay=0.05), endpoints(delay=0.05)
+    with patch.dict(os.environ, CREDENTIALS):
+        pool = TextractPool.from_config(f"us-west-1:20@{west.url},us-east-1:20@{east.url}")
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: pool.analyze_document(Document={"Bytes": b"page"}, FeatureTypes=["TABLES"]), range(50)))
+    elapsed = time.monotonic() - start
+
+    assert west.requests + east.requests == 50
+    assert west.requests >= 10 and east.requests >= 10
+    # 40 TPS combined with one second of burst: 50 calls cannot finish in under 0.25s
+    assert elapsed >= 0.2
+
+
+def test_workers_share_one_tps_budget(endpoints, tmp_path):
+    west = endpoints()
+    # Two pools on one budget file stand in for two serve.py workers
+    with patch.dict(os.environ, {**CREDENTIALS, "AWS_TEXTRACT_REGIONS": f"us-west-1:10@{west.url}", "AWS_TEXTRACT_BUDGET_PATH": str(tmp_path / "budget.sqlite3")}):
+        workers = [TextractPool.from_env(), TextractPool.from_env()]
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda i: workers[i % 2].analyze_document(Document={"Bytes": b"page"}, FeatureTypes=["TABLES"]), range(20)))
+    elapsed = time.monotonic() - start
+
+    assert west.requests == 20
+    # 10 TPS in total with one second of burst: the second ten calls take about a second,
+    # where separate buckets would let both workers burst through all 20 at once
+    assert elapsed >= 0.8
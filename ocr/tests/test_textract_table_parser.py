@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+
+from PIL import Image
+
+# Add the parent directory to sys.path to import util.textract_table_parser
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import textract_table_parser
+from util.textract_table_parser import BatchWriter, expand_pages, load_manifest, run_batch
+
+TABLE_RESPONSE = {
+    "Blocks": [
+        {"Id": "t", "BlockType": "TABLE", "Relationships": [{"Type": "CHILD", "Ids": ["c"]}]},
+        {"Id": "c", "BlockType": "CELL", "RowIndex": 1, "ColumnIndex": 1, "Confidence": 99.0,
+         "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+        {"Id": "w", "BlockType": "WORD", "Text": "N54321"},
+    ]
+}
+
+
+class FakeTextract:
+    def __init__(self):
+        self.documents = []
+
+    def analyze_document(self, Document, FeatureTypes):
+        self.documents.append(Document["Bytes"])
+        return TABLE_RESPONSE
+
+
+def write_image(path, color="white"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", (20, 20), color).save(path)
+
+
+def test_multi_page_documents_are_split_into_pages(tmp_path, monkeypatch):
+    frames = [Image.new("RGB", (20, 20), color) for color in ("red", "green", "blue")]
+    tiff = str(tmp_path / "log.tiff")
+    frames[0].save(tiff, save_all=True, append_images=frames[1:])
+    png = str(tmp_path / "page.png")
+    write_image(png)
+    broken = str(tmp_path / "broken.pdf")
+    with open(broken, "wb") as f:
+        f.write(b"not a pdf")
+
+    pages, unreadable = expand_pages([tiff, png, broken])
+    assert pages == [(tiff, 1), (tiff, 2), (tiff, 3), (png, None)]
+    assert unreadable == [broken]
+
+    opened = []
+
+    class CountingReader(textract_table_parser.PageReader):
+        def __init__(self, file, mime_type):
+            opened.append(file.name)
+            super().__init__(file, mime_type)
+
+    monkeypatch.setattr(textract_table_parser, "PageReader", CountingReader)
+
+    client = FakeTextract()
+    writer = BatchWriter(str(tmp_path / "out"), "ndjson", str(tmp_path))
+    try:
+        completed, failed, _ = run_batch(pages, client, writer, threads=2, processes=1, output_format="ndjson")
+    finally:
+        writer.close()
+
+    assert (completed, failed) == (4, 0)
+    # The TIFF was parsed at most once per worker thread, not once per page
+    assert len(opened) <= 2
+    # Each TIFF page went to Textract on its own, as a single-frame PNG
+    assert sum(document.startswith(b"\x89PNG") for document in client.documents) == 4
+    with open(tmp_path / "out" / "tables.ndjson") as f:
+        records = [json.loads(line) for line in f]
+    assert sorted((record["file"], record["page"]) for record in records) == sorted(pages, key=str)
+    assert records[0]["tables"] == [[["N54321"]]]
+    assert load_manifest(str(tmp_path / "out" / "manifest.ndjson")) == set(pages)
+
+
+def test_csv_output_mirrors_input_directories(tmp_path):
+    first = str(tmp_path / "scans" / "2023" / "page1.png")
+    second = str(tmp_path / "scans" / "2024" / "page1.png")
+    write_image(first, "red")
+    write_image(second, "blue")
+
+    writer = BatchWriter(str(tmp_path / "out"), "csv", str(tmp_path / "scans"))
+    try:
+        completed, _, _ = run_batch([(first, None), (second, None)], FakeTextract(), writer,
+                                    threads=1, processes=1, output_format="csv")
+    finally:
+        writer.close()
+
+    assert completed == 2
+    assert (tmp_path / "out" / "2023" / "page1.csv").exists()
+    assert (tmp_path / "out" / "2024" / "page1.csv").exists()
+    assert writer.csv_path(first, 2) == str(tmp_path / "out" / "2023" / "page1-p2.csv")
@@ -0,0 +1,81 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+# Add the parent directory to sys.path to import verification
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors import ArchivedFlight, FlightEntry
+from verification import FlightIndex
+
+
+def make_entry(**overrides):
+    entry = {
+        "date": "11/8/2025",
+        "tailNumber": "N399EA",
+        "srcIcao": "KPAN",
+        "destIcao": "KDVT",
+        "totalFlightTime": 0.7,
+        "picTime": 0.7,
+        "dualReceivedTime": 0.0,
+        "instrumentTime": 0.0,
+        "crossCountry": False,
+        "night": False,
+        "solo": False,
+        "dayLandings": 1,
+        "nightLandings": 0,
+        "remarks": "",
+    }
+    entry.update(overrides)
+    return FlightEntry(**entry)
+
+
+def make_flight(departure, arrival, **overrides):
+    flight = {
+        "tailNumber": "N399EA",
+        "originAirportIcao": "KPAN",
+        "destinationAirportIcao": "KDVT",
+        "departureTime": datetime(2025, 11, 8, *departure, tzinfo=timezone.utc),
+        "arrivalTime": datetime(2025, 11, 8, *arrival, tzinfo=timezone.utc),
+    }
+    flight.update(overrides)
+    return ArchivedFlight(**flight)
+
+
+def test_match_all_applies_exact_fields_day_and_duration_tolerance():
+    index = FlightIndex([
+        make_flight((13, 51), (14, 33)),
+        make_flight((9, 0), (12, 0), originAirportIcao="KDVT", destinationAirportIcao="KPAN"),
+    ])
+
+    matches = index.match_all([
+        make_entry(),
+        make_entry(date="2025-11-08", srcIcao="KDVT", destIcao="KPAN", totalFlightTime=3.2),
+        make_entry(totalFlightTime=2.5),  # duration outside the 60 minute tolerance
+        make_entry(date="11/9/2025"),  # different day
+        make_entry(tailNumber="N12345"),
+    ])
+
+    assert [match.verified for match in matches] == [True, True, False, False, False]
+    assert matches[0].flight.departureTime.hour == 13
+    assert matches[1].flight.originAirportIcao == "KDVT"
+
+
+def test_loads_scraper_json_archive():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "real_flights.json")
+    index = FlightIndex.from_json(path)
+
+    assert len(index) > 0
+    # Padded tail numbers ("N399EA  ") are trimmed when loading
+    assert index.match(make_entry()) is not None
+
+
+def test_airports_match_by_icao_code_or_faa_identifier():
+    index = FlightIndex([make_flight((13, 51), (14, 33))])
+
+    matches = index.match_all([
+        make_entry(srcIcao="PAN", destIcao="dvt"),  # FAA identifiers, lower case
+        make_entry(srcIcao="KPHX"),
+    ])
+
+    assert [match.verified for match in matches] == [True, False]
@@ -0,0 +1,254 @@
+# Accuracy-vs-latency benchmark of the OCR providers against the ground truth
+# corpus in benchmark/corpus.json (expected FlightEntry records per page).
+#
+# Live mode calls each provider (needs AWS credentials / GEMINI_API_KEY) and
+# measures end-to-end latency and cost. Replay mode re-parses the newest raw
+# responses from the response archive (see processors/archive.py) instead, so
+# parser and prompt-output changes can be scored offline; its latency is parse
+# time only and its cost covers Textract pages only (Gemini token counts are
+# not archived).
+#
+# Usage (inside the ocr directory):
+# python -m util.benchmark --providers AWS GEMINI HYBRID --runs 3
+# python -m util.benchmark --replay archive --output benchmark.json
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from processors import (
+    AWSOCRProcessor, GeminiOCRProcessor, HybridOCRProcessor, RoutingOCRProcessor,
+    FlightEntry, ResponseArchive, begin_request_usage,
+)
+from processors.accounting import record_textract
+from processors.base import parse_logbook_date
+from util.reparse_archive import reparse_entry
+
+OCR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(OCR_DIR, "benchmark", "corpus.json")
+
+PROCESSORS = {
+    "AWS": AWSOCRProcessor,
+    "GEMINI": GeminiOCRProcessor,
+    "HYBRID": HybridOCRProcessor,
+    "AUTO": RoutingOCRProcessor,
+}
+
+# Fields written on the page. crossCountry/night/solo are interpretations of the
+# remarks, so they are not scored.
+SCORED_FIELDS = [
+    "date", "tailNumber", "srcIcao", "destIcao", "totalFlightTime", "picTime",
+    "dualReceivedTime", "instrumentTime", "dayLandings", "nightLandings", "remarks",
+]
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        pages = json.load(f)
+    for page in pages:
+        page["records"] = [FlightEntry(**record) for record in page["records"]]
+        page["path"] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(path))), page["image"])
+    return pages
+
+
+def field_matches(field: str, expected: Any, actual: Any) -> bool:
+    if field == "date":
+        return parse_logbook_date(str(expected)) == parse_logbook_date(str(actual))
+    if isinstance(expected, (int, float)):
+        return abs(float(expected) - float(actual)) < 0.005
+    # Case, spacing and punctuation differences in free text are not OCR errors
+    normalize = lambda value: re.sub(r"[^A-Z0-9]+", " ", str(value).upper()).strip()
+    return normalize(expected) == normalize(actual)
+
+
+def align_records(expected: List[FlightEntry], actual: List[FlightEntry]) -> List[Tuple[int, int]]:
+    """
+    Pairs expected and extracted rows, best agreement first. A pair needs at least
+    half of the scored fields to agree; unpaired expected rows count as missed.
+    """
+    candidates = []
+    for i, want in enumerate(expected):
+        for j, got in enumerate(actual):
+            score = sum(field_matches(field, getattr(want, field), getattr(got, field)) for field in SCORED_FIELDS)
+            if score * 2 >= len(SCORED_FIELDS):
+                candidates.append((-score, abs(i - j), i, j))
+
+    pairs, used_expected, used_actual = [], set(), set()
+    for _, _, i, j in sorted(candidates):
+        if i not in used_expected and j not in used_actual:
+            pairs.append((i, j))
+            used_expected.add(i)
+            used_actual.add(j)
+    return pairs
+
+
+def score_page(expected: List[FlightEntry], actual: List[FlightEntry]) -> Dict[str, Any]:
+    pairs = align_records(expected, actual)
+    correct = Counter()
+    for i, j in pairs:
+        for field in SCORED_FIELDS:
+            if field_matches(field, getattr(expected[i], field), getattr(actual[j], field)):
+                correct[field] += 1
+    return {
+        "expected": len(expected),
+        "found": len(actual),
+        "matched": len(pairs),
+        "correct": dict(correct),
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def run_live(provider: str, pages: List[Dict[str, Any]], runs: int) -> List[Dict[str, Any]]:
+    processor = PROCESSORS[provider]()
+    samples = []
+    for _ in range(runs):
+        for page in pages:
+            with open(page["path"], "rb") as f:
+                file_bytes = f.read()
+            usage = begin_request_usage()
+            start = time.perf_counter()
+            result = await processor.process_image(file_bytes, page["mime_type"])
+            samples.append({
+                "image": page["image"],
+                "latency": time.perf_counter() - start,
+                "cost_usd": usage.cost_usd,
+                "message": result.message,
+                **score_page(page["records"], result.records),
+            })
+    return samples
+
+
+def newest_archive_entry(archive: ResponseArchive, file_bytes: bytes, provider: str) -> Optional[str]:
+    image_hash = hashlib.sha256(file_bytes).hexdigest()
+    directory = os.path.join(archive.root, image_hash[:2])
+    if not os.path.isdir(directory):
+        return None
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(image_hash) and name.endswith(f"-{provider}.json.gz")
+    )
+    return os.path.join(directory, names[-1]) if names else None
+
+
+def run_replay(provider: str, pages: List[Dict[str, Any]], archive: ResponseArchive) -> List[Dict[str, Any]]:
+    samples = []
+    for page in pages:
+        with open(page["path"], "rb") as f:
+            path = newest_archive_entry(archive, f.read(), provider)
+        if path is None:
+            print(f"  {provider}: no archived response for {page['image']}, skipped")
+            continue
+        entry = ResponseArchive.load(path)
+
+        usage = begin_request_usage()
+        if provider in ("AWS", "HYBRID"):
+            record_textract(entry["response"]["textract"] if provider == "HYBRID" else entry["response"], ["TABLES"])
+        start = time.perf_counter()
+        records = [FlightEntry(**record) for record in reparse_entry(entry)]
+        samples.append({
+            "image": page["image"],
+            "latency": time.perf_counter() - start,
+            "cost_usd": usage.cost_usd,
+            "archive_entry": path,
+            **score_page(page["records"], records),
+        })
+    return samples
+
+
+def summarize(provider: str, samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    expected = sum(sample["expected"] for sample in samples)
+    correct = Counter()
+    for sample in samples:
+        correct.update(sample["correct"])
+    latencies = [sample["latency"] for sample in samples]
+    return {
+        "provider": provider,
+        "pages": len(samples),
+        "records_expected": expected,
+        "records_found": sum(sample["found"] for sample in samples),
+        "records_matched": sum(sample["matched"] for sample in samples),
+        # Missed rows count against every field
+        "field_accuracy": {field: correct[field] / expected if expected else 0.0 for field in SCORED_FIELDS},
+        "accuracy": sum(correct.values()) / (expected * len(SCORED_FIELDS)) if expected else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p90": percentile(latencies, 0.9),
+        "latency_p99": percentile(latencies, 0.99),
+        "cost_usd": sum(sample["cost_usd"] for sample in samples),
+        "cost_per_page_usd": sum(sample["cost_usd"] for sample in samples) / len(samples) if samples else 0.0,
+    }
+
+
+def print_report(summaries: List[Dict[str, Any]]):
+    width = max(len(field) for field in SCORED_FIELDS) + 2
+    print()
+    print("".ljust(width) + "".join(summary["provider"].rjust(12) for summary in summaries))
+    rows = [
+        ("pages", lambda s: f"{s['pages']}"),
+        ("records found", lambda s: f"{s['records_found']}/{s['records_expected']}"),
+        ("records matched", lambda s: f"{s['records_matched']}/{s['records_expected']}"),
+        ("accuracy", lambda s: f"{s['accuracy']:.1%}"),
+    ]
+    rows += [(f"  {field}", lambda s, field=field: f"{s['field_accuracy'][field]:.1%}") for field in SCORED_FIELDS]
+    rows += [
+        ("latency p50", lambda s: f"{s['latency_p50']:.2f}s"),
+        ("latency p90", lambda s: f"{s['latency_p90']:.2f}s"),
+        ("latency p99", lambda s: f"{s['latency_p99']:.2f}s"),
+        ("cost total", lambda s: f"${s['cost_usd']:.4f}"),
+        ("cost / page", lambda s: f"${s['cost_per_page_usd']:.4f}"),
+    ]
+    for label, render in rows:
+        print(label.ljust(width) + "".join(render(summary).rjust(12) for summary in summaries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR providers for accuracy, latency and cost")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--providers", nargs="+", default=["AWS", "GEMINI", "HYBRID"], choices=sorted(PROCESSORS))
+    parser.add_argument("--runs", type=int, default=1, help="Live runs per page (more runs, steadier percentiles)")
+    parser.add_argument("--replay", metavar="ARCHIVE_DIR", help="Re-parse archived responses instead of calling providers")
+    parser.add_argument("--output", help="Write the per-page samples and summaries as JSON to this file")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    print(f"Loaded {len(pages)} pages, {sum(len(page['records']) for page in pages)} expected records from {args.corpus}")
+
+    if args.replay:
+        # Archiving while benchmarking would add the benchmark's own calls to the archive
+        os.environ.pop("OCR_ARCHIVE_DIR", None)
+    archive = ResponseArchive(args.replay) if args.replay else None
+
+    report = {"mode": "replay" if archive else "live", "providers": {}}
+    for provider in args.providers:
+        if archive and provider == "AUTO":
+            print("  AUTO: routing decisions are not archived, skipped in replay mode")
+            continue
+        print(f"Running {provider}...")
+        samples = run_replay(provider, pages, archive) if archive else asyncio.run(run_live(provider, pages, args.runs))
+        report["providers"][provider] = {"summary": summarize(provider, samples), "samples": samples}
+
+    summaries = [entry["summary"] for entry in report["providers"].values()]
+    if not any(summary["pages"] for summary in summaries):
+        print("Nothing was benchmarked")
+        return 1
+    print_report(summaries)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote report to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
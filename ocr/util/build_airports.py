@@ -0,0 +1,52 @@
+# Builds the bundled airport code list (data/airports.txt.gz) used by
+# processors/airports.py from the airportsdata project's airports.csv
+# (https://github.com/mborsetti/airportsdata, MIT licensed).
+#
+# Each line holds an ICAO code, optionally followed by the airport's FAA
+# location identifier when it differs (e.g. "KSMO SMO"). Airports with an IATA
+# code (the larger, more frequently logged ones) are prefixed with "*"; they win
+# ties when a garbled code is equally close to several airports.
+#
+# Usage (inside the ocr directory):
+# python -m util.build_airports path/to/airports.csv
+
+import argparse
+import csv
+import gzip
+import os
+import re
+import sys
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "airports.txt.gz")
+CODE = re.compile(r"^[A-Z0-9]{3,4}$")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the bundled airport code list")
+    parser.add_argument("csv", help="airports.csv from the airportsdata project")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    airports = {}
+    with open(args.csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            icao = row["icao"].strip().upper()
+            lid = row.get("lid", "").strip().upper()
+            if CODE.match(icao):
+                airports[icao] = (lid if CODE.match(lid) and lid != icao else "", bool(row.get("iata", "").strip()))
+
+    # A location identifier must never shadow another airport's ICAO code
+    lines = []
+    for icao, (lid, has_iata) in sorted(airports.items()):
+        line = f"{icao} {lid}" if lid and lid not in airports else icao
+        lines.append(f"*{line}" if has_iata else line)
+    # mtime=0 keeps the output byte-identical across rebuilds
+    with gzip.GzipFile(args.output, "wb", mtime=0) as f:
+        f.write(("\n".join(lines) + "\n").encode("ascii"))
+    print(f"Wrote {len(lines)} airports ({sum(1 for line in lines if ' ' in line)} with FAA identifiers, "
+          f"{sum(1 for line in lines if line.startswith('*'))} with IATA codes) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,177 @@
-import requests
+# Submits logbook pages to the OCR service.
+# Accepts image files and directories; pages are posted concurrently over a
+# pool of keep-alive connections, with retries on 429/5xx. Prints per-file
+# latency and aggregate throughput, so it doubles as a post-deploy smoke test.
+#
+# Usage (inside the ocr directory):
+# python util/manual_post.py images/example.png
+# python util/manual_post.py images/ --concurrency 8 --output results.ndjson
+
+import argparse
+import asyncio
 import json
+import mimetypes
+import os
+import random
 import sys
+import time
+from typing import List, Optional, TextIO
+
+import httpx
 
 url = "http://localhost:8000/ocr/process"
 
-def test_ocr_endpoint(image_path: str):
-    with open(image_path, "rb") as f:
-        files = {"file": (image_path, f, "image/jpeg")}
-        response = requests.post(url, files=files)
-        
-        if response.status_code == 200:
-            print("OCR Processing Successful!")
-            print("Response JSON:")
-            print(json.dumps(response.json(), indent=4))
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def collect_images(paths: List[str]) -> List[str]:
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
         else:
-            print(f"OCR Processing Failed with status code {response.status_code}")
-            print("Response Text:")
-            print(response.text)
+            images.append(path)
+    return images
+
+
+def retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Honors Retry-After when the server sends it, otherwise exponential backoff with jitter."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+
+async def post_image(client: httpx.AsyncClient, image_path: str, max_retries: int) -> dict:
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+    mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+
+    start = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        response = None
+        try:
+            response = await client.post(url, files={"file": (os.path.basename(image_path), image_bytes, mime_type)})
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+        except httpx.TransportError as e:
+            if attempt == max_retries:
+                return {"file": image_path, "status": None, "error": str(e), "attempts": attempt + 1, "latency": time.perf_counter() - start}
+        if attempt < max_retries:
+            await asyncio.sleep(retry_delay(attempt, response))
+
+    result = {
+        "file": image_path,
+        "status": response.status_code,
+        "attempts": attempt + 1,
+        "latency": time.perf_counter() - start,
+    }
+    if response.status_code == 200:
+        result["response"] = response.json()
+    else:
+        result["error"] = response.text
+    return result
+
+
+async def post_all(
+    images: List[str],
+    concurrency: int,
+    max_retries: int,
+    timeout: float,
+    lane: str = "batch",
+    output: Optional[TextIO] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> List[dict]:
+    """
+    Posts every image and returns the results in completion order. With an output
+    file, each result is written to it as an NDJSON line as soon as it completes,
+    so an interrupted run keeps the pages it already finished.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    # The service admits batch-lane requests only into its spare capacity
+    headers = {"X-OCR-Lane": lane}
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, headers=headers, transport=transport) as client:
+        async def worker(image_path: str):
+            async with semaphore:
+                result = await post_image(client, image_path, max_retries)
+            records = len(result.get("response", {}).get("records", []))
+            print(f"{result['status']} {result['latency']:6.2f}s {records:3d} records  {image_path}"
+                  + (f" (attempts: {result['attempts']})" if result["attempts"] > 1 else ""))
+            results.append(result)
+            if output is not None:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+        await asyncio.gather(*(worker(image_path) for image_path in images))
+
+    return results
+
+
+def print_summary(results: List[dict], elapsed: float):
+    latencies = sorted(result["latency"] for result in results)
+    ok = sum(1 for result in results if result["status"] == 200)
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    print()
+    print(f"Pages: {len(results)}  OK: {ok}  Failed: {len(results) - ok}")
+    print(f"Wall time: {elapsed:.2f}s  Throughput: {len(results) / elapsed:.2f} pages/s")
+    print(f"Latency p50: {percentile(0.5):.2f}s  p90: {percentile(0.9):.2f}s  p99: {percentile(0.99):.2f}s  max: {latencies[-1]:.2f}s")
+
+
+def main():
+    global url
+
+    parser = argparse.ArgumentParser(description="Post logbook pages to the OCR service")
+    parser.add_argument("paths", nargs="*", default=["images/example.png"], help="Image files or directories")
+    parser.add_argument("--url", default=url)
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per page on 429/5xx or connection errors")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--lane", default="batch", choices=["batch", "interactive"], help="Admission lane on the OCR service")
+    parser.add_argument("--output", help="Write one NDJSON line per page (including the OCR response) to this file")
+    args = parser.parse_args()
+    url = args.url
+
+    images = collect_images(args.paths)
+    if not images:
+        print("No images found")
+        return 1
+
+    output = open(args.output, "w") if args.output else None
+    start = time.perf_counter()
+    try:
+        results = asyncio.run(post_all(images, args.concurrency, args.retries, args.timeout, args.lane, output))
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    if len(images) == 1 and results[0]["status"] == 200:
+        print("OCR Processing Successful!")
+        print("Response JSON:")
+        print(json.dumps(results[0]["response"], indent=4))
+    elif len(images) == 1:
+        print(f"OCR Processing Failed with status code {results[0]['status']}")
+        print("Response Text:")
+        print(results[0]["error"])
+
+    print_summary(results, elapsed)
+    return 0 if all(result["status"] == 200 for result in results) else 1
 
 
 if __name__ == "__main__":
-    # Replace use path of first cli argument with path to a test image file
-    test_image_path = sys.argv[1] if len(sys.argv) > 1 else "images/example.png"
-    test_ocr_endpoint(test_image_path)
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Re-runs the current parsers over the raw provider response archive (see
+# processors/archive.py) and diffs the new records against the archived ones.
+# Parser upgrades can be evaluated on historical pages without calling
+# Textract or Gemini again.
+#
+# Usage (inside the ocr directory):
+# python -m util.reparse_archive --archive-dir archive --workers 8 --output diffs.ndjson
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from processors import AWSOCRProcessor, ResponseArchive
+from processors.airports import correct_airport_codes
+from processors.gemini_processor import parse_records_json
+
+# One parser instance per worker process
+_aws_parser: Optional[AWSOCRProcessor] = None
+
+
+def _get_aws_parser() -> AWSOCRProcessor:
+    global _aws_parser
+    if _aws_parser is None:
+        # Archiving must stay off while re-parsing, and no request is ever sent
+        os.environ.pop("OCR_ARCHIVE_DIR", None)
+        _aws_parser = AWSOCRProcessor()
+    return _aws_parser
+
+
+def reparse_entry(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Runs the current parser for the entry's provider over its raw response."""
+    provider = entry["provider"]
+    response = entry["response"]
+
+    if provider == "AWS":
+        records = _get_aws_parser()._parse_textract_json(response)
+    elif provider == "GEMINI":
+        records = parse_records_json(response)
+    elif provider == "HYBRID":
+        records = parse_records_json(response["gemini"])
+    else:
+        raise ValueError(f"Unknown provider in archive entry: {provider}")
+
+    return [record.model_dump() for record in correct_airport_codes(records)]
+
+
+def diff_records(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compares records row by row and counts changed fields."""
+    changed_fields = Counter()
+    changed_rows = []
+    for index in range(min(len(old), len(new))):
+        fields = sorted(key for key in new[index] if old[index].get(key) != new[index].get(key))
+        if fields:
+            changed_fields.update(fields)
+            changed_rows.append({
+                "row": index,
+                "changes": {key: [old[index].get(key), new[index].get(key)] for key in fields},
+            })
+
+    return {
+        "old_count": len(old),
+        "new_count": len(new),
+        "changed_fields": dict(changed_fields),
+        "changed_rows": changed_rows,
+    }
+
+
+def process_path(path: str) -> Dict[str, Any]:
+    entry = ResponseArchive.load(path)
+    result = {
+        "path": path,
+        "image_sha256": entry["image_sha256"],
+        "timestamp": entry["timestamp"],
+        "provider": entry["provider"],
+    }
+    try:
+        result.update(diff_records(entry["records"], reparse_entry(entry)))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def latest_paths(paths: List[str]) -> List[str]:
+    """Keeps only the newest entry per (image, provider); names sort by timestamp."""
+    latest = {}
+    for path in sorted(paths):
+        image_hash, _, provider = os.path.basename(path)[:-len(".json.gz")].split("-")
+        latest[(image_hash, provider)] = path
+    return sorted(latest.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse archived provider responses and diff the results")
+    parser.add_argument("--archive-dir", default=os.getenv("OCR_ARCHIVE_DIR", "archive"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latest-only", action="store_true", help="Only re-parse the newest entry per image")
+    parser.add_argument("--output", help="Write one NDJSON diff line per entry to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every changed entry")
+    args = parser.parse_args()
+
+    paths = list(ResponseArchive(args.archive_dir).iter_paths())
+    if args.latest_only:
+        paths = latest_paths(paths)
+    if not paths:
+        print(f"No archive entries found in {args.archive_dir}")
+        return 1
+
+    start = time.perf_counter()
+    totals = Counter()
+    field_totals = Counter()
+    out = open(args.output, "w") if args.output else None
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for result in pool.map(process_path, paths, chunksize=16):
+                totals["entries"] += 1
+                if "error" in result:
+                    totals["errors"] += 1
+                    print(f"ERROR {result['path']}: {result['error']}")
+                else:
+                    totals["old_records"] += result["old_count"]
+                    totals["new_records"] += result["new_count"]
+                    field_totals.update(result["changed_fields"])
+                    if result["changed_rows"] or result["old_count"] != result["new_count"]:
+                        totals["changed_entries"] += 1
+                        if args.verbose:
+                            print(json.dumps(result))
+                if out:
+                    out.write(json.dumps(result) + "\n")
+    finally:
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Re-parsed {totals['entries']} entries in {elapsed:.2f}s ({totals['entries'] / elapsed:.1f} entries/s)")
+    print(f"Records: {totals['old_records']} archived -> {totals['new_records']} re-parsed")
+    print(f"Entries with changes: {totals['changed_entries']}, errors: {totals['errors']}")
+    for field, count in field_totals.most_common():
+        print(f"  {field}: {count} changed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,36 @@
 # https://docs.aws.amazon.com/textract/latest/dg/examples-export-table-csv.html
+#
+# Batch mode: extracts the tables from a directory or glob of page images.
+# Multi-page PDFs and TIFFs are split so each page is its own Textract call;
+# a worker thread parses each document once and reads its pages from it.
+# Textract calls fan out through a bounded thread pool sharing one client,
+# responses are parsed in a process pool, and output is written as each page
+# completes. Completed pages are recorded in a manifest, so an interrupted run
+# picks up where it stopped. CSV output mirrors the input tree under the output
+# directory, with one <name>-p<N>.csv per page of a multi-page document.
+#
+# Usage (inside the ocr directory):
+# python util/textract_table_parser.py images/ --output-dir output --format csv
+# python util/textract_table_parser.py "scans/*.png" --format ndjson --threads 16
 
-import webbrowser, os
+import argparse
+import glob
 import json
-import boto3
-import io
-from io import BytesIO
+import os
 import sys
-from pprint import pprint
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import boto3
+
+# Add the parent directory to sys.path to import documents
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from documents import DocumentError, PageReader, open_document
+
+DOCUMENT_TYPES = {'.pdf': 'application/pdf', '.tif': 'image/tiff', '.tiff': 'image/tiff'}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg') + tuple(DOCUMENT_TYPES)
 
 
 def get_rows_columns_map(table_result, blocks_map):
@@ -24,7 +48,8 @@ def get_rows_columns_map(table_result, blocks_map):
                         rows[row_index] = {}
                     
                     # get confidence score
-                    scores.append(str(cell['Confidence']))
+                    if 'Confidence' in cell:
+                        scores.append(str(cell['Confidence']))
                         
                     # get the text value
                     rows[row_index][col_index] = get_text(cell, blocks_map)
@@ -49,22 +74,70 @@ def get_text(result, blocks_map):
     return text
 
 
-def get_table_csv_results(file_name):
+def document_type(file_name):
+    return DOCUMENT_TYPES.get(os.path.splitext(file_name)[1].lower())
+
+
+class OpenDocuments:
+    """
+    Each worker thread's current PDF/TIFF, kept open between its pages. Pages are
+    queued in file order, so a thread works through a document's pages in turn and
+    parses the document once rather than once per page.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = set()
+
+    def page(self, file_name, index):
+        current = getattr(self._local, 'current', None)
+        if current is None or current[0] != file_name:
+            if current is not None:
+                self._local.current = None
+                self._close(current)
+            file = open(file_name, 'rb')
+            try:
+                reader = PageReader(file, document_type(file_name))
+            except Exception:
+                file.close()
+                raise
+            current = (file_name, file, reader)
+            self._local.current = current
+            with self._lock:
+                self._open.add(current)
+        return current[2].page(index)
+
+    def _close(self, current):
+        with self._lock:
+            self._open.discard(current)
+        _, file, reader = current
+        reader.close()
+        file.close()
 
-    with open(file_name, 'rb') as file:
-        img_test = file.read()
-        bytes_test = bytearray(img_test)
-        print('Image loaded', file_name)
+    def close(self):
+        """Closes every thread's document; call once the worker threads are done."""
+        with self._lock:
+            remaining = list(self._open)
+        for current in remaining:
+            self._close(current)
 
-    # process using image bytes
-    # get the results
-    session = boto3.Session(profile_name='default') # see your .aws/credentials file for profile names
-    client = session.client('textract', region_name='us-west-1')
-    response = client.analyze_document(Document={'Bytes': bytes_test}, FeatureTypes=['TABLES'])
 
-    # Get the text blocks
-    blocks=response['Blocks']
-#    pprint(blocks)
+def analyze_file(client, documents, file_name, page=None):
+    """
+    Calls Textract for one page: the whole file for an image, or one page (1-based)
+    of a PDF/TIFF. boto3 clients are thread-safe, so one client is shared.
+    """
+    if page is None:
+        with open(file_name, 'rb') as file:
+            image_bytes = file.read()
+    else:
+        image_bytes, _ = documents.page(file_name, page - 1)
+    return client.analyze_document(Document={'Bytes': image_bytes}, FeatureTypes=['TABLES'])
+
+
+def get_blocks(response):
+    blocks = response['Blocks']
 
     blocks_map = {}
     table_blocks = []
@@ -72,6 +145,11 @@ def get_table_csv_results(file_name):
         blocks_map[block['Id']] = block
         if block['BlockType'] == "TABLE":
             table_blocks.append(block)
+    return blocks_map, table_blocks
+
+
+def get_table_csv_results(response):
+    blocks_map, table_blocks = get_blocks(response)
 
     if len(table_blocks) <= 0:
         return "<b> NO Table FOUND </b>"
@@ -83,6 +161,28 @@ def get_table_csv_results(file_name):
 
     return csv
 
+
+def get_table_rows(response):
+    """Returns every table as a list of rows (lists of cell text), for NDJSON output."""
+    blocks_map, table_blocks = get_blocks(response)
+
+    tables = []
+    for table in table_blocks:
+        rows, _ = get_rows_columns_map(table, blocks_map)
+        tables.append([
+            [rows[row_index][col_index].strip() for col_index in sorted(rows[row_index])]
+            for row_index in sorted(rows)
+        ])
+    return tables
+
+
+def parse_response(file_name, page, response, output_format):
+    """Runs in the process pool: turns a raw Textract response into output text."""
+    if output_format == 'ndjson':
+        return json.dumps({'file': file_name, 'page': page, 'tables': get_table_rows(response)}) + '\n'
+    return get_table_csv_results(response)
+
+
 def generate_table_csv(table_result, blocks_map, table_index):
     rows, scores = get_rows_columns_map(table_result, blocks_map)
 
@@ -109,19 +209,189 @@ def generate_table_csv(table_result, blocks_map, table_index):
     csv += '\n\n\n'
     return csv
 
-def main(file_name):
-    table_csv = get_table_csv_results(file_name)
+def collect_inputs(inputs):
+    """Expands directories and glob patterns into a sorted list of page images."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in os.listdir(item):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    files.add(os.path.join(item, name))
+        else:
+            files.update(path for path in glob.glob(item) if os.path.isfile(path))
+    return sorted(files)
+
+
+def expand_pages(files):
+    """
+    Turns files into (file, page) work items: page is None for an image, or 1..N
+    for each page of a PDF/TIFF. Unreadable documents are reported and skipped.
+    """
+    pages = []
+    unreadable = []
+    for file_name in files:
+        mime_type = document_type(file_name)
+        if mime_type is None:
+            pages.append((file_name, None))
+            continue
+        try:
+            with open(file_name, 'rb') as file:
+                page_count, _ = open_document(file, mime_type)
+        except DocumentError as e:
+            print(f'FAILED {file_name}: {e}')
+            unreadable.append(file_name)
+            continue
+        pages.extend((file_name, page) for page in range(1, page_count + 1))
+    return pages, unreadable
+
+
+def load_manifest(manifest_path):
+    """Returns the set of (file, page) items completed by previous runs."""
+    done = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done.add((entry['file'], entry.get('page')))
+                except (ValueError, KeyError):
+                    # Partially written last line from an interrupted run
+                    continue
+    return done
+
+
+class BatchWriter:
+    """
+    Writes each page's output as it completes, then records it in the manifest.
+    CSV files mirror each input's path relative to base_dir, so same-named pages
+    in different directories don't overwrite each other.
+    """
+
+    def __init__(self, output_dir, output_format, base_dir='.'):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.base_dir = base_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = open(os.path.join(output_dir, 'manifest.ndjson'), 'a')
+        self.ndjson = None
+        if output_format == 'ndjson':
+            self.ndjson = open(os.path.join(output_dir, 'tables.ndjson'), 'a')
+
+    def csv_path(self, file_name, page=None):
+        stem = os.path.splitext(os.path.relpath(os.path.abspath(file_name), self.base_dir))[0]
+        if page is not None:
+            stem += f'-p{page}'
+        return os.path.join(self.output_dir, stem + '.csv')
+
+    def write(self, file_name, page, output):
+        if self.ndjson:
+            self.ndjson.write(output)
+            self.ndjson.flush()
+        else:
+            path = self.csv_path(file_name, page)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wt') as fout:
+                fout.write(output)
+        # Only mark the page done once its output is on disk
+        self.manifest.write(json.dumps({'file': file_name, 'page': page}) + '\n')
+        self.manifest.flush()
+
+    def close(self):
+        self.manifest.close()
+        if self.ndjson:
+            self.ndjson.close()
+
+
+def run_batch(pages, client, writer, threads, processes, output_format):
+    """
+    Pipelines the (file, page) items: Textract calls in a bounded thread pool,
+    parsing in a process pool, writing on the main thread as soon as each page
+    is parsed.
+    """
+    start = time.perf_counter()
+    completed = 0
+    failed = 0
+    pending_pages = iter(pages)
+    documents = OpenDocuments()
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as io_pool, ProcessPoolExecutor(max_workers=processes) as cpu_pool:
+            in_flight = {}
+
+            def submit_next():
+                item = next(pending_pages, None)
+                if item is not None:
+                    in_flight[io_pool.submit(analyze_file, client, documents, *item)] = ('analyze', item)
+
+            # Keep at most 2x threads pages in memory at a time
+            for _ in range(threads * 2):
+                submit_next()
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, (file_name, page) = in_flight.pop(future)
+                    label = file_name if page is None else f'{file_name} page {page}'
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f'FAILED {label}: {e}')
+                        if stage == 'analyze':
+                            submit_next()
+                        continue
+
+                    if stage == 'analyze':
+                        future = cpu_pool.submit(parse_response, file_name, page, result, output_format)
+                        in_flight[future] = ('parse', (file_name, page))
+                        submit_next()
+                    else:
+                        writer.write(file_name, page, result)
+                        completed += 1
+                        elapsed = time.perf_counter() - start
+                        print(f'[{completed}/{len(pages)}] {label} ({completed / elapsed:.2f} pages/s)')
+    finally:
+        documents.close()
+
+    elapsed = time.perf_counter() - start
+    return completed, failed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract Textract tables from a batch of page images')
+    parser.add_argument('inputs', nargs='+', help='Image files, directories or glob patterns')
+    parser.add_argument('--output-dir', default='output', help='Directory for output and the resume manifest')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv', dest='output_format')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent Textract calls')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='Parser processes')
+    parser.add_argument('--profile', default='default', help='AWS credentials profile')
+    parser.add_argument('--region', default='us-west-1')
+    args = parser.parse_args()
+
+    files = collect_inputs(args.inputs)
+    pages, unreadable = expand_pages(files)
+    done = load_manifest(os.path.join(args.output_dir, 'manifest.ndjson'))
+    remaining = [item for item in pages if item not in done]
+    print(f'Found {len(pages)} pages in {len(files)} files, {len(pages) - len(remaining)} already done, {len(remaining)} to process')
+    if not remaining:
+        return 1 if unreadable else 0
 
-    output_file = 'output.csv'
+    session = boto3.Session(profile_name=args.profile) # see your .aws/credentials file for profile names
+    client = session.client('textract', region_name=args.region)
 
-    # replace content
-    with open(output_file, "wt") as fout:
-        fout.write(table_csv)
+    # Mirror output paths from the deepest directory containing every input
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+    writer = BatchWriter(args.output_dir, args.output_format, base_dir)
+    try:
+        completed, failed, elapsed = run_batch(remaining, client, writer, args.threads, args.processes, args.output_format)
+    finally:
+        writer.close()
 
-    # show the results
-    print('CSV OUTPUT FILE: ', output_file)
+    failed += len(unreadable)
+    print(f'Processed {completed} pages in {elapsed:.1f}s ({completed / elapsed if elapsed else 0:.2f} pages/s), {failed} failed')
+    print('OUTPUT DIRECTORY: ', args.output_dir)
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    file_name = sys.argv[1]
-    main(file_name)
+    sys.exit(main())
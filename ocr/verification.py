@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from processors import ArchivedFlight, FlightEntry, FlightMatch
+from processors.airports import AirportIndex, get_airport_index
+from processors.base import parse_logbook_date
+
+
+def _to_utc(value) -> datetime:
+    """Archive timestamps are either epoch milliseconds (Prisma/SQLite) or ISO strings; naive means UTC."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+class FlightIndex:
+    """
+    In-memory index of archived flights for batch verification.
+
+    Flights are grouped by (tail number, UTC departure day) with departure times
+    sorted, so verifying a whole OCR page is a handful of dict lookups instead of
+    one database query per entry. Matching follows server/src/verify.ts: tail
+    number and airports must match, the departure must fall on the same UTC day,
+    and the duration must be within the tolerance. Airports are compared by ICAO
+    code via the airport index, so a logged FAA identifier ("SMO") matches an
+    archived ICAO code ("KSMO").
+    """
+
+    def __init__(self, flights: Iterable[ArchivedFlight], airports: Optional[AirportIndex] = None):
+        self.airports = airports if airports is not None else get_airport_index()
+        buckets: Dict[Tuple[str, date], List[Tuple[datetime, ArchivedFlight]]] = defaultdict(list)
+        count = 0
+        for flight in flights:
+            buckets[(flight.tailNumber, flight.departureTime.date())].append((flight.departureTime, flight))
+            count += 1
+
+        # Sorted by departure so the earliest qualifying flight wins, deterministically
+        self._flights: Dict[Tuple[str, date], List[ArchivedFlight]] = {}
+        for key, bucket in buckets.items():
+            bucket.sort(key=lambda item: item[0])
+            self._flights[key] = [flight for _, flight in bucket]
+        self.size = count
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def from_json(cls, path: str) -> "FlightIndex":
+        """Loads the scraper's JSON format (see data/real_flights.json)."""
+        with open(path) as f:
+            rows = json.load(f)
+        return cls(
+            ArchivedFlight(
+                # Scraped tail numbers are space padded (e.g. "N399EA  "); the seed script trims them
+                tailNumber=row["tail_number"].strip(),
+                aircraftModel=row.get("aircraft_model"),
+                manufacturer=row.get("manufacturer"),
+                originAirportIcao=row.get("origin_airport_icao"),
+                destinationAirportIcao=row.get("destination_airport_icao"),
+                departureTime=_to_utc(row["departure_time"]),
+                arrivalTime=_to_utc(row["arrival_time"]),
+            )
+            for row in rows
+            if row.get("tail_number") and row.get("departure_time") and row.get("arrival_time")
+        )
+
+    @classmethod
+    def from_sqlite(cls, path: str) -> "FlightIndex":
+        """Loads the server's `flights` table."""
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                "SELECT tail_number, aircraft_model, manufacturer, origin_airport_icao, "
+                "destination_airport_icao, departure_time, arrival_time FROM flights"
+            ).fetchall()
+        finally:
+            conn.close()
+        return cls(
+            ArchivedFlight(
+                tailNumber=row[0],
+                aircraftModel=row[1],
+                manufacturer=row[2],
+                originAirportIcao=row[3],
+                destinationAirportIcao=row[4],
+                departureTime=_to_utc(row[5]),
+                arrivalTime=_to_utc(row[6]),
+            )
+            for row in rows
+        )
+
+    @classmethod
+    def from_path(cls, path: str) -> "FlightIndex":
+        if path.endswith((".db", ".sqlite", ".sqlite3")):
+            return cls.from_sqlite(path)
+        return cls.from_json(path)
+
+    def _airport(self, code: Optional[str]) -> Optional[str]:
+        return self.airports.canonical(code) if self.airports is not None else code
+
+    def match(self, entry: FlightEntry, tolerance_minutes: float = 60) -> Optional[ArchivedFlight]:
+        entry_date = parse_logbook_date(entry.date)
+        if entry_date is None:
+            return None
+
+        key = (entry.tailNumber.strip(), entry_date)
+        flights = self._flights.get(key)
+        if not flights:
+            return None
+
+        target = timedelta(hours=entry.totalFlightTime)
+        tolerance = timedelta(minutes=tolerance_minutes)
+        src, dest = self._airport(entry.srcIcao), self._airport(entry.destIcao)
+        for flight in flights:
+            if src and self._airport(flight.originAirportIcao) != src:
+                continue
+            if dest and self._airport(flight.destinationAirportIcao) != dest:
+                continue
+            if abs((flight.arrivalTime - flight.departureTime) - target) <= tolerance:
+                return flight
+        return None
+
+    def match_all(self, entries: List[FlightEntry], tolerance_minutes: float = 60) -> List[FlightMatch]:
+        """Verifies a whole page of entries in one call."""
+        matches = []
+        for index, entry in enumerate(entries):
+            flight = self.match(entry, tolerance_minutes)
+            matches.append(FlightMatch(index=index, verified=flight is not None, flight=flight))
+        return matches
+
+
+_flight_index: Optional[FlightIndex] = None
+
+
+def get_flight_index() -> FlightIndex:
+    """Loads the index once per worker from OCR_FLIGHTS_PATH (JSON file or SQLite database)."""
+    global _flight_index
+    if _flight_index is None:
+        path = os.getenv(
+            "OCR_FLIGHTS_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "real_flights.json"),
+        )
+        _flight_index = FlightIndex.from_path(path)
+        print(f"Loaded {len(_flight_index)} archived flights for verification from {path}")
+    return _flight_index
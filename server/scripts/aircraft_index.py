@@ -0,0 +1,220 @@
+#!/usr/bin/env -S uv run
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "numpy>=1.26",
+#     "zstandard>=0.22.0",
+# ]
+# ///
+"""
+Compact aircraft metadata index
+
+Converts the OpenSky aircraft metadata database
+(https://opensky-network.org/datasets/metadata/, CSV or one JSON object per
+line) once into a directory of .npy files holding only the fields the scraper
+uses. icao24 addresses are stored as 24-bit integers in a sorted array, and
+typecode, model, manufacturername and owner as codes into sorted string
+dictionaries (as in flight_archive.py).
+
+Opening the index memory-maps it, and a lookup is a binary search, so the
+scraper starts instantly instead of parsing the whole database into dicts.
+
+Usage:
+    python aircraft_index.py build aircraftDatabase.csv aircraft.index
+    python aircraft_index.py lookup aircraft.index a0b1c2
+"""
+
+import csv
+import gzip
+import json
+import os
+import shutil
+import logging
+from array import array
+from itertools import chain
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from flight_archive import dictionary_code, icao24_to_int, sort_dictionary
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Metadata fields kept in the index
+FIELDS = ("typecode", "model", "manufacturername", "owner")
+
+
+def read_aircraft_records(path: Path) -> Iterator[dict]:
+    """Records from the OpenSky metadata database: CSV or JSON lines, optionally gzipped."""
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if path.name.endswith((".csv", ".csv.gz")):
+            # Newer database dumps quote every field with single quotes
+            first_line = f.readline()
+            quotechar = "'" if first_line.startswith("'") else '"'
+            yield from csv.DictReader(chain([first_line], f), quotechar=quotechar)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class AircraftIndex:
+    """Aircraft metadata by icao24, memory-mapped (see the module docstring)."""
+
+    def __init__(self, path: Path, mmap: bool = True):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported aircraft index version {self.meta.get('version')}"
+            )
+
+        mode = "r" if mmap else None
+        self.icao24 = np.load(self.path / "icao24.npy", mmap_mode=mode)
+        self.codes: dict[str, np.ndarray] = {}
+        self.dictionaries: dict[str, np.ndarray] = {}
+        for field in FIELDS:
+            self.codes[field] = np.load(self.path / f"{field}.npy", mmap_mode=mode)
+            self.dictionaries[field] = np.load(
+                self.path / f"{field}.dict.npy", mmap_mode=mode
+            )
+
+    @classmethod
+    def open(cls, path: Path, mmap: bool = True) -> "AircraftIndex":
+        return cls(path, mmap)
+
+    def __len__(self) -> int:
+        return int(self.meta["count"])
+
+    def row(self, icao24: str) -> Optional[int]:
+        """Row of an aircraft, by binary search over the sorted addresses."""
+        key = icao24_to_int(icao24.strip())
+        index = int(np.searchsorted(self.icao24, key))
+        if index < len(self.icao24) and self.icao24[index] == key:
+            return index
+        return None
+
+    def get(self, icao24: str) -> dict:
+        """The aircraft's non-empty metadata fields, or {} if it is not indexed."""
+        row = self.row(icao24)
+        if row is None:
+            return {}
+        info = {}
+        for field in FIELDS:
+            value = self.dictionaries[field][self.codes[field][row]].decode()
+            if value:
+                info[field] = value
+        return info
+
+    def code(self, field: str, value: Optional[str]) -> Optional[int]:
+        """Dictionary code of a field value, or None if no aircraft has it."""
+        return dictionary_code(self.dictionaries[field], value)
+
+    @staticmethod
+    def build(source: Path, path: Path) -> int:
+        """
+        Convert a metadata database into an index at path (replacing it).
+        Later records for the same icao24 win. Returns the number of aircraft.
+        """
+        path = Path(path)
+        provisional = {field: {"": 0} for field in FIELDS}
+        codes = {field: array("I") for field in FIELDS}
+        icao24s = array("I")
+
+        for record in read_aircraft_records(source):
+            key = icao24_to_int((record.get("icao24") or "").strip("' "))
+            if key > 0xFFFFFF:
+                continue
+            icao24s.append(key)
+            for field in FIELDS:
+                value = (record.get(field) or "").strip("' ")
+                dictionary = provisional[field]
+                codes[field].append(dictionary.setdefault(value, len(dictionary)))
+
+        keys = np.frombuffer(icao24s, dtype=np.uint32)
+        # Stable sort, then keep the last record of each address
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = sorted_keys[1:] != sorted_keys[:-1]
+        order = order[last]
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        np.save(tmp_path / "icao24.npy", keys[order])
+        for field in FIELDS:
+            values, renumber = sort_dictionary(provisional[field])
+            field_codes = renumber[np.frombuffer(codes[field], dtype=np.uint32)]
+            np.save(tmp_path / f"{field}.npy", field_codes[order])
+            np.save(tmp_path / f"{field}.dict.npy", values)
+        with open(tmp_path / "meta.json", "w") as f:
+            json.dump(
+                {"version": FORMAT_VERSION, "count": len(order), "source": str(source)},
+                f,
+                indent=2,
+            )
+
+        old_path = path.with_name(path.name + ".old")
+        if path.exists():
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        logger.info(f"Indexed {len(order)} aircraft from {source} into {path}")
+        return len(order)
+
+    @classmethod
+    def for_database(cls, source: Path) -> "AircraftIndex":
+        """
+        Open the index next to a metadata database (<source>.index), building it
+        first if it is missing or older than the database.
+        """
+        source = Path(source)
+        if source.is_dir():
+            return cls.open(source)
+        path = source.with_name(source.name + ".index")
+        meta = path / "meta.json"
+        if not meta.exists() or meta.stat().st_mtime < source.stat().st_mtime:
+            logger.info(f"Building aircraft index for {source} (one time)")
+            cls.build(source, path)
+        return cls.open(path)
+
+
+def main():
+    import argparse
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Build and query aircraft indexes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Index an OpenSky metadata database")
+    build.add_argument("source", help="aircraftDatabase.csv or JSON lines file")
+    build.add_argument("index", help="Index directory to write")
+
+    lookup = commands.add_parser("lookup", help="Print an aircraft's metadata")
+    lookup.add_argument("index")
+    lookup.add_argument("icao24")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        AircraftIndex.build(Path(args.source), Path(args.index))
+    else:
+        print(json.dumps(AircraftIndex.open(Path(args.index)).get(args.icao24)))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
@@ -0,0 +1,412 @@
+#!/usr/bin/env -S uv run
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "numpy>=1.26",
+#     "zstandard>=0.22.0",
+# ]
+# ///
+"""
+Columnar flight archive
+
+A compact, memory-mappable alternative to the scraper's row-oriented JSON
+(data/real_flights.json and scrape.py outputs). An archive is a directory of
+.npy files, one per column:
+
+    tail, origin, destination, model, manufacturer   uint32 dictionary codes
+    icao24                                           uint32 (24-bit address)
+    departure, arrival                               int64 epoch seconds
+
+plus a sorted dictionary (fixed-width UTF-8) per string column and meta.json.
+Rows are sorted by (tail, departure) and tail_offsets.npy holds, for every
+tail code, the first row of that tail, so looking up a tail's flights is one
+binary search over the tail dictionary and a slice.
+
+Opening an archive maps the columns instead of reading them, so it takes
+milliseconds whatever its size and only the pages actually touched are loaded.
+
+Usage:
+    python flight_archive.py build data/real_flights.json data/real_flights.flights
+    python flight_archive.py info data/real_flights.flights
+    python flight_archive.py query data/real_flights.flights N399EA
+"""
+
+import os
+import io
+import gzip
+import json
+import shutil
+import logging
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# String columns and the dictionary each one is encoded with
+STRING_COLUMNS = {
+    "tail": "tails",
+    "origin": "airports",
+    "destination": "airports",
+    "model": "models",
+    "manufacturer": "manufacturers",
+}
+TIME_COLUMNS = ("departure", "arrival")
+
+# Missing values: the empty string (always code 0, since dictionaries are
+# sorted), icao24 0xFFFFFFFF and time INT64_MIN
+NO_ICAO24 = np.uint32(0xFFFFFFFF)
+NO_TIME = np.iinfo(np.int64).min
+
+# Scraper JSON field for each column
+RECORD_FIELDS = {
+    "tail": "tail_number",
+    "model": "aircraft_model",
+    "manufacturer": "manufacturer",
+    "origin": "origin_airport_icao",
+    "destination": "destination_airport_icao",
+    "departure": "departure_time",
+    "arrival": "arrival_time",
+    "icao24": "icao24",
+}
+
+
+# =============================================================================
+# Conversions
+# =============================================================================
+
+
+def to_epoch(value) -> int:
+    """
+    Epoch seconds for an ISO timestamp or datetime; naive times are taken as UTC
+    (like ocr/verification.py). The scraper writes explicit UTC offsets.
+    """
+    if value is None or value == "":
+        return NO_TIME
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def from_epoch(value: int) -> Optional[str]:
+    """Inverse of to_epoch: an ISO string with a UTC offset, as the scraper writes."""
+    if value == NO_TIME:
+        return None
+    return datetime.fromtimestamp(int(value), tz=timezone.utc).isoformat()
+
+
+def icao24_to_int(value: Optional[str]) -> int:
+    try:
+        return int(value, 16) & 0xFFFFFF
+    except (TypeError, ValueError):
+        return int(NO_ICAO24)
+
+
+# Value of each ASCII hex digit; 16 marks any other character
+_HEX_DIGITS = np.full(128, 16, dtype=np.uint32)
+for _value, _digit in enumerate("0123456789abcdef"):
+    _HEX_DIGITS[ord(_digit)] = _HEX_DIGITS[ord(_digit.upper())] = _value
+
+
+def icao24s_to_int(values: Iterable[Optional[str]]) -> np.ndarray:
+    """
+    icao24_to_int for a whole array of addresses at once (up to 6 hex digits,
+    surrounding whitespace ignored). Invalid addresses give NO_ICAO24.
+    """
+    strings = np.asarray(values)
+    if strings.dtype.kind != "U":
+        strings = strings.astype(str)
+    strings = np.char.strip(strings)
+    lengths = np.char.str_len(strings)
+    # One code point per column; shorter strings are padded with NULs
+    chars = strings.astype("U6").view(np.uint32).reshape(-1, 6)
+    digits = _HEX_DIGITS[np.minimum(chars, 127)]
+
+    result = np.zeros(len(strings), dtype=np.uint32)
+    valid = (lengths >= 1) & (lengths <= 6)
+    for column in range(6):
+        inside = column < lengths
+        valid &= ~inside | (digits[:, column] < 16)
+        result = np.where(inside, result * 16 + digits[:, column], result)
+    result[~valid] = NO_ICAO24
+    return result
+
+
+def icao24_to_str(value: int) -> Optional[str]:
+    return None if value == NO_ICAO24 else f"{int(value):06x}"
+
+
+def sort_dictionary(dictionary: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sort a string dictionary built up in arrival order ({value: provisional
+    code}). Returns the values as a fixed-width UTF-8 array in sorted order and
+    the array mapping provisional codes to their sorted codes.
+    """
+    values = np.array([value.encode() for value in dictionary], dtype=bytes)
+    order = np.argsort(values, kind="stable")
+    renumber = np.empty(len(order), dtype=np.uint32)
+    renumber[order] = np.arange(len(order), dtype=np.uint32)
+    return values[order], renumber
+
+
+def dictionary_code(dictionary: np.ndarray, value: Optional[str]) -> Optional[int]:
+    """Code of a string in a sorted dictionary (binary search), or None if absent."""
+    key = (value or "").strip().encode()
+    index = int(np.searchsorted(dictionary, key))
+    if index < len(dictionary) and dictionary[index] == key:
+        return index
+    return None
+
+
+def read_records(path: Path) -> Iterator[dict]:
+    """Flight records from a scraper output: .json, .ndjson or .jsonl, optionally .gz/.zst."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        stream = gzip.open(path, "rb")
+    elif path.suffix == ".zst":
+        import zstandard
+
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    else:
+        stream = open(path, "rb")
+
+    with stream:
+        if path.name.endswith((".json", ".json.gz", ".json.zst")):
+            yield from json.load(stream)
+            return
+        for line in io.TextIOWrapper(stream, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+
+
+# =============================================================================
+# Archive
+# =============================================================================
+
+
+class FlightArchive:
+    """A columnar flight archive opened for reading (see the module docstring)."""
+
+    def __init__(self, path: Path, mmap: bool = True):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported flight archive version {self.meta.get('version')}"
+            )
+
+        mode = "r" if mmap else None
+        self.columns: dict[str, np.ndarray] = {
+            name: np.load(self.path / f"{name}.npy", mmap_mode=mode)
+            for name in self.meta["columns"]
+        }
+        self.dictionaries: dict[str, np.ndarray] = {
+            name: np.load(self.path / f"{name}.npy", mmap_mode=mode)
+            for name in set(STRING_COLUMNS.values())
+        }
+        self.tail_offsets = np.load(self.path / "tail_offsets.npy", mmap_mode=mode)
+
+    @classmethod
+    def open(cls, path: Path, mmap: bool = True) -> "FlightArchive":
+        return cls(path, mmap)
+
+    def __len__(self) -> int:
+        return int(self.meta["count"])
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def code(self, column: str, value: Optional[str]) -> Optional[int]:
+        """Dictionary code of a string value in a column, or None if absent."""
+        return dictionary_code(self.dictionaries[STRING_COLUMNS[column]], value)
+
+    def rows_for_tail(
+        self,
+        tail: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> range:
+        """Rows of a tail's flights departing in [start, end), in departure order."""
+        code = self.code("tail", tail)
+        if code is None:
+            return range(0)
+        offset = int(self.tail_offsets[code])
+        departures = self.columns["departure"][offset : self.tail_offsets[code + 1]]
+        first = 0 if start is None else np.searchsorted(departures, to_epoch(start))
+        last = len(departures) if end is None else np.searchsorted(departures, to_epoch(end))
+        return range(offset + int(first), offset + max(int(first), int(last)))
+
+    def flights_for_tail(
+        self,
+        tail: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> list[dict]:
+        return [self.record(row) for row in self.rows_for_tail(tail, start, end)]
+
+    def decode(self, column: str, codes: np.ndarray) -> np.ndarray:
+        """Strings (as bytes) for an array of dictionary codes."""
+        return self.dictionaries[STRING_COLUMNS[column]][codes]
+
+    def record(self, row: int) -> dict:
+        """One flight in the scraper's JSON shape."""
+        record = {}
+        for column, field in RECORD_FIELDS.items():
+            value = self.columns[column][row]
+            if column in STRING_COLUMNS:
+                text = self.dictionaries[STRING_COLUMNS[column]][value].decode()
+                record[field] = text or None
+            elif column in TIME_COLUMNS:
+                record[field] = from_epoch(value)
+            else:
+                record[field] = icao24_to_str(value)
+        return record
+
+    def records(self) -> Iterator[dict]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def write(path: Path, records: Iterable[dict]) -> int:
+        """
+        Build an archive from scraper records (dicts shaped like Flight.to_dict()).
+
+        Codes are collected in compact arrays while reading, then rows are
+        sorted by (tail, departure). The archive is assembled in a temporary
+        directory and moved into place, replacing any previous one. Returns the
+        number of flights written.
+        """
+        path = Path(path)
+        provisional = {name: {"": 0} for name in set(STRING_COLUMNS.values())}
+        codes = {column: array("I") for column in STRING_COLUMNS}
+        icao24s = array("I")
+        times = {column: array("q") for column in TIME_COLUMNS}
+
+        for record in records:
+            for column, dictionary_name in STRING_COLUMNS.items():
+                dictionary = provisional[dictionary_name]
+                # Scraped tail numbers are space padded (e.g. "N399EA  ")
+                value = (record.get(RECORD_FIELDS[column]) or "").strip()
+                codes[column].append(dictionary.setdefault(value, len(dictionary)))
+            icao24s.append(icao24_to_int(record.get("icao24")))
+            for column in TIME_COLUMNS:
+                times[column].append(to_epoch(record.get(RECORD_FIELDS[column])))
+        count = len(icao24s)
+
+        # Sort each dictionary and renumber the codes, so code order is string order
+        dictionaries = {}
+        columns = {}
+        for name, dictionary in provisional.items():
+            dictionaries[name] = sort_dictionary(dictionary)
+        for column, dictionary_name in STRING_COLUMNS.items():
+            renumber = dictionaries[dictionary_name][1]
+            columns[column] = renumber[np.frombuffer(codes[column], dtype=np.uint32)]
+        columns["icao24"] = np.frombuffer(icao24s, dtype=np.uint32)
+        for column in TIME_COLUMNS:
+            columns[column] = np.frombuffer(times[column], dtype=np.int64)
+
+        order = np.lexsort((columns["departure"], columns["tail"]))
+        tails = dictionaries["tails"][0]
+        tail_offsets = np.searchsorted(
+            columns["tail"][order], np.arange(len(tails) + 1)
+        ).astype(np.int64)
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        for column, values in columns.items():
+            np.save(tmp_path / f"{column}.npy", np.ascontiguousarray(values[order]))
+        for name, (values, _) in dictionaries.items():
+            np.save(tmp_path / f"{name}.npy", values)
+        np.save(tmp_path / "tail_offsets.npy", tail_offsets)
+        with open(tmp_path / "meta.json", "w") as f:
+            json.dump(
+                {
+                    "version": FORMAT_VERSION,
+                    "count": count,
+                    "columns": list(columns),
+                    "sorted_by": ["tail", "departure"],
+                },
+                f,
+                indent=2,
+            )
+
+        # Directories cannot be replaced atomically; keep the old one until the
+        # new one is in place
+        old_path = path.with_name(path.name + ".old")
+        if path.exists():
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        logger.info(f"Wrote {count} flights ({len(tails) - 1} tails) to {path}")
+        return count
+
+
+# =============================================================================
+# CLI Entry Point
+# =============================================================================
+
+
+def main():
+    import argparse
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Build and query flight archives")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Convert scraper output to an archive")
+    build.add_argument("inputs", nargs="+", help="Scraper output files")
+    build.add_argument("archive", help="Archive directory to write")
+
+    info = commands.add_parser("info", help="Summarize an archive")
+    info.add_argument("archive")
+
+    query = commands.add_parser("query", help="Print a tail number's flights")
+    query.add_argument("archive")
+    query.add_argument("tail")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        records = (
+            record for path in args.inputs for record in read_records(Path(path))
+        )
+        FlightArchive.write(Path(args.archive), records)
+        return 0
+
+    archive = FlightArchive.open(Path(args.archive))
+    if args.command == "info":
+        print(f"Flights: {len(archive)}")
+        for name, values in sorted(archive.dictionaries.items()):
+            print(f"{name.capitalize()}: {len(values) - 1}")
+    else:
+        for record in archive.flights_for_tail(args.tail):
+            print(json.dumps(record))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
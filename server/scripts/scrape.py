@@ -3,6 +3,9 @@
 # requires-python = ">=3.11"
 # dependencies = [
 #     "requests>=2.28.0",
+#     "httpx>=0.27.0",
+#     "zstandard>=0.22.0",
+#     "numpy>=1.26",
 # ]
 # ///
 """
@@ -16,6 +19,23 @@ Usage:
     export OPENSKY_PASSWORD="your_password"
     python opensky_scraper.py
 
+    # Fetch 2-hour windows (or several --icao24 aircraft) concurrently
+    python opensky_scraper.py --mode history --hours 24 --concurrency 4
+
+    # A week-long backfill, continued after each quota reset
+    python opensky_scraper.py --mode history --hours 168 --no-wait
+    python opensky_scraper.py --mode history --resume
+    python opensky_scraper.py --mode history --hours 24 --restart  # start over
+
+    # Also build a columnar archive (see flight_archive.py) from the results
+    python opensky_scraper.py --mode history --hours 24 --archive flights.flights
+
+    # Track GA aircraft every 60s, writing only what changed between snapshots
+    python opensky_scraper.py --mode poll --interval 60 --output states.ndjson.zst
+
+By default the scraper sleeps until the quota resets when it runs out, going
+by the server's rate-limit headers; --pace spreads the quota over the day.
+
 WARNING: The free open-sky API is finicky and prone to rate-limiting.
 """
 
@@ -48,23 +68,42 @@ WARNING: The free open-sky API is finicky and prone to rate-limiting.
 # Make sure to rate limit.
 
 import os
+import re
+import math
+import gzip
 import json
+import asyncio
 import time
 import logging
+import sqlite3
 from dataclasses import dataclass, asdict
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Iterable, Iterator, Optional, Sequence
 from pathlib import Path
+from urllib.parse import urlencode
 
+import httpx
+import numpy as np
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from aircraft_index import AircraftIndex
+from flight_archive import (
+    NO_TIME,
+    FlightArchive,
+    from_epoch,
+    icao24s_to_int,
+    read_records,
+)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
 # =============================================================================
@@ -80,26 +119,50 @@ class OpenSkyConfig:
     username: Optional[str] = None
     password: Optional[str] = None
 
-    # Rate limiting (requests per time window)
-    anonymous_limit: int = 100  # per day
-    authenticated_limit: int = 1000  # per day
+    # Rate limiting: OpenSky's daily API credits (see credit_class for prices)
+    anonymous_limit: int = 400  # credits per day
+    authenticated_limit: int = 4000  # credits per day
     min_request_interval: float = 1.0  # seconds between requests
+    burst_size: int = 4  # requests the async client may start back to back after idling
+    max_concurrency: int = 4  # requests the async client keeps in flight
 
     # US bounding box (lat_min, lat_max, lon_min, lon_max)
     us_bounds: tuple = (24.396308, 49.384358, -125.0, -66.93457)
 
+    # On running out of quota, sleep until it resets (from the server's
+    # rate-limit headers) instead of failing; optionally spread the remaining
+    # budget evenly over the rest of the day
+    wait_for_reset: bool = True
+    pace_to_reset: bool = False
+
+    # Credit ledger shared by all scrapers on this host (None: this process only)
+    quota_path: Optional[str] = str(Path.home() / ".cache" / "opensky" / "quota.sqlite")
+
+    # Response cache, shared like the ledger (None disables it)
+    cache_path: Optional[str] = str(Path.home() / ".cache" / "opensky" / "cache.sqlite")
+    states_cache_ttl: float = 10.0  # seconds; state vectors update every 5-10s
+    recent_cache_ttl: float = 3600.0  # seconds, for windows that may still change
+    settle_time: float = 86400.0  # seconds after which a closed window is final
+
     @classmethod
     def from_env(cls) -> "OpenSkyConfig":
         """Load configuration from environment variables."""
         return cls(
             username=os.environ.get("OPENSKY_USERNAME"),
             password=os.environ.get("OPENSKY_PASSWORD"),
+            cache_path=os.environ.get("OPENSKY_CACHE_PATH", cls.cache_path) or None,
+            quota_path=os.environ.get("OPENSKY_QUOTA_PATH", cls.quota_path) or None,
         )
 
     @property
     def is_authenticated(self) -> bool:
         return self.username is not None and self.password is not None
 
+    @property
+    def account(self) -> str:
+        """Whose quota requests count against (anonymous quota is per IP)."""
+        return self.username if self.is_authenticated else "anonymous"
+
     @property
     def daily_limit(self) -> int:
         return (
@@ -129,64 +192,648 @@ class Flight:
     def to_dict(self) -> dict:
         return asdict(self)
 
+    @classmethod
+    def from_opensky(
+        cls, raw: dict, info: dict, icao24: Optional[str] = None
+    ) -> "Flight":
+        """Build a Flight from an OpenSky flight object and aircraft metadata."""
+        callsign = raw.get("callsign")
+        return cls(
+            tail_number=callsign.strip() if callsign else None,
+            aircraft_model=info.get("model") or info.get("typecode"),
+            manufacturer=info.get("manufacturername"),
+            origin_airport_icao=raw.get("estDepartureAirport"),
+            destination_airport_icao=raw.get("estArrivalAirport"),
+            departure_time=cls._format_timestamp(raw.get("firstSeen")),
+            arrival_time=cls._format_timestamp(raw.get("lastSeen")),
+            icao24=icao24 or raw.get("icao24", ""),
+            callsign=callsign,
+        )
+
+    @staticmethod
+    def _format_timestamp(ts: Optional[int]) -> Optional[str]:
+        """
+        Convert Unix timestamp to an ISO string in UTC. The offset is explicit so
+        consumers (flight_archive.to_epoch, seed.ts's new Date) can't read it as
+        the machine's local time.
+        """
+        if ts is None:
+            return None
+        return from_epoch(ts)
+
 
 # =============================================================================
 # Rate Limiter
 # =============================================================================
 
 
-class RateLimiter:
-    """Simple rate limiter with daily quota tracking."""
+def seconds_until_reset(now: Optional[float] = None) -> float:
+    """Seconds until the daily quota resets (midnight UTC)."""
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now, tz=timezone.utc).date()
+    midnight = datetime.combine(today + timedelta(days=1), datetime.min.time())
+    return midnight.replace(tzinfo=timezone.utc).timestamp() - now
+
 
-    def __init__(self, daily_limit: int, min_interval: float):
+def parse_rate_limit_headers(headers) -> tuple[Optional[int], Optional[float]]:
+    """
+    (remaining, retry_after) from an OpenSky response's headers.
+
+    OpenSky reports the credits left in X-Rate-Limit-Remaining and, on a 429,
+    the seconds until credits are available in X-Rate-Limit-Retry-After-Seconds
+    (the standard Retry-After is honoured too).
+    """
+
+    def number(name: str) -> Optional[float]:
+        try:
+            return float(headers[name])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    remaining = number("X-Rate-Limit-Remaining")
+    retry_after = number("X-Rate-Limit-Retry-After-Seconds")
+    if retry_after is None:
+        retry_after = number("Retry-After")
+    return (int(remaining) if remaining is not None else None), retry_after
+
+
+# OpenSky charges /states/all by the area of its bounding box: (max square
+# degrees, credits) tiers, and the top price for anything larger or global
+STATES_CREDIT_TIERS = ((25.0, 1), (100.0, 2), (400.0, 3))
+STATES_MAX_CREDITS = 4
+
+
+def credit_class(endpoint: str, params: Optional[dict] = None) -> tuple[str, float]:
+    """
+    (key, default credits) for a request. Requests with the same key cost the
+    same, so the ledger learns one cost per key from the rate-limit headers;
+    the default is the documented price, used until it has.
+    """
+    if endpoint != "/states/all":
+        return endpoint, 1.0
+    params = params or {}
+    try:
+        area = (float(params["lamax"]) - float(params["lamin"])) * (
+            float(params["lomax"]) - float(params["lomin"])
+        )
+    except (KeyError, TypeError, ValueError):
+        return endpoint, STATES_MAX_CREDITS
+    for max_area, credits in STATES_CREDIT_TIERS:
+        if area <= max_area:
+            return f"{endpoint}:{credits}", credits
+    return endpoint, STATES_MAX_CREDITS
+
+
+class QuotaLedger:
+    """
+    Daily credits spent, last-request timestamp and reset date per account, in a
+    SQLite file shared by every scraper process on the host.
+
+    OpenSky meters credits, not requests, and a request's price depends on the
+    endpoint and bounding box. reserve() books a request's estimated credits in
+    one locked transaction, so parallel scrapers together stay within the daily
+    limit and the request spacing. The limit is the configured guess until a
+    response reports the credits left; from then on it is what the server
+    says, and the drop in credits left between responses teaches the ledger
+    what each kind of request (see credit_class) costs. A 429 blocks every
+    process until its Retry-After has passed. With no path the ledger lives in
+    memory and only covers this process.
+    """
+
+    # Weight of the latest observed price in the running estimate
+    COST_SMOOTHING = 0.3
+
+    def __init__(self, path: Optional[str] = None, account: str = "anonymous"):
+        self.path = path
+        self.account = account
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed by hand so reserve() can take the write lock up front
+        self.conn = sqlite3.connect(path or ":memory:", timeout=30, isolation_level=None)
+        if path:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        # Replaces the request-counting "quota" table of older versions
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS credits ("
+            "account TEXT PRIMARY KEY, reset_date TEXT NOT NULL, "
+            "credits_used REAL NOT NULL, last_request REAL, "
+            "server_limit REAL, blocked_until REAL, last_remaining INTEGER)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS credit_costs ("
+            "account TEXT NOT NULL, key TEXT NOT NULL, credits REAL NOT NULL, "
+            "PRIMARY KEY (account, key))"
+        )
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def _read(self) -> dict:
+        """Today's row; the spend and the server-reported numbers restart every day."""
+        row = self.conn.execute(
+            "SELECT reset_date, credits_used, last_request, server_limit, "
+            "blocked_until, last_remaining FROM credits WHERE account = ?",
+            (self.account,),
+        ).fetchone()
+        state = {
+            "credits_used": 0.0,
+            "last_request": None,
+            "server_limit": None,
+            "blocked_until": None,
+            "last_remaining": None,
+        }
+        if row is not None:
+            reset_date, *values = row
+            state.update(zip(state, values))
+            if reset_date < self._today():
+                state.update(credits_used=0.0, server_limit=None, last_remaining=None)
+        return state
+
+    def _write(self, state: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO credits (account, reset_date, credits_used, "
+            "last_request, server_limit, blocked_until, last_remaining) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.account,
+                self._today(),
+                state["credits_used"],
+                state["last_request"],
+                state["server_limit"],
+                state["blocked_until"],
+                state["last_remaining"],
+            ),
+        )
+
+    def _transaction(self, update) -> object:
+        """Run update(state) under the write lock, saving the state it leaves."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._read()
+            result = update(state)
+            self._write(state)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return result
+
+    @staticmethod
+    def _remaining(state: dict, daily_limit: int) -> float:
+        limit = state["server_limit"]
+        return (daily_limit if limit is None else limit) - state["credits_used"]
+
+    def credit_cost(self, key: str, default: float = 1.0) -> float:
+        """What a request of this kind has cost lately, or default if unseen."""
+        row = self.conn.execute(
+            "SELECT credits FROM credit_costs WHERE account = ? AND key = ?",
+            (self.account, key),
+        ).fetchone()
+        return default if row is None else row[0]
+
+    def _learn_cost(self, key: str, credits: float):
+        previous = self.credit_cost(key, credits)
+        estimate = previous + self.COST_SMOOTHING * (credits - previous)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO credit_costs (account, key, credits) "
+            "VALUES (?, ?, ?)",
+            (self.account, key, estimate),
+        )
+
+    def reserve(
+        self,
+        daily_limit: int,
+        min_interval: float,
+        burst: int = 1,
+        pace: bool = False,
+        cost: float = 1.0,
+    ) -> Optional[float]:
+        """
+        Book the next request slot and its estimated cost in credits.
+
+        Returns the seconds to wait before sending the request, or None if too
+        few credits are left (see seconds_until_available()). Slots are
+        min_interval apart, or with pace the rest of the day divided by the
+        requests of this cost the credits left pay for, whichever is longer.
+        Up to burst requests may start together after an idle spell:
+        last_request is the time the latest request would have been sent at an
+        even pace.
+        """
+
+        def update(state: dict) -> Optional[float]:
+            now = time.time()
+            remaining = self._remaining(state, daily_limit)
+            if remaining < cost or (state["blocked_until"] or 0) > now:
+                return None
+
+            interval = min_interval
+            if pace:
+                interval = max(interval, seconds_until_reset(now) * cost / remaining)
+
+            start = now
+            last_request = now
+            if state["last_request"] is not None:
+                next_slot = state["last_request"] + interval
+                start = max(now, next_slot - (max(1, burst) - 1) * interval)
+                last_request = max(now, next_slot)
+
+            state["credits_used"] += cost
+            state["last_request"] = last_request
+            return start - now
+
+        return self._transaction(update)
+
+    def observe(
+        self,
+        remaining: Optional[int],
+        retry_after: Optional[float],
+        key: Optional[str] = None,
+    ):
+        """
+        Record what a response said about the quota (see parse_rate_limit_headers).
+        With key, the drop in credits left since the previous response is taken
+        as the price of that kind of request.
+        """
+
+        def update(state: dict):
+            if remaining is not None:
+                last = state["last_remaining"]
+                # Responses can arrive out of order: only a drop is news, and no
+                # change means another response already accounted for it. With
+                # requests in flight a drop may cover several of them, which
+                # errs towards overestimating prices
+                if last is None or remaining < last:
+                    if key is not None and last is not None:
+                        self._learn_cost(key, last - remaining)
+                    state["last_remaining"] = remaining
+                # Credits booked after this request may already be counted, so
+                # this overestimates the limit by at most the requests in flight
+                state["server_limit"] = state["credits_used"] + state["last_remaining"]
+            if retry_after is not None:
+                state["blocked_until"] = max(
+                    state["blocked_until"] or 0, time.time() + retry_after
+                )
+
+        self._transaction(update)
+
+    def refund(self, cost: float):
+        """
+        Give back the credits of a reservation that was never sent. Its slot
+        stays taken: later reservations may already be spaced after it.
+        """
+
+        def update(state: dict):
+            state["credits_used"] = max(0.0, state["credits_used"] - cost)
+
+        self._transaction(update)
+
+    def seconds_until_available(self, daily_limit: int, cost: float = 1.0) -> float:
+        """How long until reserve() can book a slot of this cost again."""
+        state = self._read()
+        now = time.time()
+        blocked = (state["blocked_until"] or 0) - now
+        if blocked > 0:
+            return blocked
+        if self._remaining(state, daily_limit) < cost:
+            return seconds_until_reset(now)
+        return 0.0
+
+    def remaining(self, daily_limit: int) -> int:
+        return max(0, int(self._remaining(self._read(), daily_limit)))
+
+
+class _LedgerLimiter:
+    """
+    Rate limiting and daily quota shared by RateLimiter and AsyncRateLimiter.
+
+    With wait_for_reset, running out of quota waits until it is available again
+    instead of failing; with pace, credits are spread evenly over the rest of
+    the day. Callers name the kind of request (see credit_class) so it is
+    charged what that kind has been costing.
+    """
+
+    def __init__(
+        self,
+        daily_limit: int,
+        min_interval: float,
+        burst: int = 1,
+        ledger: Optional[QuotaLedger] = None,
+        pace: bool = False,
+        wait_for_reset: bool = False,
+    ):
         self.daily_limit = daily_limit
         self.min_interval = min_interval
-        self.request_count = 0
-        self.last_request_time: Optional[float] = None
-        self.reset_date = datetime.now().date()
+        self.burst = max(1, burst)
+        self.ledger = ledger or QuotaLedger()
+        self.pace = pace
+        self.wait_for_reset = wait_for_reset
 
-    def _maybe_reset_daily(self):
-        """Reset counter if it's a new day."""
-        today = datetime.now().date()
-        if today > self.reset_date:
-            logger.info("Daily rate limit reset")
-            self.request_count = 0
-            self.reset_date = today
+    def _cost(self, key: Optional[str], default_cost: float) -> float:
+        if key is None:
+            return default_cost
+        return self.ledger.credit_cost(key, default_cost)
 
-    def acquire(self) -> bool:
+    def _reserve(self, cost: float) -> Optional[tuple[bool, float]]:
         """
-        Acquire permission to make a request.
-        Returns True if allowed, False if daily limit exceeded.
-        Blocks if minimum interval hasn't passed.
+        (booked, seconds to sleep): after sleeping, a booked slot is due and an
+        unbooked one should be retried. None means the quota is used up.
         """
-        self._maybe_reset_daily()
-
-        if self.request_count >= self.daily_limit:
+        sleep_time = self.ledger.reserve(
+            self.daily_limit, self.min_interval, self.burst, self.pace, cost
+        )
+        if sleep_time is not None:
+            if sleep_time > 0:
+                logger.debug(f"Rate limiting: sleeping {sleep_time:.2f}s")
+            return True, sleep_time
+        if not self.wait_for_reset:
             logger.warning(f"Daily rate limit ({self.daily_limit}) exceeded")
-            return False
+            return None
+        delay = max(1.0, self.ledger.seconds_until_available(self.daily_limit, cost))
+        logger.warning(
+            f"API quota used up, waiting {timedelta(seconds=round(delay))} for it"
+        )
+        return False, delay
 
-        # Enforce minimum interval between requests
-        if self.last_request_time is not None:
-            elapsed = time.time() - self.last_request_time
-            if elapsed < self.min_interval:
-                sleep_time = self.min_interval - elapsed
-                logger.debug(f"Rate limiting: sleeping {sleep_time:.2f}s")
-                time.sleep(sleep_time)
+    # Back-off after a 429 that does not say when to retry
+    DEFAULT_RETRY_AFTER = 60.0
 
-        self.request_count += 1
-        self.last_request_time = time.time()
-        return True
+    def observe(self, response, key: Optional[str] = None):
+        """
+        Adapt to the rate-limit headers of a (requests or httpx) response to a
+        request of kind key.
+        """
+        remaining, retry_after = parse_rate_limit_headers(response.headers)
+        if response.status_code == 429 and retry_after is None:
+            retry_after = self.DEFAULT_RETRY_AFTER
+        # Only a served request tells what its kind costs
+        if response.status_code >= 400:
+            key = None
+        self.ledger.observe(remaining, retry_after, key)
 
     @property
     def remaining(self) -> int:
-        self._maybe_reset_daily()
-        return max(0, self.daily_limit - self.request_count)
+        return self.ledger.remaining(self.daily_limit)
+
+
+class RateLimiter(_LedgerLimiter):
+    """Simple rate limiter with daily quota tracking."""
+
+    def acquire(self, key: Optional[str] = None, default_cost: float = 1.0) -> bool:
+        """
+        Acquire permission to make a request of kind key (see credit_class).
+        Returns True if allowed, False if daily limit exceeded.
+        Blocks if minimum interval hasn't passed.
+        """
+        cost = self._cost(key, default_cost)
+        while True:
+            reservation = self._reserve(cost)
+            if reservation is None:
+                return False
+            booked, sleep_time = reservation
+            time.sleep(sleep_time)
+            if booked:
+                return True
+
+
+class AsyncRateLimiter(_LedgerLimiter):
+    """
+    Token-bucket rate limiter with daily quota tracking, shared by concurrent tasks.
+
+    Tokens refill at one per min_interval up to burst, so after an idle spell up to
+    burst requests start at once while the sustained rate matches RateLimiter.
+    Each caller books its slot in the ledger up front and sleeps until it is due,
+    so waiters are served in arrival order without a lock; a caller cancelled
+    while sleeping gets its credits refunded.
+    """
+
+    async def acquire(
+        self, key: Optional[str] = None, default_cost: float = 1.0
+    ) -> bool:
+        """
+        Acquire permission to make a request of kind key (see credit_class).
+        Returns True if allowed, False if daily limit exceeded.
+        Waits until a token is available.
+        """
+        cost = self._cost(key, default_cost)
+        while True:
+            reservation = self._reserve(cost)
+            if reservation is None:
+                return False
+            booked, sleep_time = reservation
+            try:
+                await asyncio.sleep(sleep_time)
+            except asyncio.CancelledError:
+                if booked:
+                    self.ledger.refund(cost)
+                raise
+            if booked:
+                return True
+
+
+# =============================================================================
+# Response Cache
+# =============================================================================
+
+
+class ResponseCache:
+    """
+    Persistent cache of API responses in a SQLite file, keyed by endpoint and
+    normalized query parameters.
+
+    OpenSky fills in flights for a window in batches, so windows that ended less
+    than settle_time ago expire after recent_ttl; older windows never change and
+    are kept forever. /states/all snapshots expire after states_ttl. SQLite
+    locking lets several scraper processes share one cache file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        states_ttl: float = 10.0,
+        recent_ttl: float = 3600.0,
+        settle_time: float = 86400.0,
+    ):
+        self.path = Path(path)
+        self.states_ttl = states_ttl
+        self.recent_ttl = recent_ttl
+        self.settle_time = settle_time
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, body TEXT NOT NULL, expires_at REAL)"
+            )
+            self.conn.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+            )
+
+    @classmethod
+    def from_config(cls, config: OpenSkyConfig) -> Optional["ResponseCache"]:
+        """Open the cache configured by config.cache_path, if any."""
+        if not config.cache_path:
+            return None
+        return cls(
+            config.cache_path,
+            states_ttl=config.states_cache_ttl,
+            recent_ttl=config.recent_cache_ttl,
+            settle_time=config.settle_time,
+        )
+
+    @staticmethod
+    def key(endpoint: str, params: Optional[dict] = None) -> str:
+        """Cache key: the endpoint and its parameters in canonical order and case."""
+        items = []
+        for name, value in sorted((params or {}).items()):
+            if value is None:
+                continue
+            if name in ("icao24", "airport"):
+                codes = (code.strip() for code in str(value).split(","))
+                value = ",".join(sorted(code.lower() for code in codes if code))
+            items.append((name, str(value)))
+        return f"{endpoint}?{urlencode(items)}"
+
+    def ttl(self, endpoint: str, params: Optional[dict] = None) -> Optional[float]:
+        """Seconds a response stays fresh, or None if it never expires."""
+        if endpoint == "/states/all":
+            return self.states_ttl
+        end = (params or {}).get("end")
+        if end is not None and int(end) <= time.time() - self.settle_time:
+            return None
+        return self.recent_ttl
+
+    def get(self, endpoint: str, params: Optional[dict] = None):
+        """Return the cached response, or None if there is no fresh one."""
+        row = self.conn.execute(
+            "SELECT body, expires_at FROM responses WHERE key = ?",
+            (self.key(endpoint, params),),
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.debug(f"Cache hit for {endpoint} params={params}")
+        return json.loads(row[0])
+
+    def put(self, endpoint: str, params: Optional[dict], data):
+        if data is None:
+            return
+        ttl = self.ttl(endpoint, params)
+        expires_at = None if ttl is None else time.time() + ttl
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, expires_at) "
+                "VALUES (?, ?, ?)",
+                (self.key(endpoint, params), json.dumps(data), expires_at),
+            )
+
+    def close(self):
+        self.conn.close()
 
 
 # =============================================================================
 # OpenSky API Client
 # =============================================================================
 
+# Field order of the state vectors returned by /states/all
+STATE_VECTOR_KEYS = [
+    "icao24",
+    "callsign",
+    "origin_country",
+    "time_position",
+    "last_contact",
+    "longitude",
+    "latitude",
+    "baro_altitude",
+    "on_ground",
+    "velocity",
+    "true_track",
+    "vertical_rate",
+    "sensors",
+    "geo_altitude",
+    "squawk",
+    "spi",
+    "position_source",
+]
+
+# Columns of parsed state vectors (see parse_state_columns): type, and the value
+# stored when OpenSky sends null. "sensors" is left out; it is only set when a
+# request filters by receiver, which the scraper never does.
+STATE_COLUMNS = {
+    "icao24": (str, ""),
+    "callsign": (str, ""),
+    "origin_country": (str, ""),
+    "time_position": (np.int64, NO_TIME),
+    "last_contact": (np.int64, NO_TIME),
+    "longitude": (np.float64, np.nan),
+    "latitude": (np.float64, np.nan),
+    "baro_altitude": (np.float64, np.nan),
+    "on_ground": (bool, False),
+    "velocity": (np.float64, np.nan),
+    "true_track": (np.float64, np.nan),
+    "vertical_rate": (np.float64, np.nan),
+    "geo_altitude": (np.float64, np.nan),
+    "squawk": (str, ""),
+    "spi": (bool, False),
+    "position_source": (np.int8, -1),
+}
+
+
+def parse_state_columns(data: Optional[dict]) -> tuple[int, np.ndarray]:
+    """
+    Parse a /states/all response column by column into a NumPy structured
+    array (one field per STATE_COLUMNS entry), instead of a dict per aircraft.
+    Returns the snapshot time and the states.
+    """
+    rows = (data or {}).get("states") or []
+    # One tuple per column; rows may carry extra trailing fields (category)
+    columns = list(zip(*rows)) if rows else [()] * len(STATE_VECTOR_KEYS)
+
+    arrays = {}
+    for key, (dtype, missing) in STATE_COLUMNS.items():
+        values = columns[STATE_VECTOR_KEYS.index(key)]
+        if dtype is np.float64:
+            # NumPy already reads None as NaN
+            arrays[key] = np.array(values, dtype=dtype)
+        else:
+            arrays[key] = np.array(
+                [missing if value is None else value for value in values], dtype=dtype
+            )
+
+    states = np.empty(
+        len(rows), dtype=[(key, array.dtype) for key, array in arrays.items()]
+    )
+    for key, array in arrays.items():
+        states[key] = array
+    return int((data or {}).get("time") or time.time()), states
+
+
+def _state_value(key: str, value):
+    """A state column value as JSON-ready Python, None where OpenSky sent null."""
+    value = value.item()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value or None
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    return None if value == STATE_COLUMNS[key][1] else value
+
+
+def state_records(states: np.ndarray) -> list[dict]:
+    """Parsed states back as state vector dictionaries (as get_current_states returns)."""
+    return [
+        {
+            key: _state_value(key, state[key]) if key in STATE_COLUMNS else None
+            for key in STATE_VECTOR_KEYS
+        }
+        for state in states
+    ]
+
 
 class OpenSkyClient:
     """Client for the OpenSky Network REST API."""
@@ -230,13 +877,20 @@ class OpenSkyClient:
         self.rate_limiter = RateLimiter(
             daily_limit=self.config.daily_limit,
             min_interval=self.config.min_request_interval,
+            ledger=QuotaLedger(self.config.quota_path, self.config.account),
+            pace=self.config.pace_to_reset,
+            wait_for_reset=self.config.wait_for_reset,
         )
         self.session = self._create_session()
+        self.cache = ResponseCache.from_config(self.config)
 
         if self.config.is_authenticated:
             logger.info("Using authenticated API access")
         else:
-            logger.warning("Using anonymous API access (limited to 100 requests/day)")
+            logger.warning(
+                "Using anonymous API access (limited to "
+                f"{self.config.anonymous_limit} credits/day)"
+            )
 
     def _create_session(self) -> requests.Session:
         """Create a requests session with retry logic."""
@@ -249,7 +903,8 @@ class OpenSkyClient:
         retry_strategy = Retry(
             total=3,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            # 429s are handled in _fetch, which reads their rate-limit headers
+            status_forcelist=[500, 502, 503, 504],
             allowed_methods=["GET"],
         )
         adapter = HTTPAdapter(max_retries=retry_strategy)
@@ -259,17 +914,37 @@ class OpenSkyClient:
         return session
 
     def _request(self, endpoint: str, params: Optional[dict] = None) -> Optional[dict]:
+        """Make a request to the API, answered from the cache when possible."""
+        if self.cache:
+            cached = self.cache.get(endpoint, params)
+            if cached is not None:
+                return cached
+
+        data = self._fetch(endpoint, params)
+        if self.cache:
+            self.cache.put(endpoint, params, data)
+        return data
+
+    def _fetch(self, endpoint: str, params: Optional[dict] = None) -> Optional[dict]:
         """Make a rate-limited request to the API."""
-        if not self.rate_limiter.acquire():
-            raise RateLimitExceeded(
-                f"Daily limit of {self.config.daily_limit} requests exceeded"
-            )
-
         url = f"{self.config.base_url}{endpoint}"
-        logger.debug(f"GET {url} params={params}")
+        key, default_cost = credit_class(endpoint, params)
 
         try:
-            response = self.session.get(url, params=params, timeout=30)
+            while True:
+                if not self.rate_limiter.acquire(key, default_cost):
+                    raise RateLimitExceeded(
+                        f"Daily limit of {self.config.daily_limit} credits exceeded"
+                    )
+
+                logger.debug(f"GET {url} params={params}")
+                response = self.session.get(url, params=params, timeout=30)
+                self.rate_limiter.observe(response, key)
+                if response.status_code != 429 or not self.rate_limiter.wait_for_reset:
+                    break
+                # The limiter now waits for the server's Retry-After
+                logger.warning("Rate limited by server (429), waiting to retry")
+
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
@@ -295,6 +970,27 @@ class OpenSkyClient:
         Returns:
             List of state vector dictionaries
         """
+        data = self._request("/states/all", self._states_params(bounds, icao24_filter))
+        return self._parse_states(data)
+
+    def get_state_columns(
+        self, bounds: Optional[tuple] = None, icao24_filter: Optional[list[str]] = None
+    ) -> tuple[int, np.ndarray]:
+        """
+        Get current state vectors as a NumPy structured array (see
+        parse_state_columns), which is much lighter than a dict per aircraft
+        for large bounding boxes.
+
+        Returns:
+            The snapshot time (Unix timestamp) and the states
+        """
+        data = self._request("/states/all", self._states_params(bounds, icao24_filter))
+        return parse_state_columns(data)
+
+    @staticmethod
+    def _states_params(
+        bounds: Optional[tuple], icao24_filter: Optional[list[str]]
+    ) -> dict:
         params = {}
 
         if bounds:
@@ -311,35 +1007,17 @@ class OpenSkyClient:
         if icao24_filter:
             params["icao24"] = ",".join(icao24_filter)
 
-        data = self._request("/states/all", params)
+        return params
 
+    @staticmethod
+    def _parse_states(data: Optional[dict]) -> list[dict]:
         if not data or "states" not in data or data["states"] is None:
             return []
 
         # Parse state vectors into dictionaries
-        keys = [
-            "icao24",
-            "callsign",
-            "origin_country",
-            "time_position",
-            "last_contact",
-            "longitude",
-            "latitude",
-            "baro_altitude",
-            "on_ground",
-            "velocity",
-            "true_track",
-            "vertical_rate",
-            "sensors",
-            "geo_altitude",
-            "squawk",
-            "spi",
-            "position_source",
-        ]
-
         states = []
         for state in data["states"]:
-            state_dict = dict(zip(keys, state))
+            state_dict = dict(zip(STATE_VECTOR_KEYS, state))
             states.append(state_dict)
 
         return states
@@ -404,13 +1082,185 @@ class OpenSkyClient:
         return data if isinstance(data, list) else []
 
 
+class AsyncOpenSkyClient:
+    """
+    asyncio counterpart of OpenSkyClient, so several windows, airports or aircraft
+    can be fetched at once. All requests share one AsyncRateLimiter, and at most
+    config.max_concurrency are in flight.
+
+    Use as an async context manager (or call aclose()) to release connections.
+    """
+
+    # Same transient failures the requests session retries
+    RETRY_STATUSES = {500, 502, 503, 504}
+    MAX_RETRIES = 3
+
+    def __init__(self, config: Optional[OpenSkyConfig] = None):
+        self.config = config or OpenSkyConfig.from_env()
+        self.rate_limiter = AsyncRateLimiter(
+            daily_limit=self.config.daily_limit,
+            min_interval=self.config.min_request_interval,
+            burst=self.config.burst_size,
+            ledger=QuotaLedger(self.config.quota_path, self.config.account),
+            pace=self.config.pace_to_reset,
+            wait_for_reset=self.config.wait_for_reset,
+        )
+        self._in_flight = asyncio.Semaphore(self.config.max_concurrency)
+        self.http = httpx.AsyncClient(
+            base_url=self.config.base_url,
+            auth=(
+                (self.config.username, self.config.password)
+                if self.config.is_authenticated
+                else None
+            ),
+            timeout=30,
+            transport=httpx.AsyncHTTPTransport(retries=self.MAX_RETRIES),
+        )
+        self.cache = ResponseCache.from_config(self.config)
+
+        if self.config.is_authenticated:
+            logger.info("Using authenticated API access")
+        else:
+            logger.warning(
+                "Using anonymous API access (limited to "
+                f"{self.config.anonymous_limit} credits/day)"
+            )
+
+    async def __aenter__(self) -> "AsyncOpenSkyClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+        if self.cache:
+            self.cache.close()
+
+    async def _request(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> Optional[dict]:
+        """Make a request to the API, answered from the cache when possible."""
+        if self.cache:
+            cached = self.cache.get(endpoint, params)
+            if cached is not None:
+                return cached
+
+        data = await self._fetch(endpoint, params)
+        if self.cache:
+            self.cache.put(endpoint, params, data)
+        return data
+
+    async def _fetch(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> Optional[dict]:
+        """Make a rate-limited request to the API, retrying transient 5xx errors."""
+        key, default_cost = credit_class(endpoint, params)
+        async with self._in_flight:
+            attempt = 0
+            while True:
+                # Retries count against the quota too: the server sees them
+                if not await self.rate_limiter.acquire(key, default_cost):
+                    raise RateLimitExceeded(
+                        f"Daily limit of {self.config.daily_limit} credits exceeded"
+                    )
+
+                logger.debug(f"GET {endpoint} params={params}")
+                try:
+                    response = await self.http.get(endpoint, params=params)
+                except httpx.RequestError as e:
+                    logger.error(f"Request failed: {e}")
+                    raise
+                self.rate_limiter.observe(response, key)
+
+                if response.status_code == 429:
+                    if self.rate_limiter.wait_for_reset:
+                        # The limiter now waits for the server's Retry-After
+                        logger.warning("Rate limited by server (429), waiting to retry")
+                        continue
+                    logger.error("Rate limited by server (429)")
+                    raise RateLimitExceeded("Server returned 429 Too Many Requests")
+                if (
+                    response.status_code in self.RETRY_STATUSES
+                    and attempt < self.MAX_RETRIES
+                ):
+                    backoff = 2**attempt
+                    logger.warning(
+                        f"HTTP {response.status_code} from {endpoint}, "
+                        f"retrying in {backoff}s"
+                    )
+                    await asyncio.sleep(backoff)
+                    attempt += 1
+                    continue
+
+                try:
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    logger.error(f"HTTP error: {e}")
+                    raise
+                return response.json()
+
+    async def get_current_states(
+        self, bounds: Optional[tuple] = None, icao24_filter: Optional[list[str]] = None
+    ) -> list[dict]:
+        """See OpenSkyClient.get_current_states."""
+        params = OpenSkyClient._states_params(bounds, icao24_filter)
+        data = await self._request("/states/all", params)
+        return OpenSkyClient._parse_states(data)
+
+    async def get_state_columns(
+        self, bounds: Optional[tuple] = None, icao24_filter: Optional[list[str]] = None
+    ) -> tuple[int, np.ndarray]:
+        """See OpenSkyClient.get_state_columns."""
+        params = OpenSkyClient._states_params(bounds, icao24_filter)
+        return parse_state_columns(await self._request("/states/all", params))
+
+    async def get_flights_by_aircraft(
+        self, icao24: str, begin: int, end: int
+    ) -> list[dict]:
+        """See OpenSkyClient.get_flights_by_aircraft."""
+        params = {"icao24": icao24.lower(), "begin": begin, "end": end}
+        data = await self._request("/flights/aircraft", params)
+        return data if isinstance(data, list) else []
+
+    async def get_flights_in_range(self, begin: int, end: int) -> list[dict]:
+        """See OpenSkyClient.get_flights_in_range."""
+        params = {"begin": begin, "end": end}
+        data = await self._request("/flights/all", params)
+        return data if isinstance(data, list) else []
+
+    async def get_departures(
+        self, airport_icao: str, begin: int, end: int
+    ) -> list[dict]:
+        """Get departures from an airport within a time range."""
+        params = {"airport": airport_icao, "begin": begin, "end": end}
+        data = await self._request("/flights/departure", params)
+        return data if isinstance(data, list) else []
+
+    async def get_arrivals(self, airport_icao: str, begin: int, end: int) -> list[dict]:
+        """Get arrivals at an airport within a time range."""
+        params = {"airport": airport_icao, "begin": begin, "end": end}
+        data = await self._request("/flights/arrival", params)
+        return data if isinstance(data, list) else []
+
+
 # =============================================================================
 # Small Aircraft Filter
 # =============================================================================
 
 
 class SmallAircraftFilter:
-    """Filters flights to identify small/general aviation aircraft."""
+    """
+    Filters flights to identify small/general aviation aircraft.
+
+    The addresses the aircraft database marks as GA (a small type code, or a
+    flying club/school owner) are worked out once when it is loaded, so
+    classifying a batch of aircraft is a binary search over that sorted array
+    plus a few NumPy string operations on the callsigns.
+    """
+
+    # Owner names suggesting GA
+    GA_OWNER_TERMS = ("FLYING CLUB", "FLIGHT SCHOOL", "AERO CLUB")
 
     def __init__(self, aircraft_db_path: Optional[Path] = None):
         """
@@ -418,69 +1268,462 @@ class SmallAircraftFilter:
 
         The database can be obtained from:
         https://opensky-network.org/datasets/metadata/
+
+        It is converted once into a memory-mapped index next to it
+        (<database>.index, see aircraft_index.py), which can also be passed
+        directly.
         """
-        self.aircraft_db: dict[str, dict] = {}
+        self.aircraft_index: Optional[AircraftIndex] = None
+        # Sorted 24-bit addresses of the aircraft the database marks as GA
+        self.ga_icao24 = np.array([], dtype=np.uint32)
         if aircraft_db_path and aircraft_db_path.exists():
-            self._load_database(aircraft_db_path)
+            try:
+                self.aircraft_index = AircraftIndex.for_database(aircraft_db_path)
+                self.ga_icao24 = self._ga_addresses(self.aircraft_index)
+                logger.info(
+                    f"Loaded {len(self.aircraft_index)} aircraft records "
+                    f"({len(self.ga_icao24)} GA)"
+                )
+            except Exception as e:
+                logger.warning(f"Failed to load aircraft database: {e}")
 
-    def _load_database(self, path: Path):
-        """Load aircraft metadata database."""
-        logger.info(f"Loading aircraft database from {path}")
-        try:
-            with open(path) as f:
-                for line in f:
-                    record = json.loads(line)
-                    icao24 = record.get("icao24", "").lower()
-                    if icao24:
-                        self.aircraft_db[icao24] = record
-            logger.info(f"Loaded {len(self.aircraft_db)} aircraft records")
-        except Exception as e:
-            logger.warning(f"Failed to load aircraft database: {e}")
+    @classmethod
+    def _ga_addresses(cls, index: AircraftIndex) -> np.ndarray:
+        """Addresses with a small type code or a GA owner, evaluated per dictionary entry."""
+        type_codes = [
+            index.code("typecode", type_code)
+            for type_code in OpenSkyClient.SMALL_AIRCRAFT_TYPES
+        ]
+        small_type = np.isin(
+            index.codes["typecode"], [code for code in type_codes if code is not None]
+        )
+
+        owners = np.char.upper(index.dictionaries["owner"])
+        ga_owner = np.zeros(len(owners), dtype=bool)
+        for term in cls.GA_OWNER_TERMS:
+            ga_owner |= np.char.find(owners, term.encode()) >= 0
+
+        rows = small_type | ga_owner[index.codes["owner"]]
+        # index.icao24 is sorted, so the subset is too
+        return np.asarray(index.icao24[rows])
 
     def get_aircraft_info(self, icao24: str) -> dict:
         """Look up aircraft info by ICAO24 address."""
-        return self.aircraft_db.get(icao24.lower(), {})
+        if self.aircraft_index is None:
+            return {}
+        return self.aircraft_index.get(icao24)
 
     def is_small_aircraft(self, icao24: str, callsign: Optional[str] = None) -> bool:
+        """Determine if an aircraft is likely a small/GA aircraft (see classify_batch)."""
+        return bool(self.classify_batch([icao24], [callsign])[0])
+
+    def classify_batch(
+        self, icao24s: Sequence[str], callsigns: Sequence[Optional[str]]
+    ) -> np.ndarray:
         """
-        Determine if an aircraft is likely a small/GA aircraft.
+        Boolean mask of the aircraft that are likely small/GA aircraft.
+
+        An aircraft counts as GA if:
+        - the database gives it a known small aircraft type code or a flying
+          club/school owner
+        - its callsign is a US N-number (N followed by 1-5 alphanumerics)
 
-        Uses heuristics when database info is unavailable:
-        - N-number registration pattern (US GA aircraft)
-        - Known small aircraft type codes
-        - Absence of airline callsign patterns
+        Airline callsigns (3-letter code + flight number) are never N-numbers,
+        so only the database can mark those aircraft as GA.
         """
-        info = self.get_aircraft_info(icao24)
+        keys = icao24s_to_int(icao24s)
+        mask = np.zeros(len(keys), dtype=bool)
+        if len(self.ga_icao24):
+            found = np.searchsorted(self.ga_icao24, keys)
+            found = np.minimum(found, len(self.ga_icao24) - 1)
+            mask = self.ga_icao24[found] == keys
+
+        callsigns = np.asarray(callsigns)
+        if callsigns.dtype.kind != "U":
+            callsigns = np.array(["" if c is None else c for c in callsigns], dtype=str)
+        callsigns = np.char.strip(callsigns)
+        # callsign[1:] is alphanumeric exactly when the whole callsign (starting
+        # with the alphanumeric "N") is
+        lengths = np.char.str_len(callsigns)
+        mask |= (
+            np.char.startswith(callsigns, "N")
+            & (lengths >= 2)
+            & (lengths <= 6)
+            & np.char.isalnum(callsigns)
+        )
+        return mask
 
-        # Check database if available
-        if info:
-            type_code = info.get("typecode", "")
-            if type_code in OpenSkyClient.SMALL_AIRCRAFT_TYPES:
-                return True
+    def build_flights(
+        self,
+        raw_flights: list[dict],
+        small_only: bool = True,
+        icao24: Optional[str] = None,
+    ) -> list[Flight]:
+        """Convert OpenSky flight objects to Flights, optionally keeping small/GA aircraft only."""
+        addresses = [icao24 or f.get("icao24") or "" for f in raw_flights]
+        if small_only:
+            keep = self.classify_batch(addresses, [f.get("callsign") for f in raw_flights])
+        else:
+            keep = np.ones(len(raw_flights), dtype=bool)
 
-            # Check for owner patterns suggesting GA
-            owner = info.get("owner", "").upper()
-            if any(
-                term in owner for term in ["FLYING CLUB", "FLIGHT SCHOOL", "AERO CLUB"]
-            ):
-                return True
+        flights = []
+        for index in np.flatnonzero(keep):
+            aircraft = addresses[index]
+            # Get additional aircraft info if available
+            info = self.get_aircraft_info(aircraft)
+            flights.append(Flight.from_opensky(raw_flights[index], info, aircraft))
+        return flights
 
-        # Heuristic: US N-number registrations are often GA
-        if callsign:
-            callsign = callsign.strip()
-            # N-numbers: N followed by 1-5 alphanumeric
-            if (
-                callsign.startswith("N")
-                and len(callsign) <= 6
-                and callsign[1:].isalnum()
-            ):
-                return True
 
-            # Exclude obvious airline patterns (3-letter code + flight number)
-            if len(callsign) >= 4 and callsign[:3].isalpha() and callsign[3:].isdigit():
-                return False
+# =============================================================================
+# Checkpoints
+# =============================================================================
 
-        return False
+
+class ScrapeCheckpoint:
+    """
+    Progress of a period scrape: the period, and for every completed window the
+    file its flights were written to.
+
+    Each window's flights go to their own file before the checkpoint is
+    atomically rewritten, so a crash or an exhausted quota loses at most the
+    windows in flight, and a rerun with the same checkpoint fetches only the
+    remaining ones.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        start_time: datetime,
+        end_time: datetime,
+        small_only: bool = True,
+        windows: Optional[dict] = None,
+    ):
+        self.path = Path(path)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.small_only = small_only
+        # "begin-end" (Unix timestamps) -> {"output", "flights", "completed_at"}
+        self.windows: dict[str, dict] = windows or {}
+
+    @classmethod
+    def load(cls, path: Path) -> "ScrapeCheckpoint":
+        with open(path) as f:
+            state = json.load(f)
+        return cls(
+            path,
+            datetime.fromisoformat(state["start_time"]),
+            datetime.fromisoformat(state["end_time"]),
+            small_only=state.get("small_only", True),
+            windows=state.get("windows", {}),
+        )
+
+    @property
+    def windows_dir(self) -> Path:
+        """Directory holding one JSON file of flights per completed window."""
+        return self.path.with_name(self.path.name + ".windows")
+
+    @staticmethod
+    def _key(begin: datetime, end: datetime) -> str:
+        return f"{int(begin.timestamp())}-{int(end.timestamp())}"
+
+    def save(self):
+        state = {
+            "start_time": self.start_time.isoformat(),
+            "end_time": self.end_time.isoformat(),
+            "small_only": self.small_only,
+            "windows": self.windows,
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, begin: datetime, end: datetime) -> bool:
+        return self._key(begin, end) in self.windows
+
+    def pending_windows(self) -> list[tuple[datetime, datetime]]:
+        return [
+            (begin, end)
+            for begin, end in period_windows(self.start_time, self.end_time)
+            if not self.is_complete(begin, end)
+        ]
+
+    def complete(self, begin: datetime, end: datetime, flights: list[Flight]):
+        """Write a window's flights and record the window as done."""
+        key = self._key(begin, end)
+        self.windows_dir.mkdir(parents=True, exist_ok=True)
+        output = self.windows_dir / f"{key}.json"
+        with open(output, "w") as f:
+            json.dump([flight.to_dict() for flight in flights], f)
+
+        self.windows[key] = {
+            "output": str(output.relative_to(self.path.parent)),
+            "flights": len(flights),
+            "completed_at": datetime.now().isoformat(),
+        }
+        self.save()
+
+    def load_window(self, begin: datetime, end: datetime) -> list[Flight]:
+        """Flights of a completed window, as written by complete()."""
+        output = self.path.parent / self.windows[self._key(begin, end)]["output"]
+        with open(output) as f:
+            return [Flight(**record) for record in json.load(f)]
+
+
+# =============================================================================
+# Output
+# =============================================================================
+
+
+class RecordWriter:
+    """
+    Streams scraped records to disk as they arrive, so memory stays flat and a
+    crash loses at most the records since the last flush.
+
+    The format follows the file name: ".ndjson" or ".jsonl" writes one JSON
+    object per line, ".json" a compact JSON array (readable wherever
+    data/real_flights.json is), and a trailing ".gz" or ".zst" compresses it.
+
+    Records go to a ".part" file that is renamed into place once complete. In
+    append mode (NDJSON only) they are added to the existing file instead;
+    compressed files get a new gzip member or zstd frame, which readers decode
+    as one stream. With rotate_records, the current file is completed every
+    that many records and the next one started, numbered like
+    flights-00001.ndjson.gz; in append mode numbering continues after the
+    existing files, and every file is new, so each goes through ".part" too.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        append: bool = False,
+        rotate_records: Optional[int] = None,
+    ):
+        self.path = Path(path)
+        self.compression = {".gz": "gzip", ".zst": "zstd"}.get(
+            self.path.suffix.lower()
+        )
+        # e.g. ".ndjson.gz", kept at the end of rotated file names
+        self._suffix = "".join(self.path.suffixes[-2 if self.compression else -1 :])
+        self._stem = self.path.name[: len(self.path.name) - len(self._suffix)]
+        self.json_array = self._suffix.lower() in (".json", ".json.gz", ".json.zst")
+        if append and self.json_array:
+            raise ValueError("Append mode needs an NDJSON output (.ndjson/.jsonl)")
+
+        self.append = append
+        self.rotate_records = rotate_records
+        self.count = 0  # records written, across all files
+        self.completed: list[Path] = []  # files renamed into place
+        # Rotated files from earlier runs this one continues, when appending
+        self.earlier: list[Path] = []
+
+        self._segment = self._first_segment() if rotate_records else 0
+        self._stream = None
+        self._segment_count = 0
+        self._open()
+
+    def _first_segment(self) -> int:
+        """Number of the first rotated file: after any existing ones when appending."""
+        if not self.append:
+            return 1
+        pattern = re.compile(
+            re.escape(self._stem) + r"-(\d+)" + re.escape(self._suffix) + "$"
+        )
+        existing = sorted(
+            (int(match.group(1)), path)
+            for path in self.path.parent.glob(f"{self._stem}-*")
+            if (match := pattern.match(path.name))
+        )
+        self.earlier = [path for _, path in existing]
+        return existing[-1][0] + 1 if existing else 1
+
+    @property
+    def current_path(self) -> Path:
+        """Final name of the file being written."""
+        if not self.rotate_records:
+            return self.path
+        return self.path.with_name(f"{self._stem}-{self._segment:05d}{self._suffix}")
+
+    def _open(self):
+        final = self.current_path
+        final.parent.mkdir(parents=True, exist_ok=True)
+        # Only an existing file is appended to in place: readers already see it
+        if self.append and final.exists():
+            self._part = final
+            raw = open(final, "ab")
+        else:
+            self._part = final.with_name(final.name + ".part")
+            raw = open(self._part, "wb")
+
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(filename="", fileobj=raw, mode="wb")
+        elif self.compression == "zstd":
+            import zstandard
+
+            self._stream = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            self._stream = raw
+        self._raw = raw
+        self._segment_count = 0
+        if self.json_array:
+            self._stream.write(b"[")
+
+    def _finish(self):
+        """Complete the current file and move it into place."""
+        if self.json_array:
+            self._stream.write(b"\n]\n" if self._segment_count else b"]\n")
+        if self._stream is not self._raw:
+            self._stream.close()
+        if not self._raw.closed:
+            self._raw.close()
+        if self._part != self.current_path:
+            os.replace(self._part, self.current_path)
+        self.completed.append(self.current_path)
+        self._stream = None
+
+    def write(self, record: dict):
+        if self.rotate_records and self._segment_count >= self.rotate_records:
+            self._finish()
+            self._segment += 1
+            self._open()
+
+        line = json.dumps(record, separators=(",", ":")).encode()
+        if self.json_array:
+            self._stream.write(b",\n" if self._segment_count else b"\n")
+            self._stream.write(line)
+        else:
+            self._stream.write(line + b"\n")
+        self._segment_count += 1
+        self.count += 1
+
+    def write_many(self, records: Iterable[dict]):
+        """Write records and flush them through to the file."""
+        for record in records:
+            self.write(record)
+        self.flush()
+
+    def flush(self):
+        if self.compression == "zstd":
+            import zstandard
+
+            self._stream.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self._stream.flush()
+        if self._stream is not self._raw:
+            self._raw.flush()
+
+    def close(self):
+        if self._stream is not None:
+            self._finish()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        # Keep whatever was scraped before an error
+        self.close()
+
+
+# =============================================================================
+# State Tracking
+# =============================================================================
+
+
+# Fields compared between snapshots. time_position and last_contact change
+# with every report, so they are only written alongside a real change.
+TRACKED_STATE_FIELDS = (
+    "callsign",
+    "longitude",
+    "latitude",
+    "baro_altitude",
+    "on_ground",
+    "velocity",
+    "true_track",
+    "vertical_rate",
+    "geo_altitude",
+    "squawk",
+    "spi",
+)
+
+
+class StateTracker:
+    """
+    Turns successive state vector snapshots into compact deltas.
+
+    Each update returns one record per aircraft that appeared, changed or
+    disappeared since the previous snapshot, all stamped with the snapshot
+    "time":
+    - appeared: {"time", "icao24", "new": True, ...every non-null field}
+    - changed: {"time", "icao24", "time_position", "last_contact", ...the
+      TRACKED_STATE_FIELDS that changed}
+    - disappeared: {"time", "icao24", "gone": True}
+
+    Replaying the records in order reconstructs the tracked fields of every
+    snapshot. A change to time_position or last_contact alone is not
+    reported, so replayed timestamps are as of the aircraft's latest tracked
+    change, and origin_country and position_source as of its appearance.
+    Snapshots are matched on the 24-bit address with a binary search, and
+    compared column by column, so an unchanged aircraft costs no Python work.
+    """
+
+    def __init__(self):
+        # The previous snapshot, sorted by address
+        self.keys = np.array([], dtype=np.uint32)
+        self.states: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _lookup(sorted_keys: np.ndarray, keys: np.ndarray):
+        """Positions of keys in sorted_keys, and which of them are there."""
+        if not len(sorted_keys):
+            return np.zeros(len(keys), dtype=np.intp), np.zeros(len(keys), dtype=bool)
+        positions = np.searchsorted(sorted_keys, keys)
+        positions = np.minimum(positions, len(sorted_keys) - 1)
+        return positions, sorted_keys[positions] == keys
+
+    def update(self, snapshot_time: int, states: np.ndarray) -> list[dict]:
+        """Deltas from the previous snapshot to states (all of them, the first time)."""
+        keys = icao24s_to_int(states["icao24"])
+        order = np.argsort(keys, kind="stable")
+        keys, states = keys[order], states[order]
+
+        previous, matched = self._lookup(self.keys, keys)
+        changed = np.zeros((len(keys), len(TRACKED_STATE_FIELDS)), dtype=bool)
+        if matched.any():
+            for column, field in enumerate(TRACKED_STATE_FIELDS):
+                now, before = states[field], self.states[field][previous]
+                differs = now != before
+                if now.dtype.kind == "f":
+                    differs &= ~(np.isnan(now) & np.isnan(before))
+                changed[:, column] = differs & matched
+
+        records = []
+        for row in np.flatnonzero(~matched | changed.any(axis=1)):
+            state = states[row]
+            record = {"time": snapshot_time, "icao24": state["icao24"].item()}
+            if not matched[row]:
+                record["new"] = True
+                for key in STATE_COLUMNS:
+                    value = _state_value(key, state[key])
+                    if key != "icao24" and value is not None:
+                        record[key] = value
+            else:
+                for key in ("time_position", "last_contact"):
+                    record[key] = _state_value(key, state[key])
+                for column in np.flatnonzero(changed[row]):
+                    field = TRACKED_STATE_FIELDS[column]
+                    record[field] = _state_value(field, state[field])
+            records.append(record)
+
+        if self.states is not None:
+            _, still_here = self._lookup(keys, self.keys)
+            for icao24 in self.states["icao24"][~still_here]:
+                records.append(
+                    {"time": snapshot_time, "icao24": icao24.item(), "gone": True}
+                )
+
+        self.keys, self.states = keys, states
+        return records
 
 
 # =============================================================================
@@ -510,24 +1753,68 @@ class FlightScraper:
         """
         logger.info("Fetching current US airspace state vectors...")
 
-        states = self.client.get_current_states(bounds=self.client.config.us_bounds)
+        _, states = self.client.get_state_columns(bounds=self.client.config.us_bounds)
 
         logger.info(f"Retrieved {len(states)} aircraft in US airspace")
 
-        # Filter for small aircraft
-        ga_aircraft = []
-        for state in states:
-            icao24 = state.get("icao24", "")
-            callsign = state.get("callsign")
-
-            if self.filter.is_small_aircraft(icao24, callsign):
-                ga_aircraft.append(state)
+        # Filter for small aircraft; only those become dictionaries
+        mask = self.filter.classify_batch(states["icao24"], states["callsign"])
+        ga_aircraft = state_records(states[mask])
 
         logger.info(f"Identified {len(ga_aircraft)} small/GA aircraft")
         return ga_aircraft
 
+    def poll_us_ga_states(
+        self, interval: float, polls: Optional[int] = None, small_only: bool = True
+    ) -> Iterator[list[dict]]:
+        """
+        Poll the US airspace every interval seconds and yield the changes to
+        the small/GA aircraft in it (see StateTracker), starting with every
+        aircraft of the first snapshot.
+
+        Args:
+            interval: Seconds between polls (OpenSky updates states every 5-10s,
+                and each US-wide poll costs several API credits)
+            polls: Number of polls (failed ones included), or None to poll
+                until interrupted
+            small_only: Filter for small/GA aircraft only
+        """
+        tracker = StateTracker()
+        count = 0
+        while polls is None or count < polls:
+            started = time.monotonic()
+            try:
+                snapshot_time, states = self.client.get_state_columns(
+                    bounds=self.client.config.us_bounds
+                )
+            except requests.exceptions.RequestException as e:
+                # A failed poll (HTTP error, timeout, dropped connection) only
+                # loses this snapshot: the next one's deltas cover the gap
+                logger.error(f"Skipping snapshot after failed poll: {e}")
+            else:
+                if small_only:
+                    states = states[
+                        self.filter.classify_batch(
+                            states["icao24"], states["callsign"]
+                        )
+                    ]
+                deltas = tracker.update(snapshot_time, states)
+                logger.info(
+                    f"Snapshot {snapshot_time}: {len(states)} aircraft, "
+                    f"{len(deltas)} changed"
+                )
+                yield deltas
+
+            count += 1
+            if polls is None or count < polls:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
     def scrape_flights_for_period(
-        self, start_time: datetime, end_time: datetime, small_only: bool = True
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        small_only: bool = True,
+        checkpoint: Optional[ScrapeCheckpoint] = None,
     ) -> list[Flight]:
         """
         Scrape flights within a time period.
@@ -539,16 +1826,33 @@ class FlightScraper:
             start_time: Start of period
             end_time: End of period
             small_only: Filter for small/GA aircraft only
+            checkpoint: Records each completed window; windows it already
+                holds are read back instead of fetched
 
         Returns:
             List of Flight objects
         """
-        flights = []
-        current = start_time
-        window = timedelta(hours=2)
+        windows = self.iter_flights_for_period(
+            start_time, end_time, small_only, checkpoint
+        )
+        return [flight for window_flights in windows for flight in window_flights]
 
-        while current < end_time:
-            window_end = min(current + window, end_time)
+    def iter_flights_for_period(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        small_only: bool = True,
+        checkpoint: Optional[ScrapeCheckpoint] = None,
+    ) -> Iterator[list[Flight]]:
+        """Like scrape_flights_for_period, but yields each window's flights as it arrives."""
+        total = 0
+
+        for current, window_end in period_windows(start_time, end_time):
+            if checkpoint and checkpoint.is_complete(current, window_end):
+                window_flights = checkpoint.load_window(current, window_end)
+                total += len(window_flights)
+                yield window_flights
+                continue
 
             begin_ts = int(current.timestamp())
             end_ts = int(window_end.timestamp())
@@ -560,42 +1864,21 @@ class FlightScraper:
 
             try:
                 raw_flights = self.client.get_flights_in_range(begin_ts, end_ts)
-
-                for f in raw_flights:
-                    icao24 = f.get("icao24", "")
-                    callsign = f.get("callsign")
-
-                    if small_only and not self.filter.is_small_aircraft(
-                        icao24, callsign
-                    ):
-                        continue
-
-                    # Get additional aircraft info if available
-                    info = self.filter.get_aircraft_info(icao24)
-
-                    flight = Flight(
-                        tail_number=callsign.strip() if callsign else None,
-                        aircraft_model=info.get("model") or info.get("typecode"),
-                        manufacturer=info.get("manufacturername"),
-                        origin_airport_icao=f.get("estDepartureAirport"),
-                        destination_airport_icao=f.get("estArrivalAirport"),
-                        departure_time=self._format_timestamp(f.get("firstSeen")),
-                        arrival_time=self._format_timestamp(f.get("lastSeen")),
-                        icao24=icao24,
-                        callsign=callsign,
-                    )
-                    flights.append(flight)
+                window_flights = self.filter.build_flights(raw_flights, small_only)
+                if checkpoint:
+                    checkpoint.complete(current, window_end, window_flights)
 
             except RateLimitExceeded:
                 logger.warning("Rate limit reached, stopping scrape")
                 break
             except Exception as e:
                 logger.error(f"Error fetching flights: {e}")
+                continue
 
-            current = window_end
+            total += len(window_flights)
+            yield window_flights
 
-        logger.info(f"Scraped {len(flights)} flights total")
-        return flights
+        logger.info(f"Scraped {total} flights total")
 
     def scrape_aircraft_history(self, icao24: str, days_back: int = 7) -> list[Flight]:
         """
@@ -608,7 +1891,8 @@ class FlightScraper:
         Returns:
             List of Flight objects
         """
-        end_time = datetime.now()
+        # Snapped to the window grid, so reruns within 2 hours hit the cache
+        end_time = snap_to_window(datetime.now(), up=True)
         start_time = end_time - timedelta(days=min(days_back, 30))
 
         begin_ts = int(start_time.timestamp())
@@ -617,33 +1901,186 @@ class FlightScraper:
         logger.info(f"Fetching {days_back}-day history for {icao24}")
 
         raw_flights = self.client.get_flights_by_aircraft(icao24, begin_ts, end_ts)
-        info = self.filter.get_aircraft_info(icao24)
+        flights = self.filter.build_flights(raw_flights, small_only=False, icao24=icao24)
+
+        logger.info(f"Found {len(flights)} flights for {icao24}")
+        return flights
+
 
+class AsyncFlightScraper:
+    """
+    FlightScraper counterpart that fetches windows and aircraft concurrently
+    through AsyncOpenSkyClient, as fast as the shared rate limiter allows.
+    """
+
+    def __init__(
+        self,
+        config: Optional[OpenSkyConfig] = None,
+        aircraft_db_path: Optional[Path] = None,
+    ):
+        self.client = AsyncOpenSkyClient(config)
+        self.filter = SmallAircraftFilter(aircraft_db_path)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def scrape_flights_for_period(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        small_only: bool = True,
+        checkpoint: Optional[ScrapeCheckpoint] = None,
+    ) -> list[Flight]:
+        """See FlightScraper.scrape_flights_for_period. Results keep window order."""
         flights = []
-        for f in raw_flights:
-            callsign = f.get("callsign")
-            flight = Flight(
-                tail_number=callsign.strip() if callsign else None,
-                aircraft_model=info.get("model") or info.get("typecode"),
-                manufacturer=info.get("manufacturername"),
-                origin_airport_icao=f.get("estDepartureAirport"),
-                destination_airport_icao=f.get("estArrivalAirport"),
-                departure_time=self._format_timestamp(f.get("firstSeen")),
-                arrival_time=self._format_timestamp(f.get("lastSeen")),
-                icao24=icao24,
-                callsign=callsign,
+        async for window_flights in self.iter_flights_for_period(
+            start_time, end_time, small_only, checkpoint
+        ):
+            flights.extend(window_flights)
+        return flights
+
+    async def iter_flights_for_period(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        small_only: bool = True,
+        checkpoint: Optional[ScrapeCheckpoint] = None,
+    ) -> AsyncIterator[list[Flight]]:
+        """Yields each window's flights in window order, fetching ahead concurrently."""
+        windows = list(period_windows(start_time, end_time))
+        pending = [
+            window
+            for window in windows
+            if not (checkpoint and checkpoint.is_complete(*window))
+        ]
+        logger.info(
+            f"Fetching {len(pending)} of {len(windows)} windows from "
+            f"{start_time.isoformat()} to {end_time.isoformat()}"
+        )
+        tasks = {
+            window: asyncio.create_task(
+                self.client.get_flights_in_range(
+                    int(window[0].timestamp()), int(window[1].timestamp())
+                )
             )
-            flights.append(flight)
+            for window in pending
+        }
+
+        total = 0
+        stopped = False
+        try:
+            for begin, end in windows:
+                if (begin, end) not in tasks:
+                    window_flights = checkpoint.load_window(begin, end)
+                    total += len(window_flights)
+                    yield window_flights
+                    continue
+                task = tasks[(begin, end)]
+                # After a rate limit, keep the later windows that already arrived
+                if stopped and not task.done():
+                    continue
+                try:
+                    raw_flights = await task
+                except RateLimitExceeded:
+                    if not stopped:
+                        logger.warning("Rate limit reached, stopping scrape")
+                        stopped = True
+                        for other in tasks.values():
+                            if not other.done():
+                                other.cancel()
+                    continue
+                except Exception as e:
+                    logger.error(
+                        f"Error fetching flights from {begin.isoformat()} "
+                        f"to {end.isoformat()}: {e}"
+                    )
+                    continue
+                window_flights = self.filter.build_flights(raw_flights, small_only)
+                if checkpoint:
+                    checkpoint.complete(begin, end, window_flights)
+                total += len(window_flights)
+                yield window_flights
+        finally:
+            await _cancel_all(list(tasks.values()))
+
+        logger.info(f"Scraped {total} flights total")
+
+    async def scrape_aircraft_history(
+        self, icao24s: list[str], days_back: int = 7
+    ) -> list[Flight]:
+        """See FlightScraper.scrape_aircraft_history; fetches several aircraft at once."""
+        # Snapped to the window grid, so reruns within 2 hours hit the cache
+        end_time = snap_to_window(datetime.now(), up=True)
+        start_time = end_time - timedelta(days=min(days_back, 30))
+
+        begin_ts = int(start_time.timestamp())
+        end_ts = int(end_time.timestamp())
+
+        logger.info(f"Fetching {days_back}-day history for {len(icao24s)} aircraft")
+
+        tasks = [
+            asyncio.create_task(
+                self.client.get_flights_by_aircraft(icao24, begin_ts, end_ts)
+            )
+            for icao24 in icao24s
+        ]
+
+        flights = []
+        try:
+            for icao24, task in zip(icao24s, tasks):
+                raw_flights = await task
+                found = self.filter.build_flights(
+                    raw_flights, small_only=False, icao24=icao24
+                )
+                logger.info(f"Found {len(found)} flights for {icao24}")
+                flights.extend(found)
+        finally:
+            await _cancel_all(tasks)
 
-        logger.info(f"Found {len(flights)} flights for {icao24}")
         return flights
 
-    @staticmethod
-    def _format_timestamp(ts: Optional[int]) -> Optional[str]:
-        """Convert Unix timestamp to ISO format string."""
-        if ts is None:
-            return None
-        return datetime.fromtimestamp(ts).isoformat()
+
+# OpenSky limits /flights/all to 2-hour windows
+FLIGHTS_WINDOW = int(timedelta(hours=2).total_seconds())
+
+
+def snap_to_window(moment: datetime, up: bool = False) -> datetime:
+    """
+    The period_windows boundary at or before moment (or at or after, with up).
+    Periods snapped to it repeat exactly across reruns, so their requests are
+    answered from the response cache.
+    """
+    timestamp = int(moment.timestamp())
+    boundary = timestamp // FLIGHTS_WINDOW * FLIGHTS_WINDOW
+    if up and boundary < timestamp:
+        boundary += FLIGHTS_WINDOW
+    return datetime.fromtimestamp(boundary, tz=moment.tzinfo)
+
+
+def period_windows(start_time: datetime, end_time: datetime):
+    """
+    Split a period into the windows /flights/all accepts.
+
+    Window boundaries fall on multiples of 2 hours since the epoch, so reruns
+    over overlapping periods ask for the same windows and are answered from the
+    response cache; only the first and last windows of a period that is not
+    snapped to the grid (see snap_to_window) are partial.
+    """
+    current = start_time
+    while current < end_time:
+        boundary = (int(current.timestamp()) // FLIGHTS_WINDOW + 1) * FLIGHTS_WINDOW
+        window_end = min(
+            datetime.fromtimestamp(boundary, tz=current.tzinfo), end_time
+        )
+        yield current, window_end
+        current = window_end
+
+
+async def _cancel_all(tasks: list[asyncio.Task]):
+    """Cancel tasks that are still pending (e.g. after a rate limit) and wait for them."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 # =============================================================================
@@ -671,7 +2108,7 @@ def main():
     )
     parser.add_argument(
         "--mode",
-        choices=["current", "history", "aircraft"],
+        choices=["current", "history", "aircraft", "poll"],
         default="current",
         help="Scraping mode",
     )
@@ -682,10 +2119,88 @@ def main():
         help="Hours of history to fetch (for 'history' mode)",
     )
     parser.add_argument(
-        "--icao24", help="Aircraft ICAO24 address (for 'aircraft' mode)"
+        "--icao24",
+        help="Aircraft ICAO24 address, or several separated by commas "
+        "(for 'aircraft' mode)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=60,
+        help="Seconds between snapshots (for 'poll' mode)",
+    )
+    parser.add_argument(
+        "--polls",
+        type=int,
+        help="Number of snapshots to take (for 'poll' mode; default: until "
+        "interrupted)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Requests to keep in flight (history/aircraft modes); "
+        "above 1 the asyncio client is used",
+    )
+    parser.add_argument(
+        "--output",
+        default="flights.json",
+        help="Output file: .json, .ndjson or .jsonl, optionally .gz or .zst",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Add to an existing NDJSON output instead of replacing it",
+    )
+    parser.add_argument(
+        "--rotate",
+        type=int,
+        metavar="RECORDS",
+        help="Start a new numbered output file every RECORDS records",
+    )
+    parser.add_argument(
+        "--archive",
+        help="Also write the flights to this columnar archive directory "
+        "(history/aircraft modes; see flight_archive.py)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="Progress file for 'history' mode (default: <output>.checkpoint.json)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the 'history' scrape recorded in the checkpoint",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Start a new 'history' scrape even if the checkpoint holds an "
+        "unfinished one",
+    )
+    parser.add_argument(
+        "--aircraft-db",
+        help="Path to OpenSky aircraft database file (CSV or JSON lines), "
+        "or an index built from one by aircraft_index.py",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Response cache file (default: $OPENSKY_CACHE_PATH or "
+        "~/.cache/opensky/cache.sqlite)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always query the API"
+    )
+    parser.add_argument(
+        "--pace",
+        action="store_true",
+        help="Spread the remaining daily quota evenly over the rest of the day",
+    )
+    parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Stop when the quota is used up instead of waiting for it to reset",
     )
-    parser.add_argument("--output", default="flights.json", help="Output JSON file")
-    parser.add_argument("--aircraft-db", help="Path to OpenSky aircraft database file")
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="Enable debug logging"
     )
@@ -695,27 +2210,111 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
-    # Initialize scraper
+    if args.mode == "aircraft" and not args.icao24:
+        parser.error("--icao24 required for 'aircraft' mode")
+    icao24s = [a.strip() for a in (args.icao24 or "").split(",") if a.strip()]
+    if (args.resume or args.restart) and args.mode != "history":
+        parser.error("--resume and --restart only apply to 'history' mode")
+    if args.resume and args.restart:
+        parser.error("--resume and --restart are mutually exclusive")
+    if args.resume and args.append:
+        # A resumed scrape writes every window again, read back from the checkpoint
+        parser.error("--resume rewrites the whole output; it cannot --append")
+    if args.archive and args.mode in ("current", "poll"):
+        parser.error("--archive applies to 'history' and 'aircraft' modes")
+
+    # Configure the scraper
     config = OpenSkyConfig.from_env()
+    config.max_concurrency = max(1, args.concurrency)
+    config.pace_to_reset = args.pace
+    config.wait_for_reset = not args.no_wait
+    if args.no_cache:
+        config.cache_path = None
+    elif args.cache:
+        config.cache_path = args.cache
+
+    checkpoint = None
+    if args.mode == "history":
+        checkpoint_path = Path(args.checkpoint or f"{args.output}.checkpoint.json")
+        if args.resume:
+            if not checkpoint_path.exists():
+                parser.error(f"--resume: no checkpoint at {checkpoint_path}")
+            checkpoint = ScrapeCheckpoint.load(checkpoint_path)
+            logger.info(
+                f"Resuming scrape of {checkpoint.start_time.isoformat()} to "
+                f"{checkpoint.end_time.isoformat()} "
+                f"({len(checkpoint.windows)} windows already done)"
+            )
+        else:
+            if checkpoint_path.exists() and not args.restart:
+                try:
+                    previous = ScrapeCheckpoint.load(checkpoint_path)
+                except (ValueError, KeyError) as e:
+                    parser.error(
+                        f"Unreadable checkpoint at {checkpoint_path} ({e}); "
+                        "pass --restart to replace it"
+                    )
+                pending = len(previous.pending_windows())
+                if pending:
+                    parser.error(
+                        f"{checkpoint_path} holds an unfinished scrape "
+                        f"({pending} windows left); pass --resume to continue it "
+                        "or --restart to discard it"
+                    )
+            # Whole windows only, so overlapping runs share cached windows
+            end_time = snap_to_window(datetime.now(), up=True)
+            start_time = snap_to_window(end_time - timedelta(hours=args.hours))
+            checkpoint = ScrapeCheckpoint(checkpoint_path, start_time, end_time)
+            checkpoint.save()
+
+    # Only now open the cache and the ledger, so a rejected run leaves no files
     aircraft_db = Path(args.aircraft_db) if args.aircraft_db else None
-    scraper = FlightScraper(config, aircraft_db)
+    concurrent = args.mode in ("history", "aircraft") and (
+        args.concurrency > 1 or len(icao24s) > 1
+    )
+    if concurrent:
+        scraper = AsyncFlightScraper(config, aircraft_db)
+    else:
+        scraper = FlightScraper(config, aircraft_db)
 
-    # Run selected mode
+    # Run selected mode, streaming records to the output as they arrive
     try:
-        if args.mode == "current":
-            results = scraper.scrape_current_us_ga_flights()
-
-        elif args.mode == "history":
-            end_time = datetime.now()
-            start_time = end_time - timedelta(hours=args.hours)
-            flights = scraper.scrape_flights_for_period(start_time, end_time)
-            results = [f.to_dict() for f in flights]
+        writer = RecordWriter(
+            Path(args.output), append=args.append, rotate_records=args.rotate
+        )
+    except (OSError, ValueError) as e:
+        print(f"\nError: Could not write to {args.output}: {e}")
+        return 1
 
-        elif args.mode == "aircraft":
-            if not args.icao24:
-                parser.error("--icao24 required for 'aircraft' mode")
-            flights = scraper.scrape_aircraft_history(args.icao24)
-            results = [f.to_dict() for f in flights]
+    try:
+        with writer:
+            if concurrent:
+                asyncio.run(
+                    _scrape_concurrently(scraper, args, icao24s, checkpoint, writer)
+                )
+
+            elif args.mode == "current":
+                writer.write_many(scraper.scrape_current_us_ga_flights())
+
+            elif args.mode == "poll":
+                try:
+                    for deltas in scraper.poll_us_ga_states(args.interval, args.polls):
+                        writer.write_many(deltas)
+                except KeyboardInterrupt:
+                    logger.info("Polling stopped")
+
+            elif args.mode == "history":
+                for flights in scraper.iter_flights_for_period(
+                    checkpoint.start_time,
+                    checkpoint.end_time,
+                    small_only=checkpoint.small_only,
+                    checkpoint=checkpoint,
+                ):
+                    writer.write_many(f.to_dict() for f in flights)
+
+            elif args.mode == "aircraft":
+                flights = scraper.scrape_aircraft_history(icao24s[0])
+                writer.write_many(f.to_dict() for f in flights)
 
     except RateLimitExceeded as e:
         logger.error(f"Rate limit exceeded: {e}")
@@ -724,7 +2323,7 @@ def main():
             "Please wait before making more requests or upgrade your API credentials."
         )
         return 1
-    except requests.exceptions.HTTPError as e:
+    except (requests.exceptions.HTTPError, httpx.HTTPStatusError) as e:
         logger.error(f"HTTP error from API: {e}")
         if hasattr(e, "response") and e.response is not None:
             print(f"\nAPI Error: HTTP {e.response.status_code}")
@@ -732,32 +2331,81 @@ def main():
         else:
             print(f"\nAPI Error: {e}")
         return 1
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, httpx.RequestError) as e:
         logger.error(f"Network/API error: {e}")
         print(f"\nNetwork Error: Unable to connect to OpenSky API")
         print(f"Details: {e}")
         print("The service may be temporarily unavailable. Please try again later.")
         return 1
+    except OSError as e:
+        logger.error(f"Failed to write output file: {e}")
+        print(f"\nError: Could not write to {args.output}: {e}")
+        return 1
     except Exception as e:
         logger.error(f"Unexpected error during scraping: {e}", exc_info=True)
         print(f"\nUnexpected error: {e}")
         return 1
 
-    # Save results
+    outputs = ", ".join(str(path) for path in writer.completed)
+    logger.info(f"Saved {writer.count} records to {outputs}")
+    print(f"\nResults saved to {outputs}")
+    print(f"Records collected: {writer.count}")
+    if args.archive:
+        # Read back the whole output, including rotated files an --append run
+        # continued: the archive is sorted as a whole
+        records = (
+            record
+            for path in writer.earlier + writer.completed
+            for record in read_records(path)
+        )
+        try:
+            FlightArchive.write(Path(args.archive), records)
+        except OSError as e:
+            logger.error(f"Failed to write archive: {e}")
+            print(f"\nError: Could not write to {args.archive}: {e}")
+            return 1
+        print(f"Archive written to {args.archive}")
+    print(f"Remaining API quota: {scraper.client.rate_limiter.remaining} credits")
+    cache = scraper.client.cache
+    if cache:
+        print(
+            f"Cache hits: {cache.hits} of {cache.hits + cache.misses} requests "
+            f"({cache.path})"
+        )
+    if checkpoint:
+        pending = checkpoint.pending_windows()
+        if pending:
+            print(
+                f"Incomplete: {len(pending)} windows still to fetch "
+                f"(from {pending[0][0].isoformat()}). Rerun with --resume "
+                f"to continue from {checkpoint.path}"
+            )
+            return 1
+    return 0
+
+
+async def _scrape_concurrently(
+    scraper: AsyncFlightScraper,
+    args,
+    icao24s: list[str],
+    checkpoint: Optional[ScrapeCheckpoint],
+    writer: RecordWriter,
+):
+    """Run the history or aircraft mode with the asyncio scraper."""
     try:
-        output_path = Path(args.output)
-        with open(output_path, "w") as f:
-            json.dump(results, f, indent=2)
-
-        logger.info(f"Saved {len(results)} records to {output_path}")
-        print(f"\nResults saved to {output_path}")
-        print(f"Records collected: {len(results)}")
-        print(f"Remaining API quota: {scraper.client.rate_limiter.remaining}")
-        return 0
-    except IOError as e:
-        logger.error(f"Failed to write output file: {e}")
-        print(f"\nError: Could not write to {args.output}: {e}")
-        return 1
+        if args.mode == "history":
+            async for flights in scraper.iter_flights_for_period(
+                checkpoint.start_time,
+                checkpoint.end_time,
+                small_only=checkpoint.small_only,
+                checkpoint=checkpoint,
+            ):
+                writer.write_many(f.to_dict() for f in flights)
+        else:
+            flights = await scraper.scrape_aircraft_history(icao24s)
+            writer.write_many(f.to_dict() for f in flights)
+    finally:
+        await scraper.aclose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+
+# Add the parent directory to sys.path to import the scraper modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aircraft_index import AircraftIndex
+
+CSV_DATABASE = (
+    "'icao24','registration','typecode','model','manufacturername','owner'\n"
+    "'a1b2c3','N54321','C172','172S','Cessna','Sunset Flying Club'\n"
+    "'A00001','N1','B738','737-800','Boeing','Delta Air Lines'\n"
+    "'zzzzzz','BAD','C152','152','Cessna',''\n"
+    "'a1b2c3','N54321','C182','182T','Cessna',''\n"
+)
+
+
+def test_builds_and_looks_up_a_quoted_csv_database(tmp_path):
+    source = tmp_path / "aircraftDatabase.csv"
+    source.write_text(CSV_DATABASE)
+
+    index = AircraftIndex.for_database(source)
+    assert len(index) == 2  # the invalid address is skipped, the duplicate merged
+    # Later records win, and empty fields are left out
+    assert index.get("A1B2C3") == {
+        "typecode": "C182",
+        "model": "182T",
+        "manufacturername": "Cessna",
+    }
+    assert index.get("a00001")["owner"] == "Delta Air Lines"
+    assert index.get("ffffff") == {}
+    assert index.code("typecode", "B738") is not None
+    assert index.code("typecode", "A320") is None
+
+    # Reopening uses the built index instead of rebuilding it
+    meta = tmp_path / "aircraftDatabase.csv.index" / "meta.json"
+    built = meta.stat().st_mtime_ns
+    AircraftIndex.for_database(source)
+    assert meta.stat().st_mtime_ns == built
+
+
+def test_builds_from_json_lines_and_empty_databases(tmp_path):
+    source = tmp_path / "aircraft.json"
+    source.write_text(
+        json.dumps({"icao24": "abc123", "typecode": "SR22", "owner": "Jane Doe"})
+        + "\n\n"
+    )
+    assert AircraftIndex.build(source, tmp_path / "aircraft.index") == 1
+    assert AircraftIndex.open(tmp_path / "aircraft.index").get("abc123") == {
+        "typecode": "SR22",
+        "owner": "Jane Doe",
+    }
+
+    empty = tmp_path / "empty.json"
+    empty.write_text("")
+    assert AircraftIndex.build(empty, tmp_path / "empty.index") == 0
+    assert AircraftIndex.open(tmp_path / "empty.index").get("abc123") == {}
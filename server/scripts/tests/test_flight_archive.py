@@ -0,0 +1,78 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Add the parent directory to sys.path to import the scraper modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_archive import FlightArchive, icao24s_to_int, to_epoch
+from scrape import Flight
+
+
+def scraped(tail, icao24, first_seen, origin="KSMO", destination="KSBA"):
+    raw = {
+        "icao24": icao24,
+        "callsign": tail,
+        "firstSeen": first_seen,
+        "lastSeen": first_seen + 3600,
+        "estDepartureAirport": origin,
+        "estArrivalAirport": destination,
+    }
+    info = {"model": "172S", "manufacturername": "Cessna"}
+    return Flight.from_opensky(raw, info).to_dict()
+
+
+def test_archive_round_trips_scraper_records(tmp_path):
+    records = [
+        scraped("N54321", "a1b2c3", 1_700_007_200),
+        scraped("N12345", "a00001", 1_700_000_000, destination=None),
+        scraped("N54321", "a1b2c3", 1_700_000_000),
+    ]
+    assert FlightArchive.write(tmp_path / "flights", records) == 3
+
+    archive = FlightArchive.open(tmp_path / "flights")
+    assert len(archive) == 3
+    # Sorted by tail, then departure; the callsign is not archived
+    expected = [records[1], records[2], records[0]]
+    for record in expected:
+        del record["callsign"]
+    assert list(archive.records()) == expected
+    # Epochs are the scraped firstSeen, whatever the local time zone
+    assert archive.columns["departure"][0] == 1_700_000_000
+    assert to_epoch(records[0]["departure_time"]) == 1_700_007_200
+
+
+def test_tail_lookup_is_limited_to_the_departure_window(tmp_path):
+    records = [
+        scraped("N54321", "a1b2c3", 1_700_000_000 + 3600 * hour) for hour in range(5)
+    ]
+    FlightArchive.write(tmp_path / "flights", records)
+    archive = FlightArchive.open(tmp_path / "flights", mmap=False)
+
+    assert len(archive.flights_for_tail("N54321")) == 5
+    window = archive.flights_for_tail(
+        "N54321",
+        start=datetime.fromtimestamp(1_700_003_600, tz=timezone.utc),
+        end=datetime.fromtimestamp(1_700_010_800, tz=timezone.utc),
+    )
+    assert [record["departure_time"] for record in window] == [
+        records[1]["departure_time"],
+        records[2]["departure_time"],
+    ]
+    assert archive.flights_for_tail("N00000") == []
+
+
+def test_icao24s_to_int_matches_int_parsing():
+    values = ["a1b2c3", "A1B2C3", " 00ff00", None, "", "xyz", "1234567"]
+    assert icao24s_to_int(values).tolist() == [
+        0xA1B2C3,
+        0xA1B2C3,
+        0x00FF00,
+        0xFFFFFFFF,
+        0xFFFFFFFF,
+        0xFFFFFFFF,
+        0xFFFFFFFF,
+    ]
+    assert icao24s_to_int([]).dtype == np.uint32
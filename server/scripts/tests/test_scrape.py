@@ -0,0 +1,546 @@
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Optional
+
+import httpx
+import numpy as np
+import pytest
+import requests
+
+# Add the parent directory to sys.path to import the scraper modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrape
+from flight_archive import read_records
+from scrape import (
+    AsyncFlightScraper,
+    AsyncRateLimiter,
+    FlightScraper,
+    OpenSkyClient,
+    OpenSkyConfig,
+    QuotaLedger,
+    RecordWriter,
+    ResponseCache,
+    ScrapeCheckpoint,
+    SmallAircraftFilter,
+    StateTracker,
+    credit_class,
+    parse_state_columns,
+    period_windows,
+)
+
+
+def make_config(**overrides) -> OpenSkyConfig:
+    """Anonymous config with no cache file and an in-memory ledger."""
+    settings = {"cache_path": None, "quota_path": None, "min_request_interval": 0.0}
+    settings.update(overrides)
+    return OpenSkyConfig(**settings)
+
+
+def mock_async_scraper(handler, **config) -> AsyncFlightScraper:
+    """An AsyncFlightScraper whose requests are answered by handler(request)."""
+    scraper = AsyncFlightScraper(make_config(**config))
+    scraper.client.http = httpx.AsyncClient(
+        base_url=scraper.client.config.base_url,
+        transport=httpx.MockTransport(handler),
+    )
+    return scraper
+
+
+def opensky_flight(icao24, callsign, first_seen):
+    return {
+        "icao24": icao24,
+        "callsign": callsign,
+        "firstSeen": first_seen,
+        "lastSeen": first_seen + 1800,
+        "estDepartureAirport": "KSMO",
+        "estArrivalAirport": "KSBA",
+    }
+
+
+def test_burst_starts_together_then_spaces_requests(monkeypatch):
+    monkeypatch.setattr(scrape.time, "time", lambda: 1000.0)
+    ledger = QuotaLedger()
+    waits = [ledger.reserve(100, min_interval=10.0, burst=3) for _ in range(5)]
+    assert waits == [0.0, 0.0, 0.0, 10.0, 20.0]
+    assert ledger.remaining(100) == 95
+
+
+def test_async_scraper_keeps_window_order_with_requests_in_flight():
+    start = datetime.fromtimestamp(7200 * 500_000)
+    end = datetime.fromtimestamp(7200 * 500_003)
+    windows = list(period_windows(start, end))
+    seen = []
+
+    async def handler(request):
+        begin = int(request.url.params["begin"])
+        seen.append(begin)
+        # Later windows answer first
+        await asyncio.sleep(0.01 * (len(windows) - len(seen)))
+        return httpx.Response(200, json=[opensky_flight("a1b2c3", "N123AB", begin)])
+
+    async def scenario():
+        scraper = mock_async_scraper(handler, max_concurrency=3)
+        try:
+            return await scraper.scrape_flights_for_period(start, end)
+        finally:
+            await scraper.aclose()
+
+    flights = asyncio.run(scenario())
+    assert len(seen) == len(windows) == 3
+    assert [flight.tail_number for flight in flights] == ["N123AB"] * 3
+    assert [flight.departure_time for flight in flights] == [
+        scrape.from_epoch(int(begin.timestamp())) for begin, _ in windows
+    ]
+
+
+def test_cache_key_ignores_parameter_order_and_case():
+    key = ResponseCache.key
+    assert key("/flights/aircraft", {"icao24": "A1B2C3", "begin": 1, "end": 2}) == key(
+        "/flights/aircraft", {"end": 2, "begin": 1, "icao24": " a1b2c3"}
+    )
+    assert key("/states/all", {"icao24": "B,a"}) == key(
+        "/states/all", {"icao24": "a,b"}
+    )
+    assert key("/flights/all", {"begin": 1, "end": 2, "extra": None}) == key(
+        "/flights/all", {"begin": 1, "end": 2}
+    )
+    assert key("/flights/all", {"begin": 1, "end": 2}) != key(
+        "/flights/all", {"begin": 1, "end": 3}
+    )
+
+
+def test_cache_ttl_keeps_settled_windows_forever(tmp_path, monkeypatch):
+    now = 10_000_000.0
+    monkeypatch.setattr(scrape.time, "time", lambda: now)
+    cache = ResponseCache(
+        str(tmp_path / "cache.sqlite"), recent_ttl=60, settle_time=3600
+    )
+    old = {"begin": 0, "end": int(now) - 7200}
+    recent = {"begin": int(now) - 600, "end": int(now)}
+    assert cache.ttl("/states/all") == cache.states_ttl
+    assert cache.ttl("/flights/all", old) is None
+    assert cache.ttl("/flights/all", recent) == 60
+
+    cache.put("/flights/all", old, [{"icao24": "a"}])
+    cache.put("/flights/all", recent, [{"icao24": "b"}])
+    now += 61
+    assert cache.get("/flights/all", old) == [{"icao24": "a"}]
+    assert cache.get("/flights/all", recent) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_aircraft_history_requests_repeat_within_a_window():
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(dict(request.url.params))
+        return httpx.Response(200, json=[])
+
+    async def scenario():
+        scraper = mock_async_scraper(handler)
+        try:
+            await scraper.scrape_aircraft_history(["a1b2c3"])
+            await scraper.scrape_aircraft_history(["a1b2c3"])
+        finally:
+            await scraper.aclose()
+
+    asyncio.run(scenario())
+    first, second = requests_seen
+    assert first == second
+    assert int(first["end"]) % scrape.FLIGHTS_WINDOW == 0
+
+
+class FakeFlightsClient:
+    """Answers get_flights_in_range, running out of quota after `budget` calls."""
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.calls = []
+
+    def get_flights_in_range(self, begin, end):
+        if self.budget is not None and len(self.calls) >= self.budget:
+            raise scrape.RateLimitExceeded("out of credits")
+        self.calls.append(begin)
+        return [opensky_flight("a1b2c3", "N123AB", begin)]
+
+
+def test_checkpoint_resumes_where_the_quota_ran_out(tmp_path):
+    start = datetime.fromtimestamp(7200 * 500_000)
+    end = datetime.fromtimestamp(7200 * 500_003)
+    path = tmp_path / "flights.json.checkpoint.json"
+
+    scraper = FlightScraper(make_config())
+    scraper.client = FakeFlightsClient(budget=2)
+    checkpoint = ScrapeCheckpoint(path, start, end)
+    checkpoint.save()
+    assert (
+        len(scraper.scrape_flights_for_period(start, end, checkpoint=checkpoint)) == 2
+    )
+
+    resumed = ScrapeCheckpoint.load(path)
+    assert len(resumed.pending_windows()) == 1
+    scraper.client = FakeFlightsClient()
+    flights = scraper.scrape_flights_for_period(start, end, checkpoint=resumed)
+    assert len(scraper.client.calls) == 1
+    assert [flight.departure_time for flight in flights] == [
+        scrape.from_epoch(int(begin.timestamp()))
+        for begin, _ in period_windows(start, end)
+    ]
+    assert ScrapeCheckpoint.load(path).pending_windows() == []
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["scrape.py", *args])
+    return scrape.main()
+
+
+def test_history_run_refuses_to_overwrite_an_unfinished_checkpoint(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setenv("OPENSKY_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setenv("OPENSKY_QUOTA_PATH", str(tmp_path / "quota.sqlite"))
+    output = tmp_path / "flights.ndjson"
+    path = tmp_path / "flights.ndjson.checkpoint.json"
+    ScrapeCheckpoint(path, datetime(2024, 1, 1), datetime(2024, 1, 2)).save()
+
+    history = ["--mode", "history", "--output", str(output)]
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, *history)
+    assert ScrapeCheckpoint.load(path).start_time == datetime(2024, 1, 1)
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, *history, "--resume", "--append")
+    # Rejected runs open neither the cache nor the ledger
+    assert sorted(p.name for p in tmp_path.iterdir()) == [path.name]
+
+
+def test_ledgers_sharing_a_file_share_the_quota(tmp_path):
+    path = str(tmp_path / "quota.sqlite")
+    first, second = QuotaLedger(path), QuotaLedger(path)
+    booked = [ledger.reserve(5, min_interval=0.0) for ledger in (first, second) * 3]
+    assert booked.count(None) == 1
+    assert first.remaining(5) == second.remaining(5) == 0
+    assert QuotaLedger(path, account="someone-else").remaining(5) == 5
+
+
+def test_cancelled_waiter_gets_its_credits_back():
+    async def scenario():
+        limiter = AsyncRateLimiter(daily_limit=10, min_interval=60.0)
+        assert await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert limiter.remaining == 8
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return limiter.remaining
+
+    assert asyncio.run(scenario()) == 9
+
+
+def test_server_429_is_waited_out_and_its_count_adopted():
+    responses = [
+        httpx.Response(429, headers={"X-Rate-Limit-Retry-After-Seconds": "0"}),
+        httpx.Response(200, json=[], headers={"X-Rate-Limit-Remaining": "50"}),
+    ]
+
+    def handler(request):
+        return responses.pop(0)
+
+    async def scenario():
+        scraper = mock_async_scraper(handler)
+        try:
+            flights = await scraper.client.get_flights_in_range(0, 7200)
+        finally:
+            await scraper.aclose()
+        return flights, scraper.client.rate_limiter
+
+    flights, limiter = asyncio.run(scenario())
+    assert flights == [] and responses == []
+    # The server's count replaces the configured daily limit
+    assert limiter.remaining == 50
+
+
+def test_ledger_learns_prices_from_the_credits_left():
+    remaining = [4000]
+
+    def handler(request):
+        remaining[0] -= 4 if request.url.path.endswith("/states/all") else 1
+        headers = {"X-Rate-Limit-Remaining": str(remaining[0])}
+        return httpx.Response(200, json={"time": 1, "states": []}, headers=headers)
+
+    async def scenario():
+        scraper = mock_async_scraper(handler)
+        try:
+            for _ in range(3):
+                await scraper.client.get_current_states()
+            # A small box is priced by its own tier until it is seen
+            await scraper.client.get_current_states(bounds=(34.0, 35.0, -119.0, -118.0))
+        finally:
+            await scraper.aclose()
+        return scraper.client.rate_limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.ledger.credit_cost("/states/all") == pytest.approx(4.0)
+    assert limiter.ledger.credit_cost("/states/all:1") == pytest.approx(4.0)
+    assert credit_class("/states/all", {}) == ("/states/all", 4)
+    assert credit_class("/flights/all", {"begin": 0, "end": 1}) == ("/flights/all", 1.0)
+    assert limiter.remaining == remaining[0]
+
+
+def test_pacing_and_429s_are_in_credits(monkeypatch):
+    monkeypatch.setattr(scrape.time, "time", lambda: 0.0)  # midnight UTC
+    ledger = QuotaLedger()
+    assert ledger.reserve(4000, 0.0, pace=True, cost=4.0) == 0.0
+    # 3996 credits left for the day, 4 per request: 999 requests, one per
+    # 86400 / 999 seconds
+    assert ledger.reserve(4000, 0.0, pace=True, cost=4.0) == pytest.approx(
+        86400 * 4 / 3996
+    )
+
+    ledger.observe(remaining=0, retry_after=30.0)
+    assert ledger.reserve(4000, 0.0) is None
+    assert ledger.seconds_until_available(4000) == pytest.approx(30.0)
+
+
+def test_record_writer_formats_and_appends(tmp_path):
+    records = [{"icao24": "a1b2c3", "n": n} for n in range(3)]
+    for name in ("flights.json", "flights.ndjson.gz", "flights.ndjson.zst"):
+        with RecordWriter(tmp_path / name) as writer:
+            writer.write_many(records)
+        assert list(read_records(tmp_path / name)) == records
+        assert not list(tmp_path.glob("*.part"))
+
+    with RecordWriter(tmp_path / "flights.ndjson.gz", append=True) as writer:
+        writer.write_many([{"icao24": "d4e5f6", "n": 3}])
+    assert [r["n"] for r in read_records(tmp_path / "flights.ndjson.gz")] == [
+        0,
+        1,
+        2,
+        3,
+    ]
+
+    with pytest.raises(ValueError):
+        RecordWriter(tmp_path / "flights.json", append=True)
+
+
+def test_record_writer_rotates_through_part_files(tmp_path):
+    path = tmp_path / "flights.ndjson"
+    with RecordWriter(path, rotate_records=2) as writer:
+        writer.write_many({"n": n} for n in range(3))
+    assert [p.name for p in writer.completed] == [
+        "flights-00001.ndjson",
+        "flights-00002.ndjson",
+    ]
+
+    writer = RecordWriter(path, append=True, rotate_records=2)
+    assert [p.name for p in writer.earlier] == [
+        "flights-00001.ndjson",
+        "flights-00002.ndjson",
+    ]
+    writer.write_many({"n": n} for n in range(3, 6))
+    # The segment being written is not visible under its final name yet
+    assert (tmp_path / "flights-00004.ndjson.part").exists()
+    assert not (tmp_path / "flights-00004.ndjson").exists()
+    writer.close()
+    segments = sorted(tmp_path.glob("flights-*.ndjson"))
+    assert [p.name for p in segments][-2:] == [
+        "flights-00003.ndjson",
+        "flights-00004.ndjson",
+    ]
+    assert [r["n"] for p in segments for r in read_records(p)] == list(range(6))
+    # Everything an --archive of the appended output has to read back
+    assert writer.earlier + writer.completed == segments
+
+
+def reference_is_small_aircraft(info: dict, callsign: Optional[str]) -> bool:
+    """The per-aircraft classification classify_batch replaced."""
+    if info:
+        if info.get("typecode", "") in OpenSkyClient.SMALL_AIRCRAFT_TYPES:
+            return True
+        owner = info.get("owner", "").upper()
+        if any(term in owner for term in ["FLYING CLUB", "FLIGHT SCHOOL", "AERO CLUB"]):
+            return True
+    if callsign:
+        callsign = callsign.strip()
+        if callsign.startswith("N") and len(callsign) <= 6 and callsign[1:].isalnum():
+            return True
+    return False
+
+
+def test_classify_batch_matches_the_per_aircraft_logic(tmp_path):
+    database = tmp_path / "aircraft.json"
+    with open(database, "w") as f:
+        for icao24, typecode, owner in [
+            ("a00001", "C172", ""),
+            ("a00002", "B738", "Delta Air Lines"),
+            ("a00003", "", "Sunset flying club"),
+            ("a00004", "PA28", "Aero Club Munich"),
+            ("a00005", "A320", "Flight School Inc"),
+        ]:
+            f.write(
+                json.dumps({"icao24": icao24, "typecode": typecode, "owner": owner})
+            )
+            f.write("\n")
+    small = SmallAircraftFilter(database)
+
+    icao24s = [f"a0000{n}" for n in range(8)] + ["A00001", " a00003", "", "nothex"]
+    callsigns = [
+        None,
+        "",
+        "N",
+        "N1",
+        "N12345",
+        "N123456",
+        "N12 34",
+        "n12345",
+        "  N54321  ",
+        "DAL123",
+        "UAL1",
+        "NKS2001",
+        "N5432-",
+    ]
+    pairs = [(icao24, callsign) for icao24 in icao24s for callsign in callsigns]
+    expected = [
+        reference_is_small_aircraft(small.get_aircraft_info(icao24.strip()), callsign)
+        for icao24, callsign in pairs
+    ]
+    mask = small.classify_batch([p[0] for p in pairs], [p[1] for p in pairs])
+    assert mask.tolist() == expected
+    assert any(expected) and not all(expected)
+    # No database: only the callsign counts
+    bare = SmallAircraftFilter()
+    assert bare.classify_batch(["a00001", "a00002"], ["N1", "DAL123"]).tolist() == [
+        True,
+        False,
+    ]
+
+
+def state_vector(icao24, callsign, contact, longitude, altitude=1000.0):
+    return [
+        icao24,
+        callsign,
+        "United States",
+        contact,
+        contact,
+        longitude,
+        34.0,
+        altitude,
+        False,
+        50.0,
+        90.0,
+        0.0,
+        None,
+        altitude + 10,
+        "1200",
+        False,
+        0,
+    ]
+
+
+def test_parse_state_columns_fills_missing_values():
+    vector = state_vector("a1b2c3", None, 100, None)
+    snapshot_time, states = parse_state_columns({"time": 5, "states": [vector]})
+    assert snapshot_time == 5
+    assert states["icao24"].tolist() == ["a1b2c3"]
+    assert states["callsign"][0] == ""
+    assert np.isnan(states["longitude"][0])
+    assert states["time_position"][0] == 100
+    assert len(parse_state_columns({"time": 6, "states": None})[1]) == 0
+
+
+def snapshot(time, *vectors):
+    return parse_state_columns({"time": time, "states": list(vectors)})
+
+
+def test_state_tracker_emits_new_changed_and_gone_aircraft():
+    tracker = StateTracker()
+    first = tracker.update(
+        *snapshot(
+            10,
+            state_vector("a1b2c3", "N123AB", 9, -118.0),
+            state_vector("a00001", "N1", 9, -117.0),
+        )
+    )
+    assert sorted(record["icao24"] for record in first) == ["a00001", "a1b2c3"]
+    assert all(record["new"] for record in first)
+
+    # a00001 only reports new timestamps, so it has no delta
+    second = tracker.update(
+        *snapshot(
+            20,
+            state_vector("a00001", "N1", 19, -117.0),
+            state_vector("a1b2c3", "N123AB", 19, -118.5),
+            state_vector("a00002", "N2", 19, None),
+        )
+    )
+    assert second == [
+        {
+            "time": 20,
+            "icao24": "a00002",
+            "new": True,
+            "callsign": "N2",
+            "origin_country": "United States",
+            "time_position": 19,
+            "last_contact": 19,
+            "latitude": 34.0,
+            "baro_altitude": 1000.0,
+            "on_ground": False,
+            "velocity": 50.0,
+            "true_track": 90.0,
+            "vertical_rate": 0.0,
+            "geo_altitude": 1010.0,
+            "squawk": "1200",
+            "spi": False,
+            "position_source": 0,
+        },
+        {
+            "time": 20,
+            "icao24": "a1b2c3",
+            "time_position": 19,
+            "last_contact": 19,
+            "longitude": -118.5,
+        },
+    ]
+
+    third = tracker.update(
+        *snapshot(
+            30,
+            state_vector("a00001", "N1", 29, -117.0),
+            state_vector("a00002", "N2", 29, None),
+        )
+    )
+    assert third == [{"time": 30, "icao24": "a1b2c3", "gone": True}]
+
+
+def test_polling_skips_failed_snapshots(monkeypatch):
+    monkeypatch.setattr(scrape.time, "sleep", lambda seconds: None)
+    responses = [
+        {"time": 10, "states": [state_vector("a1b2c3", "N123AB", 9, -118.0)]},
+        requests.exceptions.HTTPError("503 Service Unavailable"),
+        {"time": 30, "states": [state_vector("a1b2c3", "N123AB", 29, -118.5)]},
+    ]
+
+    def get_state_columns(bounds=None):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return parse_state_columns(response)
+
+    scraper = FlightScraper(make_config())
+    monkeypatch.setattr(scraper.client, "get_state_columns", get_state_columns)
+    snapshots = list(scraper.poll_us_ga_states(interval=0, polls=3))
+    assert len(snapshots) == 2
+    assert snapshots[1] == [
+        {
+            "time": 30,
+            "icao24": "a1b2c3",
+            "time_position": 29,
+            "last_contact": 29,
+            "longitude": -118.5,
+        }
+    ]